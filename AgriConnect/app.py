@@ -2,12 +2,16 @@ import streamlit as st
 import os
 from auth import init_auth, login_user, register_user, logout_user
 from database import init_database
+from notifications import start_change_listener
 from components.navigation import render_navigation
+from components.profile_report import render_profile_report
+from profiler import is_profiling_enabled, profile_rerun, get_last_profile
 from pages import farmer_dashboard, distributor_dashboard, retailer_dashboard, buyer_dashboard, admin_dashboard
 
-# Initialize database
-init_database()
-init_auth()
+# Initialize database (these calls are no-ops after the first successful run in this process)
+if init_database():
+    init_auth()
+    start_change_listener()
 
 # App configuration
 st.set_page_config(
@@ -127,6 +131,18 @@ def render_auth_page():
                         st.warning("Please fill in all fields.")
 
 def render_dashboard():
+    if not is_profiling_enabled():
+        dispatch_dashboard()
+        return
+    
+    role = st.session_state.user_role
+    page = st.session_state.get(f"{str(role).lower()}_page", "default")
+    profile_rerun(dispatch_dashboard, f"{role}:{page}")
+    
+    if role == "Admin":
+        render_profile_report(get_last_profile())
+
+def dispatch_dashboard():
     if st.session_state.user_role == "Farmer":
         farmer_dashboard.render()
     elif st.session_state.user_role == "Distributor":
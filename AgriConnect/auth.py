@@ -2,21 +2,38 @@ import hashlib
 import streamlit as st
 from database import execute_query, fetch_one
 import uuid
+import threading
+
+_auth_initialized = False
+_auth_lock = threading.Lock()
 
 def hash_password(password):
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
 def init_auth():
-    """Initialize authentication system"""
-    # Create default admin user if not exists
-    admin_exists = fetch_one("SELECT id FROM users WHERE email = %s", ("admin@agritrace.com",))
-    if not admin_exists:
-        admin_password = hash_password("admin123")
-        execute_query("""
-            INSERT INTO users (name, email, phone, role, password_hash) 
-            VALUES (%s, %s, %s, %s, %s)
-        """, ("Admin User", "admin@agritrace.com", "1234567890", "Admin", admin_password))
+    """Initialize authentication system once per process"""
+    global _auth_initialized
+    if _auth_initialized:
+        return
+    
+    with _auth_lock:
+        if _auth_initialized:
+            return
+        
+        # Create default admin user if not exists
+        admin_exists = fetch_one("SELECT id FROM users WHERE email = %s", ("admin@agritrace.com",))
+        if not admin_exists:
+            admin_password = hash_password("admin123")
+            result = execute_query("""
+                INSERT INTO users (name, email, phone, role, password_hash) 
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (email) DO NOTHING
+            """, ("Admin User", "admin@agritrace.com", "1234567890", "Admin", admin_password))
+            if result is None:
+                return
+        
+        _auth_initialized = True
 
 def register_user(name, email, phone, role, password):
     """Register new user"""
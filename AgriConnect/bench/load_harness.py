@@ -0,0 +1,451 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+import psycopg2
+import streamlit
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test
+from database import get_connection_params, get_pool_stats, init_database, execute_query
+from bench.run_benchmarks import DEFAULT_OUTPUT_DIR, git_revision, percentile
+from bench.seed_data import SEED_PASSWORD
+from bench.trace_load import load_batch_ids
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+DEFAULT_MIX = 'Farmer=0.5,Distributor=0.15,Retailer=0.2,Buyer=0.1,Admin=0.05'
+
+# Session-state key holding the current page for each role (set by components/navigation.py)
+PAGE_KEYS = {
+    'Farmer': 'farmer_page',
+    'Distributor': 'distributor_page',
+    'Retailer': 'retailer_page',
+    'Buyer': 'buyer_page',
+    'Admin': 'admin_page',
+}
+SKIPPED_BUTTONS = {'🚪 Logout'}
+LOGIN_ATTEMPTS = 3
+# Batch ids sampled once at startup for Buyer scans
+SCAN_BATCHES = 500
+# Streamlit releases (from, up to but excluding) whose internals shared_server_state() was checked against
+SUPPORTED_STREAMLIT = ((1, 49), (1, 66))
+
+def check_streamlit_version():
+    """Refuse to run on a Streamlit release whose internals shared_server_state() hasn't been checked against"""
+    version = tuple(int(part) for part in streamlit.__version__.split('.')[:2])
+    low, high = SUPPORTED_STREAMLIT
+    if not low <= version < high:
+        raise RuntimeError(
+            f"Streamlit {streamlit.__version__} is untested with the load harness; "
+            f"it supports {'.'.join(map(str, low))} up to (not including) {'.'.join(map(str, high))}"
+        )
+
+@contextmanager
+def shared_server_state():
+    """Let concurrent AppTest sessions share one Runtime and script cache, as a real server does
+    
+    AppTest installs a mock Runtime at the start of each run and clears it at the end,
+    which breaks any other session still mid-run on another thread, so the most recent
+    instance keeps being served. It also builds a fresh ScriptCache per run, and parsing
+    app.py on many threads at once can fail inside CPython's AST builder. Finally, it
+    patches the global.appTest option only for the duration of each run, so it is set
+    process-wide instead. These are Streamlit internals, so other releases than
+    SUPPORTED_STREAMLIT are refused; everything is put back on exit.
+    """
+    check_streamlit_version()
+    original_instance = Runtime.__dict__['instance']
+    original_exists = Runtime.__dict__['exists']
+    original_script_cache = app_test.ScriptCache
+    original_app_test = config.get_option("global.appTest")
+    
+    config.set_option("global.appTest", True)
+    script_cache = ScriptCache()
+    app_test.ScriptCache = lambda: script_cache
+    last = {'runtime': None}
+    
+    def instance(cls):
+        if cls._instance is not None:
+            last['runtime'] = cls._instance
+        if last['runtime'] is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last['runtime']
+    
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or last['runtime'] is not None)
+    try:
+        yield
+    finally:
+        Runtime.instance = original_instance
+        Runtime.exists = original_exists
+        app_test.ScriptCache = original_script_cache
+        config.set_option("global.appTest", original_app_test)
+
+def parse_mix(text):
+    """Parse 'Role=weight,...' into normalized (role, weight) pairs"""
+    pairs = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        role, weight = part.split('=')
+        role = role.strip()
+        if role not in PAGE_KEYS:
+            raise ValueError(f"unknown role {role!r}; expected one of {', '.join(PAGE_KEYS)}")
+        pairs.append((role, float(weight)))
+    
+    total = sum(weight for _, weight in pairs)
+    if total <= 0:
+        raise ValueError("role mix weights must add up to more than zero")
+    return [(role, weight / total) for role, weight in pairs]
+
+def load_accounts(roles):
+    """Get the emails of active users for each role in the mix"""
+    accounts = {}
+    for role in roles:
+        rows = execute_query(
+            "SELECT email FROM users WHERE role = %s AND status = 'active' ORDER BY id LIMIT 1000",
+            (role,), fetch=True
+        )
+        if not rows:
+            raise RuntimeError(f"No active {role} users loaded; run python -m bench.seed_data first")
+        accounts[role] = [row['email'] for row in rows]
+    return accounts
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        import resource
+        # ru_maxrss is KB on Linux and bytes on macOS; peak only, but better than nothing
+        scale = 1024 * 1024 if platform.system() == 'Darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def session_state_bytes(at):
+    """Approximate size of a session's state by pickling what can be pickled"""
+    size = 0
+    for _, value in at.session_state.items():
+        try:
+            size += len(pickle.dumps(value))
+        except Exception:
+            pass
+    return size
+
+class Recorder:
+    """Thread-safe collection of per-page rerun latencies and errors"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.first_errors = {}
+        self.state_bytes = []
+    
+    def record(self, page, elapsed_ms, error=None):
+        with self._lock:
+            self.latencies[page].append(elapsed_ms)
+            if error:
+                self.errors[page] += 1
+                self.first_errors.setdefault(page, error)
+    
+    def record_state(self, size):
+        with self._lock:
+            self.state_bytes.append(size)
+    
+    def summary(self):
+        """Per-page latency percentiles, slowest p95 first"""
+        with self._lock:
+            pages = []
+            for page, samples in self.latencies.items():
+                pages.append({
+                    'page': page,
+                    'reruns': len(samples),
+                    'errors': self.errors.get(page, 0),
+                    'p50_ms': round(percentile(samples, 50), 1),
+                    'p90_ms': round(percentile(samples, 90), 1),
+                    'p95_ms': round(percentile(samples, 95), 1),
+                    'p99_ms': round(percentile(samples, 99), 1),
+                    'max_ms': round(max(samples), 1),
+                    'first_error': self.first_errors.get(page),
+                })
+        pages.sort(key=lambda p: p['p95_ms'], reverse=True)
+        return pages
+
+class ResourceSampler(threading.Thread):
+    """Samples pool usage, server-side connections and process memory at a fixed interval"""
+    
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        # A dedicated connection outside the pool so sampling doesn't skew pool numbers
+        conn = psycopg2.connect(**get_connection_params())
+        conn.autocommit = True
+        cursor = conn.cursor()
+        started = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                cursor.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE datname = current_database()")
+                pool = get_pool_stats()
+                self.samples.append({
+                    't': round(time.monotonic() - started, 2),
+                    'pool_in_use': pool['in_use'],
+                    'pool_open': pool['open'],
+                    'server_connections': cursor.fetchone()[0],
+                    'rss_mb': round(rss_mb(), 1),
+                })
+                self._stop_event.wait(self.interval)
+        finally:
+            conn.close()
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+    
+    def summary(self):
+        """Peak and mean of every sampled series"""
+        result = {}
+        for key in ('pool_in_use', 'pool_open', 'server_connections', 'rss_mb'):
+            values = [sample[key] for sample in self.samples]
+            if values:
+                result[key] = {'max': max(values), 'mean': round(sum(values) / len(values), 2)}
+        return result
+
+class SimulatedSession:
+    """One user clicking through the app: login, then random sidebar navigation"""
+    
+    def __init__(self, session_id, role, email, recorder, rng, think_time, write_ratio, timeout, batch_ids=()):
+        self.session_id = session_id
+        self.role = role
+        self.email = email
+        self.recorder = recorder
+        self.rng = rng
+        self.think_time = think_time
+        self.write_ratio = write_ratio
+        self.batch_ids = batch_ids
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    
+    def _rerun(self, label=None, action=None):
+        """Apply an action, rerun the script and record latency under label (default: the page it lands on)"""
+        started = time.perf_counter()
+        error = None
+        try:
+            if action:
+                action()
+            self.at.run()
+            if self.at.exception:
+                error = self.at.exception[0].message
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.recorder.record(label or self._page_label(), (time.perf_counter() - started) * 1000, error)
+        return error is None
+    
+    def _page_label(self):
+        key = PAGE_KEYS[self.role]
+        return f"{self.role}:{self.at.session_state[key] if key in self.at.session_state else 'default'}"
+    
+    def _think(self, deadline):
+        if self.think_time > 0:
+            pause = self.rng.expovariate(1 / self.think_time)
+            time.sleep(max(min(pause, deadline - time.monotonic()), 0))
+    
+    def login(self):
+        """Open the landing page and sign in through the login tab"""
+        self._rerun('landing')
+        
+        # The Register tab reuses the "Password" label, so take the first (login tab) match
+        inputs = {}
+        for widget in self.at.text_input:
+            inputs.setdefault(widget.label, widget)
+        login_button = next((b for b in self.at.button if b.label == '🔐 Login'), None)
+        if login_button is None or 'Email' not in inputs or 'Password' not in inputs:
+            return False
+        
+        def submit():
+            inputs['Email'].input(self.email)
+            inputs['Password'].input(SEED_PASSWORD)
+            login_button.click()
+        
+        self._rerun(f"{self.role}:login", submit)
+        return 'authenticated' in self.at.session_state and bool(self.at.session_state['authenticated'])
+    
+    def navigate(self):
+        """Click a random sidebar page button"""
+        buttons = [b for b in self.at.sidebar.button if b.label not in SKIPPED_BUTTONS]
+        if not buttons:
+            return
+        # The click and the st.rerun() it triggers both happen inside one AppTest run
+        self._rerun(action=self.rng.choice(buttons).click)
+    
+    def submit_form(self):
+        """Exercise a write path where the current page has one"""
+        if self.role == 'Farmer' and self._page_label() == 'Farmer:add_crop':
+            name_input = next((t for t in self.at.text_input if t.label == 'Crop Name'), None)
+            submit = next((b for b in self.at.button if b.label == '🌾 Add Crop'), None)
+            if name_input and submit:
+                def add_crop():
+                    name_input.input(f"Load Test {self.session_id}")
+                    submit.click()
+                self._rerun('Farmer:add_crop:submit', add_crop)
+        elif self.role == 'Buyer' and self._page_label() == 'Buyer:scan':
+            batch_input = next((t for t in self.at.text_input if t.label == '🔍 Enter Batch ID'), None)
+            if self.batch_ids and batch_input:
+                batch_id = self.rng.choice(self.batch_ids)
+                self._rerun('Buyer:scan:trace', lambda: batch_input.input(batch_id))
+    
+    def run(self, deadline):
+        # A click can occasionally be lost while many sessions start at once, so retry before giving up
+        for _ in range(LOGIN_ATTEMPTS):
+            if self.login():
+                break
+            self.recorder.record(f"{self.role}:login_failed", 0.0, error=self.email)
+        else:
+            return
+        
+        while time.monotonic() < deadline:
+            self._think(deadline)
+            if time.monotonic() >= deadline:
+                break
+            self.navigate()
+            if self.write_ratio and self.rng.random() < self.write_ratio:
+                self.submit_form()
+        
+        self.recorder.record_state(session_state_bytes(self.at))
+
+def run_load(sessions, mix, duration, think_time, ramp_up, write_ratio, seed_value, sample_interval, timeout):
+    """Run the simulated sessions concurrently and return the report"""
+    if not init_database():
+        raise RuntimeError("Database initialization failed")
+    
+    with shared_server_state():
+        # Compile app.py and import the page modules once, so cold-start cost isn't charged to the first sessions
+        AppTest.from_file(APP_PATH, default_timeout=timeout).run()
+        
+        rng = random.Random(seed_value)
+        accounts = load_accounts([role for role, _ in mix])
+        # Sampled up front so a scan doesn't sort the crops table on every action
+        batch_ids = load_batch_ids(SCAN_BATCHES)
+        recorder = Recorder()
+        sampler = ResourceSampler(sample_interval)
+        
+        baseline_rss = rss_mb()
+        sampler.start()
+        started = time.monotonic()
+        deadline = started + ramp_up + duration
+        
+        threads = []
+        roles = defaultdict(int)
+        for i in range(sessions):
+            role = rng.choices([r for r, _ in mix], [w for _, w in mix])[0]
+            roles[role] += 1
+            session = SimulatedSession(i, role, rng.choice(accounts[role]), recorder,
+                                       random.Random(rng.random()), think_time, write_ratio, timeout, batch_ids)
+            thread = threading.Thread(target=session.run, args=(deadline,), name=f"session-{i}", daemon=True)
+            threads.append(thread)
+        
+        # Stagger session starts evenly across the ramp-up window
+        for i, thread in enumerate(threads):
+            start_at = started + ramp_up * i / max(sessions, 1)
+            time.sleep(max(start_at - time.monotonic(), 0))
+            thread.start()
+        
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        sampler.stop()
+    
+    resources = sampler.summary()
+    peak_rss = resources.get('rss_mb', {}).get('max', baseline_rss)
+    pages = recorder.summary()
+    total_reruns = sum(page['reruns'] for page in pages)
+    
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'sessions': sessions,
+            'roles': dict(roles),
+            'mix': dict(mix),
+            'duration_s': duration,
+            'ramp_up_s': ramp_up,
+            'think_time_s': think_time,
+            'write_ratio': write_ratio,
+            'seed': seed_value,
+            'pool': get_pool_stats(),
+        },
+        'totals': {
+            'elapsed_s': round(elapsed, 1),
+            'reruns': total_reruns,
+            'errors': sum(page['errors'] for page in pages),
+            'reruns_per_s': round(total_reruns / elapsed, 2) if elapsed else 0.0,
+        },
+        'memory': {
+            'baseline_rss_mb': round(baseline_rss, 1),
+            'peak_rss_mb': peak_rss,
+            'per_session_mb': round((peak_rss - baseline_rss) / sessions, 2) if sessions else 0.0,
+            'session_state_kb_mean': round(sum(recorder.state_bytes) / len(recorder.state_bytes) / 1024, 1)
+            if recorder.state_bytes else 0.0,
+        },
+        'connections': resources,
+        'pages': pages,
+        'samples': sampler.samples,
+    }
+
+def print_report(report):
+    totals, memory, connections = report['totals'], report['memory'], report['connections']
+    print(f"\n{report['meta']['sessions']} sessions {report['meta']['roles']} for {totals['elapsed_s']}s: "
+          f"{totals['reruns']} reruns ({totals['reruns_per_s']}/s), {totals['errors']} errors")
+    print(f"{'page':<40} {'reruns':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for page in report['pages']:
+        print(f"{page['page']:<40} {page['reruns']:>7} {page['errors']:>7} "
+              f"{page['p50_ms']:>9.1f} {page['p95_ms']:>9.1f} {page['p99_ms']:>9.1f}")
+    for page in report['pages']:
+        if page['first_error']:
+            print(f"  first error on {page['page']}: {page['first_error']}")
+    
+    for key, label in (('pool_in_use', 'pool connections in use'), ('pool_open', 'pool connections open'),
+                       ('server_connections', 'server connections')):
+        if key in connections:
+            print(f"{label:<26} max {connections[key]['max']:>5}  mean {connections[key]['mean']:>7}")
+    print(f"memory: baseline {memory['baseline_rss_mb']} MB, peak {memory['peak_rss_mb']} MB, "
+          f"~{memory['per_session_mb']} MB/session, session_state ~{memory['session_state_kb_mean']} KB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive simulated sessions through app.py and report rerun latency")
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="role weights, e.g. 'Farmer=0.6,Buyer=0.4'")
+    parser.add_argument('--duration', type=float, default=60, help="seconds each session keeps clicking after ramp-up")
+    parser.add_argument('--think-time', type=float, default=3, help="mean seconds between clicks (exponential)")
+    parser.add_argument('--ramp-up', type=float, default=10, help="seconds over which sessions start")
+    parser.add_argument('--write-ratio', type=float, default=0.0, help="chance of submitting a form after a click")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sample-interval', type=float, default=0.5, help="seconds between resource samples")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds allowed for a single rerun")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="directory for the JSON results")
+    args = parser.parse_args()
+    
+    report = run_load(args.sessions, parse_mix(args.mix), args.duration, args.think_time, args.ramp_up,
+                      args.write_ratio, args.seed, args.sample_interval, args.timeout)
+    print_report(report)
+    
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
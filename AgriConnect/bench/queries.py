@@ -0,0 +1,443 @@
+from datetime import datetime, timedelta
+from metrics import build_metrics_query
+from search import SEARCH_LIMIT, to_prefix_tsquery
+from traces import TRACE_DOCUMENT_SQL
+
+# fetch_page asks for one row more than the default page size
+PAGE_LIMIT = 21
+
+def _days_ago(days):
+    return datetime.now() - timedelta(days=days)
+
+# metrics.get_rollup_series / get_rollup_totals
+ROLLUP_SERIES_SQL = """
+    SELECT bucket, SUM(count) as count, SUM(total) as total
+    FROM rollups
+    WHERE metric = %s AND granularity = %s AND bucket >= %s
+"""
+ROLLUP_DIMENSION_SERIES_SQL = ROLLUP_SERIES_SQL + " AND dimension = %s GROUP BY bucket ORDER BY bucket"
+ROLLUP_SERIES_SQL += " GROUP BY bucket ORDER BY bucket"
+ROLLUP_TOTALS_SQL = """
+    SELECT dimension, SUM(count) as count, SUM(total) as total
+    FROM rollups
+    WHERE metric = %s AND granularity = 'month'
+    GROUP BY dimension
+    HAVING SUM(count) <> 0
+    ORDER BY dimension
+"""
+
+# The SQL each page function issues, with params drawn from load_context();
+# keep this list in step with the pages when their queries change
+QUERIES = [
+    # farmer_dashboard
+    {'name': 'farmer.overview.summary', 'page': 'farmer_dashboard.render_overview',
+     'sql': "SELECT * FROM user_summaries WHERE user_id = ANY(%s)",
+     'params': lambda ctx: ([ctx['farmer_id']],)},
+    {'name': 'farmer.overview.recent_crops', 'page': 'farmer_dashboard.render_overview',
+     'sql': "SELECT * FROM crops WHERE farmer_id = %s ORDER BY created_at DESC LIMIT 5",
+     'params': lambda ctx: (ctx['farmer_id'],)},
+    {'name': 'farmer.my_crops.page', 'page': 'farmer_dashboard.render_my_crops',
+     'sql': "SELECT * FROM crops c WHERE TRUE AND c.farmer_id = %s ORDER BY c.created_at DESC, c.id DESC LIMIT %s",
+     'params': lambda ctx: (ctx['farmer_id'], PAGE_LIMIT)},
+    {'name': 'farmer.my_crops.search', 'page': 'farmer_dashboard.render_my_crops',
+     'sql': """
+        SELECT c.*, u.name as farmer_name, u.email as farmer_email, u.phone as farmer_phone,
+               ts_rank(c.search_vector, q.query) as rank
+        FROM crops c
+        CROSS JOIN to_tsquery('simple', %s) AS q (query)
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE c.search_vector @@ q.query AND c.farmer_id = %s
+        ORDER BY rank DESC, c.created_at DESC, c.id DESC
+        LIMIT %s
+     """,
+     'params': lambda ctx: (to_prefix_tsquery(ctx['search_term']), ctx['farmer_id'], SEARCH_LIMIT)},
+    {'name': 'farmer.my_crops.facets', 'page': 'farmer_dashboard.render_my_crops',
+     'sql': "SELECT status, type, COUNT(*) as count FROM crops c WHERE TRUE AND c.farmer_id = %s GROUP BY status, type",
+     'params': lambda ctx: (ctx['farmer_id'],)},
+    {'name': 'farmer.my_crops.summary', 'page': 'farmer_dashboard.render_my_crops',
+     'sql': "SELECT COUNT(*) as count FROM crops c WHERE TRUE AND c.farmer_id = %s",
+     'params': lambda ctx: (ctx['farmer_id'],)},
+    {'name': 'farmer.payments', 'page': 'farmer_dashboard.render_payments',
+     'sql': """
+        SELECT p.*, c.name as crop_name, u.name as from_user_name
+        FROM payments p
+        LEFT JOIN crops c ON p.crop_id = c.id
+        LEFT JOIN users u ON p.from_user_id = u.id
+        WHERE p.to_user_id = %s
+        ORDER BY p.created_at DESC
+     """,
+     'params': lambda ctx: (ctx['farmer_id'],)},
+    {'name': 'farmer.qr_codes.crops', 'page': 'farmer_dashboard.render_qr_codes',
+     'sql': "SELECT * FROM crops WHERE farmer_id = %s ORDER BY created_at DESC",
+     'params': lambda ctx: (ctx['farmer_id'],)},
+    {'name': 'farmer.add_crop', 'page': 'farmer_dashboard.render_add_crop', 'write': True,
+     'sql': """
+        INSERT INTO crops (farmer_id, name, type, quantity, price, harvest_date, batch_id, photo_url)
+        VALUES (%s, 'Bench Crop', 'Vegetables', 100, 50, CURRENT_DATE, 'BATCH_BENCH', NULL)
+     """,
+     'params': lambda ctx: (ctx['farmer_id'],)},
+
+    # distributor_dashboard
+    {'name': 'distributor.overview.summary', 'page': 'distributor_dashboard.render_overview',
+     'sql': "SELECT * FROM user_summaries WHERE user_id = ANY(%s)",
+     'params': lambda ctx: ([ctx['distributor_id']],)},
+    {'name': 'distributor.overview.recent', 'page': 'distributor_dashboard.render_overview',
+     'sql': """
+        SELECT d.*, c.name as crop_name, u.name as farmer_name
+        FROM deliveries d
+        LEFT JOIN crops c ON d.crop_id = c.id
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE d.distributor_id = %s
+        ORDER BY d.created_at DESC
+        LIMIT 5
+     """,
+     'params': lambda ctx: (ctx['distributor_id'],)},
+    {'name': 'distributor.available_crops', 'page': 'distributor_dashboard.render_available_crops',
+     'sql': """
+        SELECT c.id, c.name, c.type, c.quantity, c.price, c.batch_id, c.farmer_id, c.created_at,
+               u.name as farmer_name, u.phone as farmer_phone
+        FROM crops c
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE 1=1 AND c.status = 'available' AND c.price <= %s
+        ORDER BY c.created_at DESC, c.id DESC LIMIT %s
+     """,
+     'params': lambda ctx: (500, PAGE_LIMIT)},
+    {'name': 'distributor.available_crops.search', 'page': 'distributor_dashboard.render_available_crops',
+     'sql': """
+        SELECT c.*, u.name as farmer_name, u.email as farmer_email, u.phone as farmer_phone,
+               ts_rank(c.search_vector, q.query) as rank
+        FROM crops c
+        CROSS JOIN to_tsquery('simple', %s) AS q (query)
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE c.search_vector @@ q.query AND c.status = 'available' AND c.price <= %s
+        ORDER BY rank DESC, c.created_at DESC, c.id DESC
+        LIMIT %s
+     """,
+     'params': lambda ctx: (to_prefix_tsquery(ctx['search_term']), 500, SEARCH_LIMIT)},
+    {'name': 'distributor.retailers', 'page': 'distributor_dashboard.get_retailers',
+     'sql': "SELECT id, name FROM users WHERE role = 'Retailer'",
+     'params': lambda ctx: None},
+    {'name': 'distributor.deliveries', 'page': 'distributor_dashboard.render_deliveries',
+     'sql': """
+        SELECT d.*, c.name as crop_name, c.quantity, c.price, c.batch_id,
+               u1.name as farmer_name, u2.name as retailer_name
+        FROM deliveries d
+        LEFT JOIN crops c ON d.crop_id = c.id
+        LEFT JOIN users u1 ON c.farmer_id = u1.id
+        LEFT JOIN users u2 ON d.retailer_id = u2.id
+        WHERE d.distributor_id = %s
+        ORDER BY d.created_at DESC, d.id DESC LIMIT %s
+     """,
+     'params': lambda ctx: (ctx['distributor_id'], PAGE_LIMIT)},
+    {'name': 'distributor.transport.active_routes', 'page': 'distributor_dashboard.render_transport',
+     'sql': """
+        SELECT d.*, c.name as crop_name, u.name as retailer_name
+        FROM deliveries d
+        LEFT JOIN crops c ON d.crop_id = c.id
+        LEFT JOIN users u ON d.retailer_id = u.id
+        WHERE d.distributor_id = %s AND d.status = 'in_transit'
+        ORDER BY d.delivery_date ASC
+     """,
+     'params': lambda ctx: (ctx['distributor_id'],)},
+    {'name': 'distributor.payments.received', 'page': 'distributor_dashboard.render_payments',
+     'sql': """
+        SELECT p.*, c.name as crop_name, u.name as from_user_name
+        FROM payments p
+        LEFT JOIN crops c ON p.crop_id = c.id
+        LEFT JOIN users u ON p.from_user_id = u.id
+        WHERE p.to_user_id = %s
+        ORDER BY p.created_at DESC
+     """,
+     'params': lambda ctx: (ctx['distributor_id'],)},
+    {'name': 'distributor.payments.unpaid_crops', 'page': 'distributor_dashboard.render_payments',
+     'sql': """
+        SELECT c.*, u.name as farmer_name, t.id as transaction_id
+        FROM crops c
+        LEFT JOIN users u ON c.farmer_id = u.id
+        LEFT JOIN transactions t ON c.id = t.crop_id
+        WHERE c.status IN ('in_transit', 'delivered')
+        AND NOT EXISTS (
+            SELECT 1 FROM payments p
+            WHERE p.crop_id = c.id AND p.from_user_id = %s
+        )
+        AND t.to_user_id = %s
+     """,
+     'params': lambda ctx: (ctx['distributor_id'], ctx['distributor_id'])},
+
+    # retailer_dashboard
+    {'name': 'retailer.overview.summary', 'page': 'retailer_dashboard.render_overview',
+     'sql': "SELECT * FROM user_summaries WHERE user_id = ANY(%s)",
+     'params': lambda ctx: ([ctx['retailer_id']],)},
+    {'name': 'retailer.deliveries', 'page': 'retailer_dashboard.render_deliveries',
+     'sql': """
+        SELECT d.*, c.name as crop_name, c.quantity, c.price, c.batch_id,
+               u1.name as farmer_name, u2.name as distributor_name, p.id as payment_id
+        FROM deliveries d
+        LEFT JOIN crops c ON d.crop_id = c.id
+        LEFT JOIN users u1 ON c.farmer_id = u1.id
+        LEFT JOIN users u2 ON d.distributor_id = u2.id
+        LEFT JOIN LATERAL (
+            SELECT id FROM payments
+            WHERE from_user_id = d.retailer_id AND crop_id = d.crop_id
+            LIMIT 1
+        ) p ON TRUE
+        WHERE d.retailer_id = %s
+        ORDER BY d.created_at DESC, d.id DESC LIMIT %s
+     """,
+     'params': lambda ctx: (ctx['retailer_id'], PAGE_LIMIT)},
+    {'name': 'retailer.stock', 'page': 'retailer_dashboard.render_stock',
+     'sql': """
+        SELECT c.*, d.id as delivery_id, u.name as farmer_name
+        FROM crops c
+        LEFT JOIN deliveries d ON c.id = d.crop_id
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE d.retailer_id = %s AND d.status = 'delivered'
+        ORDER BY d.created_at DESC
+     """,
+     'params': lambda ctx: (ctx['retailer_id'],)},
+    {'name': 'retailer.sales.daily', 'page': 'retailer_dashboard.render_sales',
+     'sql': ROLLUP_DIMENSION_SERIES_SQL,
+     'params': lambda ctx: ('completed_payments_by_payer', 'day', _days_ago(30).date(), str(ctx['retailer_id']))},
+    {'name': 'retailer.payments.made', 'page': 'retailer_dashboard.render_payments',
+     'sql': """
+        SELECT p.*, c.name as crop_name, u.name as to_user_name
+        FROM payments p
+        LEFT JOIN crops c ON p.crop_id = c.id
+        LEFT JOIN users u ON p.to_user_id = u.id
+        WHERE p.from_user_id = %s
+        ORDER BY p.created_at DESC
+     """,
+     'params': lambda ctx: (ctx['retailer_id'],)},
+    {'name': 'retailer.payments.pending', 'page': 'retailer_dashboard.render_payments',
+     'sql': """
+        SELECT d.*, c.name as crop_name, c.price, c.quantity, u.name as distributor_name
+        FROM deliveries d
+        LEFT JOIN crops c ON d.crop_id = c.id
+        LEFT JOIN users u ON d.distributor_id = u.id
+        WHERE d.retailer_id = %s AND d.status = 'delivered'
+        AND NOT EXISTS (
+            SELECT 1 FROM payments p
+            WHERE p.crop_id = d.crop_id AND p.from_user_id = %s
+        )
+     """,
+     'params': lambda ctx: (ctx['retailer_id'], ctx['retailer_id'])},
+
+    # buyer_dashboard
+    {'name': 'buyer.trace.document', 'page': 'buyer_dashboard.display_traceability',
+     'sql': TRACE_DOCUMENT_SQL,
+     'params': lambda ctx: (ctx['batch_id'],)},
+
+    # admin_dashboard
+    {'name': 'admin.analytics.counters', 'page': 'admin_dashboard.render_analytics',
+     'sql': "SELECT name, value FROM stats_counters", 'params': lambda ctx: None},
+    {'name': 'admin.analytics.users_by_role', 'page': 'admin_dashboard.render_analytics',
+     'sql': ROLLUP_TOTALS_SQL, 'params': lambda ctx: ('users_by_role',)},
+    {'name': 'admin.analytics.crops_by_type', 'page': 'admin_dashboard.render_analytics',
+     'sql': "SELECT type, COUNT(*) as count FROM crops GROUP BY type", 'params': lambda ctx: None},
+    {'name': 'admin.analytics.payment_trends', 'page': 'admin_dashboard.render_analytics',
+     'sql': ROLLUP_DIMENSION_SERIES_SQL,
+     'params': lambda ctx: ('payments_by_status', 'day', _days_ago(30).date(), 'completed')},
+    {'name': 'admin.analytics.recent', 'page': 'admin_dashboard.render_analytics',
+     'sql': build_metrics_query(('recent_users', 'recent_crops', 'recent_transactions', 'active_deliveries'))[0],
+     'params': lambda ctx: (_days_ago(30).date(),) * 3},
+    {'name': 'admin.users', 'page': 'admin_dashboard.render_users',
+     'sql': "SELECT * FROM users WHERE 1=1 ORDER BY created_at DESC, id DESC LIMIT %s",
+     'params': lambda ctx: (PAGE_LIMIT,)},
+    {'name': 'admin.users.facets', 'page': 'admin_dashboard.render_users',
+     'sql': "SELECT role, status, COUNT(*) as count FROM users WHERE 1=1 GROUP BY role, status",
+     'params': lambda ctx: None},
+    {'name': 'admin.users.summary', 'page': 'admin_dashboard.render_users',
+     'sql': """
+        SELECT COUNT(*) as total,
+               COUNT(*) FILTER (WHERE status = 'active') as active,
+               COUNT(*) FILTER (WHERE status = 'pending') as pending
+        FROM users WHERE 1=1
+     """,
+     'params': lambda ctx: None},
+    {'name': 'admin.users.page_summaries', 'page': 'admin_dashboard.render_users',
+     'sql': "SELECT * FROM user_summaries WHERE user_id = ANY(%s)",
+     'params': lambda ctx: ([ctx['farmer_id'], ctx['distributor_id'], ctx['retailer_id'], *range(1, PAGE_LIMIT - 2)],)},
+    {'name': 'admin.crops', 'page': 'admin_dashboard.render_crops',
+     'sql': """
+        SELECT c.*, u.name as farmer_name, u.email as farmer_email
+        FROM crops c
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE 1=1
+        ORDER BY c.created_at DESC, c.id DESC LIMIT %s
+     """,
+     'params': lambda ctx: (PAGE_LIMIT,)},
+    {'name': 'admin.crops.summary', 'page': 'admin_dashboard.render_crops',
+     'sql': """
+        SELECT COUNT(*) as total,
+               COUNT(*) FILTER (WHERE c.status = 'available') as available,
+               COALESCE(SUM(c.price * c.quantity), 0) as total_value
+        FROM crops c
+        WHERE 1=1
+     """,
+     'params': lambda ctx: None},
+    {'name': 'admin.crops.facets', 'page': 'admin_dashboard.render_crops',
+     'sql': "SELECT type, status, COUNT(*) as count FROM crops c WHERE 1=1 GROUP BY type, status",
+     'params': lambda ctx: None},
+    {'name': 'admin.crops.search', 'page': 'admin_dashboard.render_crops',
+     'sql': """
+        SELECT c.*, u.name as farmer_name, u.email as farmer_email
+        FROM crops c
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE 1=1 AND c.search_vector @@ to_tsquery('simple', %s)
+        ORDER BY c.created_at DESC, c.id DESC LIMIT %s
+     """,
+     'params': lambda ctx: (to_prefix_tsquery(ctx['search_term']), PAGE_LIMIT)},
+    {'name': 'admin.crop_traceability', 'page': 'admin_dashboard.show_crop_traceability',
+     'sql': TRACE_DOCUMENT_SQL,
+     'params': lambda ctx: (ctx['batch_id'],)},
+    {'name': 'admin.payments.totals', 'page': 'admin_dashboard.render_payments',
+     'sql': build_metrics_query(('completed_payments', 'pending_payments', 'failed_payments'))[0],
+     'params': lambda ctx: None},
+    {'name': 'admin.payments.list', 'page': 'admin_dashboard.render_payments',
+     'sql': """
+        SELECT p.*,
+               u1.name as from_user_name, u1.role as from_user_role,
+               u2.name as to_user_name, u2.role as to_user_role,
+               c.name as crop_name
+        FROM payments p
+        LEFT JOIN users u1 ON p.from_user_id = u1.id
+        LEFT JOIN users u2 ON p.to_user_id = u2.id
+        LEFT JOIN crops c ON p.crop_id = c.id
+        WHERE 1=1
+        ORDER BY p.created_at DESC, p.id DESC LIMIT %s
+     """,
+     'params': lambda ctx: (PAGE_LIMIT,)},
+    {'name': 'admin.reports.delivery_totals', 'page': 'admin_dashboard.render_supply_chain_report',
+     'sql': build_metrics_query(('total_deliveries', 'completed_deliveries', 'avg_delivery_days'))[0],
+     'params': lambda ctx: None},
+    {'name': 'admin.reports.delivery_status', 'page': 'admin_dashboard.render_supply_chain_report',
+     'sql': "SELECT status, COUNT(*) as count FROM deliveries GROUP BY status", 'params': lambda ctx: None},
+    {'name': 'admin.reports.lead_time_by_distributor', 'page': 'admin_dashboard.render_supply_chain_report',
+     'sql': """
+        SELECT dist.name as distributor, s.deliveries,
+               ROUND(s.avg_hours / 24, 1) as avg_days,
+               ROUND(s.p50_hours / 24, 1) as p50_days,
+               ROUND(s.p90_hours / 24, 1) as p90_days
+        FROM (
+            SELECT distributor_id, COUNT(*) as deliveries, AVG(lead_time_hours) as avg_hours,
+                   PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY lead_time_hours)::NUMERIC as p50_hours,
+                   PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY lead_time_hours)::NUMERIC as p90_hours
+            FROM deliveries
+            WHERE lead_time_hours IS NOT NULL
+            GROUP BY distributor_id
+        ) s
+        LEFT JOIN users dist ON dist.id = s.distributor_id
+        ORDER BY s.deliveries DESC
+     """,
+     'params': lambda ctx: None},
+    {'name': 'admin.reports.registrations', 'page': 'admin_dashboard.render_user_activity_report',
+     'sql': ROLLUP_SERIES_SQL, 'params': lambda ctx: ('users_by_role', 'day', _days_ago(30).date())},
+    {'name': 'admin.reports.users_by_role', 'page': 'admin_dashboard.render_user_activity_report',
+     'sql': ROLLUP_TOTALS_SQL, 'params': lambda ctx: ('users_by_role',)},
+    {'name': 'admin.reports.most_active_users', 'page': 'admin_dashboard.render_user_activity_report',
+     'sql': """
+        SELECT u.name, u.role, a.crops, a.deliveries, a.payments, a.score
+        FROM user_activity a
+        JOIN users u ON u.id = a.user_id
+        WHERE u.status = 'active'
+        ORDER BY a.score DESC
+        LIMIT %s
+     """,
+     'params': lambda ctx: (10,)},
+    {'name': 'admin.reports.most_active_users_30d', 'page': 'admin_dashboard.render_user_activity_report',
+     'sql': """
+        SELECT u.name, u.role,
+               SUM(a.crops) as crops, SUM(a.deliveries) as deliveries, SUM(a.payments) as payments,
+               SUM(a.crops + a.deliveries + a.payments) as score
+        FROM user_activity_daily a
+        JOIN users u ON u.id = a.user_id
+        WHERE a.day > %s AND u.status = 'active'
+        GROUP BY u.id, u.name, u.role
+        ORDER BY score DESC
+        LIMIT %s
+     """,
+     'params': lambda ctx: (_days_ago(30).date(), 10)},
+    {'name': 'admin.reports.payment_stats', 'page': 'admin_dashboard.render_financial_report',
+     'sql': ROLLUP_TOTALS_SQL, 'params': lambda ctx: ('payments_by_status',)},
+    {'name': 'admin.reports.monthly_payments', 'page': 'admin_dashboard.render_financial_report',
+     'sql': ROLLUP_DIMENSION_SERIES_SQL,
+     'params': lambda ctx: ('payments_by_status', 'month', _days_ago(365).date().replace(day=1), 'completed')},
+    {'name': 'admin.reports.crop_types', 'page': 'admin_dashboard.render_crop_production_report',
+     'sql': """
+        SELECT type, COUNT(*) as crop_count, SUM(quantity) as total_quantity, AVG(price) as avg_price
+        FROM crops
+        GROUP BY type
+        ORDER BY total_quantity DESC
+     """,
+     'params': lambda ctx: None},
+    {'name': 'admin.reports.top_farmers', 'page': 'admin_dashboard.render_crop_production_report',
+     'sql': """
+        SELECT u.name, COUNT(c.id) as crop_batches, SUM(c.quantity) as total_quantity,
+               SUM(c.price * c.quantity) as total_value
+        FROM users u
+        JOIN crops c ON u.id = c.farmer_id
+        WHERE u.role = 'Farmer'
+        GROUP BY u.id, u.name
+        ORDER BY total_quantity DESC
+        LIMIT 10
+     """,
+     'params': lambda ctx: None},
+    {'name': 'admin.reports.trace_completeness', 'page': 'admin_dashboard.render_quality_metrics_report',
+     'sql': "SELECT batches, complete FROM trace_completeness WHERE dimension = 'all'",
+     'params': lambda ctx: None},
+    {'name': 'admin.reports.trace_completeness_by_type', 'page': 'admin_dashboard.render_quality_metrics_report',
+     'sql': """
+        SELECT t.value as crop_type, t.batches, t.complete,
+               ROUND(100.0 * t.complete / t.batches, 1) as completeness
+        FROM trace_completeness t
+        WHERE t.dimension = 'crop_type' AND t.batches > 0
+        ORDER BY t.batches DESC
+     """,
+     'params': lambda ctx: None},
+    {'name': 'admin.reports.trace_completeness_by_farmer', 'page': 'admin_dashboard.render_quality_metrics_report',
+     'sql': """
+        SELECT u.name as farmer, t.batches, t.complete,
+               ROUND(100.0 * t.complete / t.batches, 1) as completeness
+        FROM trace_completeness t
+        LEFT JOIN users u ON u.id = NULLIF(t.value, '')::INTEGER
+        WHERE t.dimension = 'farmer' AND t.batches > 0
+        ORDER BY t.batches DESC
+        LIMIT %s
+     """,
+     'params': lambda ctx: (20,)},
+    {'name': 'admin.reports.payment_reliability', 'page': 'admin_dashboard.render_quality_metrics_report',
+     'sql': """
+        SELECT COUNT(*) as total_payments,
+               SUM(CASE WHEN payment_status = 'completed' THEN 1 ELSE 0 END) as completed_payments
+        FROM payments
+     """,
+     'params': lambda ctx: None},
+
+    # auth
+    {'name': 'auth.login', 'page': 'auth.login_user',
+     'sql': """
+        SELECT id, name, email, role, status
+        FROM users
+        WHERE email = %s AND password_hash = %s AND status = 'active'
+     """,
+     'params': lambda ctx: (ctx['email'], '0' * 64)},
+]
+
+# Representative ids: the busiest user of each role, so list pages are measured at their worst
+CONTEXT_QUERIES = {
+    'farmer_id': "SELECT farmer_id FROM crops GROUP BY farmer_id ORDER BY COUNT(*) DESC LIMIT 1",
+    'distributor_id': "SELECT distributor_id FROM deliveries GROUP BY distributor_id ORDER BY COUNT(*) DESC LIMIT 1",
+    'retailer_id': "SELECT retailer_id FROM deliveries GROUP BY retailer_id ORDER BY COUNT(*) DESC LIMIT 1",
+    'crop_id': "SELECT crop_id FROM deliveries WHERE status = 'delivered' ORDER BY id LIMIT 1",
+    'batch_id': "SELECT batch_id FROM traceability GROUP BY batch_id ORDER BY COUNT(*) DESC LIMIT 1",
+    'email': "SELECT email FROM users ORDER BY id DESC LIMIT 1",
+}
+
+def load_context(cursor, search_term='tom'):
+    """Pick representative ids from the loaded data"""
+    context = {'search_term': search_term}
+    for key, query in CONTEXT_QUERIES.items():
+        cursor.execute(query)
+        row = cursor.fetchone()
+        context[key] = row[0] if row else None
+    return context
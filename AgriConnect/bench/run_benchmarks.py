@@ -0,0 +1,163 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import date, datetime
+from database import get_connection, release_connection, init_database
+from bench.queries import QUERIES, load_context
+from bench.seed_data import SCALES, seed
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+def time_query(cursor, entry, context, iterations, warmup):
+    """Run one catalog entry repeatedly and return latency statistics in ms"""
+    params = entry['params'](context)
+    samples = []
+    rows = 0
+    
+    for i in range(warmup + iterations):
+        started = time.perf_counter()
+        cursor.execute(entry['sql'], params)
+        rows = len(cursor.fetchall()) if cursor.description else cursor.rowcount
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        # Writes are measured inside a transaction that is always rolled back
+        cursor.connection.rollback()
+        if i >= warmup:
+            samples.append(elapsed)
+    
+    return {
+        'name': entry['name'],
+        'page': entry['page'],
+        'iterations': iterations,
+        'rows': rows,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+def run_suite(scale, iterations, warmup, name_filter=None):
+    """Benchmark the catalog against the data currently loaded"""
+    conn = get_connection()
+    if not conn:
+        raise RuntimeError("No database connection available")
+    
+    try:
+        cursor = conn.cursor()
+        context = load_context(cursor)
+        cursor.execute("SHOW server_version")
+        server_version = cursor.fetchone()[0]
+        conn.rollback()
+        
+        results = []
+        for entry in QUERIES:
+            if name_filter and name_filter not in entry['name']:
+                continue
+            try:
+                result = time_query(cursor, entry, context, iterations, warmup)
+            except Exception as e:
+                conn.rollback()
+                result = {'name': entry['name'], 'page': entry['page'], 'error': str(e)}
+            result['scale'] = scale
+            results.append(result)
+            if 'error' in result:
+                print(f"  {entry['name']:<45} ERROR {result['error']}")
+            else:
+                print(f"  {entry['name']:<45} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  rows {result['rows']:>8,}")
+        
+        cursor.close()
+        return results, server_version, context
+    finally:
+        release_connection(conn)
+
+def git_revision():
+    """Get the current commit hash, if available"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def compare(old_path, new_path):
+    """Print p50/p95 changes between two result files"""
+    with open(old_path) as f:
+        old = {(r['scale'], r['name']): r for r in json.load(f)['results'] if 'error' not in r}
+    with open(new_path) as f:
+        new = {(r['scale'], r['name']): r for r in json.load(f)['results'] if 'error' not in r}
+    
+    print(f"{'scale':<8} {'query':<45} {'p50 old':>10} {'p50 new':>10} {'p95 old':>10} {'p95 new':>10} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        change = (after['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+        print(f"{key[0]:<8} {key[1]:<45} {before['p50_ms']:>10.2f} {after['p50_ms']:>10.2f} "
+              f"{before['p95_ms']:>10.2f} {after['p95_ms']:>10.2f} {change:>+7.1f}%")
+    
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:<8} {key[1]:<45} only in {'old' if key in old else 'new'} run")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AgriTrace page queries")
+    parser.add_argument('--scales', default='tiny,small', help=f"comma-separated subset of {', '.join(SCALES)}")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', type=date.fromisoformat, default=date.today(),
+                        help="last day of the generated history (YYYY-MM-DD)")
+    parser.add_argument('--no-seed', action='store_true', help="benchmark the data already loaded")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--filter', help="only run queries whose name contains this text")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="directory for the JSON results")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files and exit")
+    args = parser.parse_args()
+    
+    if args.compare:
+        compare(*args.compare)
+        return
+    
+    if not init_database():
+        raise SystemExit("Database initialization failed")
+    
+    scales = ['current'] if args.no_seed else [s.strip() for s in args.scales.split(',') if s.strip()]
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'seed': None if args.no_seed else args.seed,
+            'as_of': None if args.no_seed else args.as_of.isoformat(),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'scales': {},
+        },
+        'results': [],
+    }
+    
+    for scale in scales:
+        if scale != 'current':
+            print(f"Seeding scale={scale}")
+            report['meta']['scales'][scale] = seed(scale, args.seed, reset=True, as_of=args.as_of)
+        print(f"Benchmarking scale={scale}")
+        results, server_version, context = run_suite(scale, args.iterations, args.warmup, args.filter)
+        report['meta']['server_version'] = server_version
+        report['meta'].setdefault('contexts', {})[scale] = context
+        report['results'].extend(results)
+    
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from database import get_connection, release_connection, init_database
+from auth import hash_password
+
+# Row targets per scale; traceability averages several steps per batch with a long tail
+SCALES = {
+    'tiny': {'users': 200, 'crops': 2_000, 'traceability': 10_000, 'payments': 1_000},
+    'small': {'users': 2_000, 'crops': 50_000, 'traceability': 400_000, 'payments': 25_000},
+    'medium': {'users': 20_000, 'crops': 250_000, 'traceability': 2_500_000, 'payments': 125_000},
+    'large': {'users': 100_000, 'crops': 1_000_000, 'traceability': 10_000_000, 'payments': 500_000},
+}
+
+ROLE_MIX = [('Farmer', 0.60), ('Distributor', 0.06), ('Retailer', 0.14), ('Buyer', 0.199), ('Admin', 0.001)]
+CROP_TYPES = [('Cereals', 0.30), ('Vegetables', 0.28), ('Fruits', 0.18), ('Pulses', 0.12), ('Spices', 0.07), ('Other', 0.05)]
+CROP_NAMES = {
+    'Cereals': ['Wheat', 'Rice', 'Maize', 'Barley', 'Millet', 'Sorghum'],
+    'Vegetables': ['Tomato', 'Potato', 'Onion', 'Cabbage', 'Carrot', 'Spinach', 'Okra', 'Brinjal'],
+    'Fruits': ['Mango', 'Banana', 'Apple', 'Grapes', 'Papaya', 'Guava'],
+    'Pulses': ['Chickpea', 'Lentil', 'Pigeon Pea', 'Mung Bean', 'Black Gram'],
+    'Spices': ['Turmeric', 'Chilli', 'Cumin', 'Coriander', 'Cardamom'],
+    'Other': ['Sugarcane', 'Cotton', 'Groundnut', 'Soybean'],
+}
+# Lifecycle mix for crops: most lots move through the chain, some are still on the farm
+CROP_STATUS = [('available', 0.25), ('in_transit', 0.15), ('delivered', 0.45), ('sold', 0.15)]
+PAYMENT_STATUS = [('completed', 0.85), ('pending', 0.12), ('failed', 0.03)]
+PAYMENT_METHODS = ['UPI', 'Bank Transfer', 'Cash', 'Cheque']
+
+# Timestamps span the days before --as-of, so the same seed and as-of date give the same rows
+HISTORY_DAYS = 730
+COPY_CHUNK_ROWS = 50_000
+# Crops generated (with their deliveries, payments and trace steps) per batch
+GENERATE_CHUNK_CROPS = 5_000
+# Every seeded account shares this password so the load harness can log in as any of them
+SEED_PASSWORD = 'agritrace-seed'
+PASSWORD_HASH = hash_password(SEED_PASSWORD)
+
+def weighted(rng, choices):
+    """Pick a value from (value, weight) pairs"""
+    roll = rng.random()
+    cumulative = 0.0
+    for value, weight in choices:
+        cumulative += weight
+        if roll <= cumulative:
+            return value
+    return choices[-1][0]
+
+def skewed_index(rng, size, skew=3.0):
+    """Pick an index in [0, size) biased towards the low end so a few ids dominate"""
+    return min(int(size * rng.random() ** skew), size - 1)
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into a table with COPY, chunked to keep memory bounded"""
+    buffer = io.StringIO()
+    count = 0
+    total = 0
+    
+    def flush():
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)", buffer)
+        buffer.seek(0)
+        buffer.truncate()
+    
+    for row in rows:
+        buffer.write('\t'.join('\\N' if value is None else str(value) for value in row))
+        buffer.write('\n')
+        count += 1
+        total += 1
+        if count >= COPY_CHUNK_ROWS:
+            flush()
+            count = 0
+    
+    if count:
+        flush()
+    return total
+
+# Columns loaded per table, in foreign-key order
+TABLE_COLUMNS = {
+    'users': ('id', 'name', 'email', 'phone', 'role', 'password_hash', 'status', 'created_at'),
+    'crops': ('id', 'farmer_id', 'name', 'type', 'quantity', 'price', 'harvest_date', 'batch_id',
+              'status', 'photo_url', 'created_at'),
+    'transactions': ('id', 'crop_id', 'from_user_id', 'to_user_id', 'transaction_type', 'amount', 'status',
+                     'transport_details', 'created_at'),
+    'payments': ('id', 'amount', 'from_user_id', 'to_user_id', 'crop_id', 'payment_status',
+                 'payment_method', 'transaction_id', 'created_at'),
+    'deliveries': ('id', 'crop_id', 'distributor_id', 'retailer_id', 'transport_details', 'delivery_date',
+                   'status', 'tracking_info', 'created_at'),
+    'traceability': ('id', 'batch_id', 'step_type', 'user_id', 'location', 'timestamp', 'details', 'status'),
+}
+
+def generate(scale, seed, as_of):
+    """Yield (table, rows) batches in foreign-key order; identical (scale, seed, as_of) gives identical data
+    
+    Users come first as one stream; crops and everything hanging off them follow one
+    GENERATE_CHUNK_CROPS block of crops at a time, so memory stays flat at any scale.
+    """
+    counts = SCALES[scale]
+    rng = random.Random(seed)
+    trace_rng = random.Random(seed + 1)
+    now = datetime.combine(as_of, datetime.min.time())
+    start = now - timedelta(days=HISTORY_DAYS)
+    
+    # Only the ids by role are kept, since every other table references users through them
+    by_role = {role: [] for role, _ in ROLE_MIX}
+    
+    def user_rows():
+        for user_id in range(1, counts['users'] + 1):
+            role = weighted(rng, ROLE_MIX) if user_id > 1 else 'Admin'
+            created_at = start + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+            status = weighted(rng, [('active', 0.92), ('pending', 0.05), ('inactive', 0.03)])
+            by_role[role].append(user_id)
+            yield (user_id, f"{role} {user_id}", f"user{user_id}@example.com", f"9{user_id:09d}",
+                   role, PASSWORD_HASH, status, created_at)
+    
+    yield 'users', user_rows()
+    
+    for role in ('Farmer', 'Distributor', 'Retailer'):
+        if not by_role[role]:
+            by_role[role].append(counts['users'])
+    
+    farmers = by_role['Farmer']
+    distributors = by_role['Distributor']
+    retailers = by_role['Retailer']
+    
+    # Extra retail sale events beyond the base chain, spread over retailed batches with a long tail;
+    # sized from the expected status mix since later batches aren't generated yet
+    status_share = dict(CROP_STATUS)
+    delivered_share = status_share['delivered'] + status_share['sold']
+    moved_share = delivered_share + status_share['in_transit']
+    base_steps = counts['crops'] * (1 + moved_share + delivered_share + status_share['sold'])
+    extra_rate = max(counts['traceability'] - base_steps, 0) / max(counts['crops'] * delivered_share, 1)
+    
+    payments_budget = counts['payments']
+    delivery_id = transaction_id = payment_id = trace_id = 0
+    
+    for first_crop in range(1, counts['crops'] + 1, GENERATE_CHUNK_CROPS):
+        crops, deliveries, transactions, payments, traces = [], [], [], [], []
+        
+        for crop_id in range(first_crop, min(first_crop + GENERATE_CHUNK_CROPS, counts['crops'] + 1)):
+            crop_type = weighted(rng, CROP_TYPES)
+            name = rng.choice(CROP_NAMES[crop_type])
+            farmer_id = farmers[skewed_index(rng, len(farmers))]
+            quantity = round(rng.lognormvariate(5, 1), 2)
+            price = round(rng.uniform(10, 300), 2)
+            created_at = start + timedelta(seconds=rng.randrange(HISTORY_DAYS * 86400))
+            status = weighted(rng, CROP_STATUS)
+            batch_id = f"BATCH_{crop_id:08X}"
+            crops.append((crop_id, farmer_id, name, crop_type, min(quantity, 99_999_999), price,
+                          created_at.date(), batch_id, status, None, created_at))
+            trace_id += 1
+            traces.append((trace_id, batch_id, 'Harvest', farmer_id, None, created_at, 'Crop harvested by farmer', 'active'))
+            
+            if status == 'available':
+                continue
+            
+            distributor_id = distributors[skewed_index(rng, len(distributors), 2.0)]
+            retailer_id = retailers[skewed_index(rng, len(retailers), 2.0)]
+            picked_up = created_at + timedelta(hours=rng.randrange(6, 96))
+            delivery_status = 'in_transit' if status == 'in_transit' else 'delivered'
+            transport = f"Truck {rng.randrange(1000, 9999)}"
+            delivery_id += 1
+            deliveries.append((delivery_id, crop_id, distributor_id, retailer_id, transport,
+                               (picked_up + timedelta(days=2)).date(), delivery_status, None, picked_up))
+            transaction_id += 1
+            transactions.append((transaction_id, crop_id, farmer_id, distributor_id, 'procurement',
+                                 None, 'pending', 'Truck', picked_up))
+            
+            if payments_budget > 0:
+                amount = round(min(price * quantity, 99_999_999), 2)
+                payment_id += 1
+                payments.append((payment_id, amount, distributor_id, farmer_id, crop_id,
+                                 weighted(rng, PAYMENT_STATUS), rng.choice(PAYMENT_METHODS),
+                                 f"TXN{payment_id:010d}", picked_up + timedelta(hours=rng.randrange(1, 72))))
+                payments_budget -= 1
+            if delivery_status == 'delivered' and payments_budget > 0:
+                amount = round(min(price * quantity * 1.1, 99_999_999), 2)
+                payment_id += 1
+                payments.append((payment_id, amount, retailer_id, distributor_id, crop_id,
+                                 weighted(rng, PAYMENT_STATUS), rng.choice(PAYMENT_METHODS),
+                                 f"TXN{payment_id:010d}", picked_up + timedelta(days=rng.randrange(2, 10))))
+                payments_budget -= 1
+            
+            trace_id += 1
+            traces.append((trace_id, batch_id, 'Transport', distributor_id, None, picked_up,
+                           f"Picked up by distributor - {transport}", 'active'))
+            if delivery_status != 'delivered':
+                continue
+            
+            retail_at = picked_up + timedelta(hours=trace_rng.randrange(12, 120))
+            trace_id += 1
+            traces.append((trace_id, batch_id, 'Retail', retailer_id, None, retail_at, 'Received by retailer', 'active'))
+            
+            sales = (1 if status == 'sold' else 0) + (int(trace_rng.expovariate(1 / extra_rate)) if extra_rate else 0)
+            for sale in range(sales):
+                trace_id += 1
+                traces.append((trace_id, batch_id, 'Sale', retailer_id, None,
+                               retail_at + timedelta(hours=1 + sale), 'Sold to customer: Anonymous', 'active'))
+        
+        yield 'crops', crops
+        yield 'transactions', transactions
+        yield 'payments', payments
+        yield 'deliveries', deliveries
+        yield 'traceability', traces
+
+def seed(scale, seed_value=42, reset=False, as_of=None):
+    """Generate and load a dataset; returns the row count loaded per table"""
+    if not init_database():
+        raise RuntimeError("Database initialization failed")
+    
+    conn = get_connection()
+    if not conn:
+        raise RuntimeError("No database connection available")
+    
+    loaded = {table: 0 for table in TABLE_COLUMNS}
+    elapsed = {table: 0.0 for table in TABLE_COLUMNS}
+    try:
+        cursor = conn.cursor()
+        if reset:
+            cursor.execute("TRUNCATE users, crops, transactions, payments, traceability, deliveries RESTART IDENTITY CASCADE")
+        else:
+            # Generated ids, emails and batch ids start from 1 and would collide with existing rows
+            cursor.execute(f"SELECT {' OR '.join(f'EXISTS (SELECT 1 FROM {table})' for table in TABLE_COLUMNS)}")
+            if cursor.fetchone()[0]:
+                raise RuntimeError("Tables already hold data; pass --reset to replace it")
+        
+        for table, rows in generate(scale, seed_value, as_of or date.today()):
+            started = time.perf_counter()
+            loaded[table] += copy_rows(cursor, table, TABLE_COLUMNS[table], rows)
+            elapsed[table] += time.perf_counter() - started
+        
+        for table in TABLE_COLUMNS:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST((SELECT MAX(id) FROM {table}), 1))")
+            print(f"  {table:<13} {loaded[table]:>11,} rows in {elapsed[table]:6.1f}s")
+        
+        conn.commit()
+        
+        # ANALYZE can't see uncommitted rows reliably, so refresh planner stats after commit
+        conn.autocommit = True
+        cursor.execute("ANALYZE")
+        conn.autocommit = False
+        cursor.close()
+        return loaded
+    
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_connection(conn)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the AgriTrace tables with deterministic synthetic data")
+    parser.add_argument('--scale', choices=SCALES.keys(), default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help="truncate all tables before loading (required if they hold data)")
+    parser.add_argument('--as-of', type=date.fromisoformat, default=date.today(),
+                        help="last day of the generated history (YYYY-MM-DD)")
+    args = parser.parse_args()
+    
+    print(f"Seeding scale={args.scale} seed={args.seed} as_of={args.as_of}")
+    seed(args.scale, args.seed, args.reset, args.as_of)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import platform
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+from database import execute_query, get_pool_stats
+from cache import get_cache_stats
+from trace_service import make_server
+from bench.run_benchmarks import DEFAULT_OUTPUT_DIR, git_revision, percentile
+
+def load_batch_ids(limit):
+    """Get up to limit random batch ids that have a crop"""
+    rows = execute_query("SELECT batch_id FROM crops ORDER BY random() LIMIT %s", (limit,), fetch=True)
+    return [row['batch_id'] for row in rows or []]
+
+def start_local_server(cache_ttl, max_age):
+    """Run the trace service on a free local port in this process and return its base URL"""
+    server = make_server('127.0.0.1', 0, cache_ttl, max_age)
+    threading.Thread(target=server.serve_forever, name="trace-service", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+class Recorder:
+    """Thread-safe latency samples and status counts"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = []
+        self.statuses = Counter()
+        self.first_error = None
+    
+    def record(self, status, elapsed_ms, error=None):
+        with self._lock:
+            self.samples.append(elapsed_ms)
+            self.statuses[status] += 1
+            if error and self.first_error is None:
+                self.first_error = error
+
+def fetch(url, etag=None, timeout=10):
+    """GET url and return (status, etag)"""
+    headers = {'Accept': 'application/json'}
+    if etag:
+        headers['If-None-Match'] = etag
+    try:
+        with urlopen(Request(url, headers=headers), timeout=timeout) as response:
+            response.read()
+            return response.status, response.headers.get('ETag')
+    except HTTPError as e:
+        # 304 and 404 are answers, not failures
+        e.read()
+        return e.code, e.headers.get('ETag')
+
+def worker(base_url, batch_ids, deadline, rng, recorder, conditional_ratio, missing_ratio):
+    etags = {}
+    while time.monotonic() < deadline:
+        if rng.random() < missing_ratio:
+            batch_id = f"MISSING{rng.randrange(1000)}"
+        else:
+            batch_id = rng.choice(batch_ids)
+        etag = etags.get(batch_id) if rng.random() < conditional_ratio else None
+        
+        started = time.perf_counter()
+        try:
+            status, new_etag = fetch(f"{base_url}/trace/{quote(batch_id)}", etag)
+        except Exception as e:
+            recorder.record('error', (time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}")
+            continue
+        recorder.record(status, (time.perf_counter() - started) * 1000)
+        if new_etag:
+            etags[batch_id] = new_etag
+
+def run_load(url, duration, concurrency, batches, conditional_ratio, missing_ratio, seed_value, cache_ttl, max_age):
+    """Hammer the trace service and return the report"""
+    batch_ids = load_batch_ids(batches)
+    if not batch_ids:
+        raise RuntimeError("No crops found; seed the database first (python -m bench.seed_data)")
+    
+    server = None
+    if url is None:
+        server, url = start_local_server(cache_ttl, max_age)
+    
+    rng = random.Random(seed_value)
+    recorder = Recorder()
+    started = time.monotonic()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=worker, name=f"trace-client-{i}", daemon=True,
+                         args=(url, batch_ids, deadline, random.Random(rng.random()), recorder,
+                               conditional_ratio, missing_ratio))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    
+    samples = sorted(recorder.samples) or [0.0]
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'url': url if server is None else 'in-process',
+            'duration_s': duration,
+            'concurrency': concurrency,
+            'batches': len(batch_ids),
+            'conditional_ratio': conditional_ratio,
+            'missing_ratio': missing_ratio,
+            'seed': seed_value,
+        },
+        'totals': {
+            'elapsed_s': round(elapsed, 1),
+            'requests': len(recorder.samples),
+            'requests_per_s': round(len(recorder.samples) / elapsed, 1) if elapsed else 0.0,
+            'statuses': {str(status): count for status, count in recorder.statuses.items()},
+            'first_error': recorder.first_error,
+        },
+        'latency_ms': {
+            'p50': round(percentile(samples, 50), 2),
+            'p95': round(percentile(samples, 95), 2),
+            'p99': round(percentile(samples, 99), 2),
+            'max': round(samples[-1], 2),
+        },
+        # Only meaningful for the in-process server, which shares this process's pool and cache
+        'pool': get_pool_stats() if server is not None else None,
+        'cache': get_cache_stats() if server is not None else None,
+    }
+
+def print_report(report):
+    totals, latency = report['totals'], report['latency_ms']
+    print(f"\n{totals['requests']} requests in {totals['elapsed_s']}s ({totals['requests_per_s']}/s) "
+          f"from {report['meta']['concurrency']} clients against {report['meta']['url']}")
+    print("statuses: " + ", ".join(f"{status}={count}" for status, count in sorted(totals['statuses'].items())))
+    print(f"latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    if totals['first_error']:
+        print(f"first error: {totals['first_error']}")
+    if report['cache']:
+        cache = report['cache']
+        print(f"cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%}), {cache['entries']} entries")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the trace service and report request latency")
+    parser.add_argument('--url', default=None, help="base URL of a running service; default starts one in-process")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to keep sending requests")
+    parser.add_argument('--concurrency', type=int, default=8, help="number of client threads")
+    parser.add_argument('--batches', type=int, default=500, help="number of distinct batch ids to request")
+    parser.add_argument('--conditional-ratio', type=float, default=0.3,
+                        help="chance of revalidating with the last ETag seen for a batch")
+    parser.add_argument('--missing-ratio', type=float, default=0.05, help="chance of requesting an unknown batch")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache-ttl', type=float, default=300, help="cache TTL of the in-process server")
+    parser.add_argument('--max-age', type=int, default=60, help="max-age of the in-process server")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_DIR, help="directory for the JSON results")
+    args = parser.parse_args()
+    
+    report = run_load(args.url, args.duration, args.concurrency, args.batches, args.conditional_ratio,
+                      args.missing_ratio, args.seed, args.cache_ttl, args.max_age)
+    print_report(report)
+    
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"trace-load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+_WRITE_TABLES = re.compile(r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+def is_enabled():
+    """Check whether the result cache is switched on"""
+    return os.getenv("QUERY_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def get_cache_settings():
+    """Get cache size and default TTL from environment variables"""
+    return {
+        'max_entries': int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1024)),
+        'default_ttl': float(os.getenv("QUERY_CACHE_TTL", 30)),
+    }
+
+@lru_cache(maxsize=1024)
+def tables_read(query):
+    """Get the tables a statement reads from"""
+    return frozenset(name.lower() for name in _READ_TABLES.findall(query))
+
+@lru_cache(maxsize=1024)
+def tables_written(query):
+    """Get the tables a statement inserts into, updates or deletes from"""
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    # ON CONFLICT ... DO UPDATE SET would otherwise read as a write to a table named "set"
+    return frozenset(name.lower() for name in _WRITE_TABLES.findall(query) if name.lower() != 'set')
+
+def make_key(query, params=None, scope=None):
+    """Build a cache key from whitespace-normalized SQL, params and an optional user scope"""
+    return (" ".join(query.split()), tuple(params) if params else (), scope)
+
+class ResultCache:
+    """Thread-safe LRU of query results with per-entry TTLs and invalidation by table"""
+    
+    def __init__(self, max_entries, default_ttl):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_cap = None
+        self._entries = OrderedDict()
+        self._by_table = {}
+        # Bumped on every invalidation so a load that raced a write isn't cached
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+    
+    def get(self, key):
+        """Get (True, value) for a live entry, otherwise (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return False, None
+            
+            value, expires_at, _ = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return False, None
+            
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return True, value
+    
+    def generations(self, tables):
+        """Get the current write generation of each table"""
+        with self._lock:
+            return {table: self._generations.get(table, 0) for table in tables}
+    
+    def put(self, key, value, tables, ttl=None, generations=None):
+        """Store a result that stays valid for ttl seconds or until one of its tables is written
+        
+        When generations (from before the load) is given, the result is dropped if any of
+        its tables was written since.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        if self.ttl_cap is not None:
+            ttl = min(ttl, self.ttl_cap)
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            if generations and any(self._generations.get(t, 0) != g for t, g in generations.items()):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+    
+    def _remove(self, key):
+        _, _, tables = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+    
+    def invalidate_tables(self, tables):
+        """Drop every entry that read from any of the given tables"""
+        removed = 0
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+            self.stats['invalidations'] += removed
+        return removed
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+    
+    def get_stats(self):
+        """Get a snapshot of cache counters"""
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries), max_entries=self.max_entries, ttl_cap=self.ttl_cap)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+# Process-wide result cache shared by every session
+_cache = ResultCache(**get_cache_settings())
+
+def get_cached(query, params, scope, loader, ttl=None):
+    """Return a cached result, or run loader() and cache what it returns (None is never cached)"""
+    if not is_enabled():
+        return loader()
+    
+    key = make_key(query, params, scope)
+    hit, value = _cache.get(key)
+    if hit:
+        return value
+    
+    tables = tables_read(query)
+    generations = _cache.generations(tables)
+    value = loader()
+    if value is not None:
+        _cache.put(key, value, tables, ttl, generations)
+    return value
+
+def invalidate_tables(tables):
+    """Evict cached results that read from any of the given tables"""
+    if tables:
+        return _cache.invalidate_tables(tables)
+    return 0
+
+def invalidate_for_statement(query):
+    """Evict cached results made stale by a write statement"""
+    return invalidate_tables(tables_written(query))
+
+def set_ttl_cap(seconds):
+    """Cap the TTL of newly cached results (None removes the cap)"""
+    _cache.ttl_cap = seconds
+
+def get_cache_stats():
+    """Get result cache statistics"""
+    return _cache.get_stats()
+
+def clear_cache():
+    """Drop every cached result"""
+    _cache.clear()
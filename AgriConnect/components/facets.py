@@ -0,0 +1,20 @@
+import streamlit as st
+from database import count_facet
+
+def facet_selections(key, facets):
+    """Get each facet filter's current value from session state, whether or not it has rendered yet"""
+    return {facet: st.session_state.get(f"{key}_{facet}", "All") for facet in facets}
+
+def facet_selectbox(label, key, facet, options, rows, selections):
+    """Render a filter selectbox with a caption of how many rows each option would match
+    
+    rows come from fetch_facet_counts and selections from facet_selections, so each
+    count honours the other filters.
+    """
+    counts = count_facet(rows, facet, selections)
+    total = sum(counts.values())
+    value = st.selectbox(label, options, key=f"{key}_{facet}")
+    # Not in the option labels or help: Streamlit derives the widget ID from those, so a
+    # changed count would reset the selection
+    st.caption(" · ".join(f"{option} {total if option == 'All' else counts.get(option, 0):,}" for option in options))
+    return value
@@ -162,3 +162,6 @@ def render_admin_menu():
     if st.button("📈 Reports", use_container_width=True):
         st.session_state.admin_page = 'reports'
         st.rerun()
+    
+    st.checkbox("🧪 Profile page renders", key="profiling_enabled",
+                help="Show a timing breakdown of each rerun below the page")
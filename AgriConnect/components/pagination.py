@@ -0,0 +1,42 @@
+import streamlit as st
+from database import fetch_page
+
+PAGE_SIZES = [10, 20, 50, 100]
+DEFAULT_PAGE_SIZE = 20
+
+def paginated_rows(key, query, params=None, alias=None):
+    """Render page-size and previous/next controls and return the rows for the current page
+    
+    The cursor history lives in session state under key and resets whenever the
+    query, its params or the page size change (e.g. a filter was edited).
+    """
+    col1, col2, col3, col4 = st.columns([1, 1, 2, 1])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                 key=f"{key}_page_size")
+    
+    signature = (query, tuple(params or []), page_size)
+    state = st.session_state.get(f"{key}_pages")
+    if state is None or state['signature'] != signature:
+        # cursors[i] is where page i starts; page 0 starts at the newest row
+        state = {'signature': signature, 'cursors': [None]}
+        st.session_state[f"{key}_pages"] = state
+    
+    rows, next_cursor = fetch_page(query, params, state['cursors'][-1], page_size, alias)
+    page_number = len(state['cursors'])
+    
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("⬅️ Previous", key=f"{key}_prev", disabled=page_number == 1):
+            state['cursors'].pop()
+            st.rerun()
+    with col3:
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.caption(f"Page {page_number}")
+    with col4:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("Next ➡️", key=f"{key}_next", disabled=next_cursor is None):
+            state['cursors'].append(next_cursor)
+            st.rerun()
+    
+    return rows
@@ -0,0 +1,37 @@
+import streamlit as st
+import pandas as pd
+
+def render_profile_report(profile):
+    """Render the render-profiler breakdown for the last rerun"""
+    if not profile:
+        return
+    
+    with st.expander(f"🧪 Render profile: {profile['label']} ({profile['wall_ms']:,.0f} ms)", expanded=False):
+        col1, col2, col3, col4, col5 = st.columns(5)
+        with col1:
+            st.metric("⏱️ Wall Time", f"{profile['wall_ms']:,.0f} ms")
+        with col2:
+            st.metric("🗄️ SQL", f"{profile['query_ms']:,.0f} ms", f"{profile['query_count']} queries", delta_color="off")
+        with col3:
+            st.metric("📊 Charts", f"{profile['charts_ms']:,.0f} ms")
+        with col4:
+            st.metric("🧱 Streamlit", f"{profile['streamlit_ms']:,.0f} ms")
+        with col5:
+            st.metric("🐍 Python", f"{profile['python_ms']:,.0f} ms")
+        
+        st.caption(
+            f"{profile['markdown_calls']} markdown calls emitted {profile['markdown_bytes']:,} bytes; "
+            f"{profile['query_rows']:,} rows fetched. Timings include cProfile overhead."
+        )
+        
+        st.markdown("**Top frames by cumulative time**")
+        st.dataframe(pd.DataFrame(profile['top_frames']), use_container_width=True, hide_index=True)
+        
+        history = st.session_state.get('profile_history', [])
+        if len(history) > 1:
+            st.markdown("**Recent reruns**")
+            st.dataframe(
+                pd.DataFrame(history)[['label', 'wall_ms', 'query_count', 'query_ms', 'charts_ms', 'markdown_bytes']],
+                use_container_width=True,
+                hide_index=True
+            )
@@ -0,0 +1,264 @@
+import psycopg2
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from psycopg2.extras import RealDictCursor
+from query_stats import record_query
+
+def get_connection_params():
+    """Get connection parameters from environment variables"""
+    return {
+        'host': os.getenv("PGHOST"),
+        'database': os.getenv("PGDATABASE"),
+        'user': os.getenv("PGUSER"),
+        'password': os.getenv("PGPASSWORD"),
+        'port': os.getenv("PGPORT", 5432),
+    }
+
+def get_pool_settings():
+    """Get pool sizing and health-check settings from environment variables"""
+    min_size = int(os.getenv("PGPOOL_MIN_SIZE", 1))
+    max_size = int(os.getenv("PGPOOL_MAX_SIZE", 10))
+    return {
+        'min_size': min_size,
+        'max_size': max(max_size, min_size, 1),
+        'checkout_timeout': float(os.getenv("PGPOOL_CHECKOUT_TIMEOUT", 5)),
+        'health_check_after': float(os.getenv("PGPOOL_HEALTH_CHECK_AFTER", 30)),
+    }
+
+class ConnectionPool:
+    """Thread-safe pool that keeps idle connections open between queries"""
+    
+    def __init__(self, min_size, max_size, checkout_timeout, health_check_after):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'connects': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'discarded': 0,
+            'health_checks': 0,
+            'total_wait_ms': 0.0,
+        }
+        
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._open += 1
+    
+    def _connect(self):
+        conn = psycopg2.connect(**get_connection_params())
+        self.stats['connects'] += 1
+        return conn
+    
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._open -= 1
+        self.stats['discarded'] += 1
+    
+    def getconn(self):
+        """Check out a connection, waiting up to checkout_timeout for one to free up"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.checkout_timeout
+        
+        with self._cond:
+            conn, stale = self._take(started, deadline)
+        
+        # Connect and ping outside the lock, so a slow server doesn't hold up other checkouts
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            
+            with self._cond:
+                return self._checked_out(conn, started)
+        
+        if not stale or self._is_healthy(conn):
+            return conn
+        
+        # Replace the dead connection in the slot it still holds
+        try:
+            replacement = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._discard(conn)
+                self._cond.notify()
+            raise
+        
+        with self._cond:
+            # Count the replacement in before _discard counts the dead connection out
+            self._open += 1
+            self._discard(conn)
+        return replacement
+    
+    def _take(self, started, deadline):
+        """Pop an idle connection, or reserve a slot for a new one (None); called with the lock held"""
+        waited = False
+        while True:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if conn.closed:
+                    self._discard(conn)
+                    continue
+                
+                # Only ping connections that have been idle long enough to go stale
+                stale = time.monotonic() - idle_since >= self.health_check_after
+                if stale:
+                    self.stats['health_checks'] += 1
+                return self._checked_out(conn, started), stale
+            
+            if self._open < self.max_size:
+                self._open += 1
+                return None, False
+            
+            if not waited:
+                self.stats['waits'] += 1
+                waited = True
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._cond.wait(remaining):
+                if not self._idle and self._open >= self.max_size:
+                    self.stats['timeouts'] += 1
+                    raise TimeoutError(
+                        f"no pooled connection available after {self.checkout_timeout:.0f}s"
+                    )
+    
+    def _checked_out(self, conn, started):
+        self._in_use += 1
+        self.stats['checkouts'] += 1
+        self.stats['total_wait_ms'] += (time.perf_counter() - started) * 1000
+        return conn
+    
+    def putconn(self, conn, discard=False):
+        """Return a connection, rolling back any transaction left open"""
+        try:
+            if not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+        except Exception:
+            discard = True
+        
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    
+    def closeall(self):
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+    
+    def get_stats(self):
+        """Get a snapshot of pool counters"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+            })
+        stats['avg_wait_ms'] = stats['total_wait_ms'] / stats['checkouts'] if stats['checkouts'] else 0.0
+        return stats
+
+# Process-wide connection pool, created lazily on first checkout
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(**get_pool_settings())
+    return _pool
+
+def release_connection(conn, discard=False):
+    """Return a connection to the pool"""
+    if conn is not None and _pool is not None:
+        _pool.putconn(conn, discard=discard)
+
+def get_pool_stats():
+    """Get connection pool statistics"""
+    if _pool is None:
+        settings = get_pool_settings()
+        return {'min_size': settings['min_size'], 'max_size': settings['max_size'], 'open': 0, 'in_use': 0, 'idle': 0}
+    return _pool.get_stats()
+
+def close_pool():
+    """Close every pooled connection"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+@contextmanager
+def read_cursor():
+    """Yield a dict cursor on a pooled connection for reads; errors are raised, not reported
+    
+    The transaction is rolled back afterwards, and a connection that failed is discarded.
+    """
+    conn = get_pool().getconn()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        yield cursor
+        cursor.close()
+        conn.rollback()
+    except Exception:
+        release_connection(conn, discard=True)
+        raise
+    release_connection(conn)
+
+def run_statement(cursor, query, params=None, fetch=None):
+    """Execute on a cursor and record latency and row count; fetch is None, 'one' or 'all'"""
+    started = time.perf_counter()
+    try:
+        cursor.execute(query, params)
+        if fetch == 'one':
+            result = cursor.fetchone()
+            rows = 1 if result else 0
+        elif fetch == 'all':
+            result = cursor.fetchall()
+            rows = len(result)
+        else:
+            result = cursor.rowcount
+            rows = max(result, 0)
+    except Exception:
+        record_query(query, (time.perf_counter() - started) * 1000, 0, error=True)
+        raise
+    
+    record_query(query, (time.perf_counter() - started) * 1000, rows)
+    return result
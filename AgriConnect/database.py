@@ -1,169 +1,266 @@
 import psycopg2
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from psycopg2.extras import RealDictCursor
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+from query_stats import get_capture, attach_capture
+from cache import get_cached, invalidate_for_statement, invalidate_tables, tables_written
+from connections import get_connection_params, get_pool_settings, get_pool, get_pool_stats, release_connection, run_statement
 
 def get_connection():
-    """Get database connection using environment variables"""
+    """Check out a pooled database connection"""
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("PGHOST"),
-            database=os.getenv("PGDATABASE"),
-            user=os.getenv("PGUSER"),
-            password=os.getenv("PGPASSWORD"),
-            port=os.getenv("PGPORT", 5432)
-        )
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         st.error(f"Database connection failed: {str(e)}")
         return None
 
+@contextmanager
+def pooled_connection():
+    """Context manager that checks out a pooled connection and always returns it"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
+
 def init_database():
-    """Initialize database tables"""
+    """Initialize database tables by applying pending schema migrations"""
+    # Imported here because migrations builds on the connection helpers above
+    from migrations import run_migrations
+    return run_migrations()
+
+def execute_query(query, params=None, fetch=False):
+    """Execute database query"""
     conn = get_connection()
     if not conn:
-        return False
+        return None
     
     try:
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                phone VARCHAR(20),
-                role VARCHAR(50) NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                status VARCHAR(20) DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Crops table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS crops (
-                id SERIAL PRIMARY KEY,
-                farmer_id INTEGER REFERENCES users(id),
-                name VARCHAR(255) NOT NULL,
-                type VARCHAR(100) NOT NULL,
-                quantity DECIMAL(10,2) NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                harvest_date DATE,
-                batch_id VARCHAR(100) UNIQUE NOT NULL,
-                status VARCHAR(50) DEFAULT 'available',
-                photo_url TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Transactions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id SERIAL PRIMARY KEY,
-                crop_id INTEGER REFERENCES crops(id),
-                from_user_id INTEGER REFERENCES users(id),
-                to_user_id INTEGER REFERENCES users(id),
-                transaction_type VARCHAR(50) NOT NULL,
-                amount DECIMAL(10,2),
-                status VARCHAR(50) DEFAULT 'pending',
-                transport_details TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Payments table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS payments (
-                id SERIAL PRIMARY KEY,
-                amount DECIMAL(10,2) NOT NULL,
-                from_user_id INTEGER REFERENCES users(id),
-                to_user_id INTEGER REFERENCES users(id),
-                crop_id INTEGER REFERENCES crops(id),
-                payment_status VARCHAR(50) DEFAULT 'pending',
-                payment_method VARCHAR(50),
-                transaction_id VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Traceability table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS traceability (
-                id SERIAL PRIMARY KEY,
-                batch_id VARCHAR(100) NOT NULL,
-                step_type VARCHAR(50) NOT NULL,
-                user_id INTEGER REFERENCES users(id),
-                location VARCHAR(255),
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                details TEXT,
-                status VARCHAR(50) DEFAULT 'active'
-            )
-        """)
-        
-        # Deliveries table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS deliveries (
-                id SERIAL PRIMARY KEY,
-                crop_id INTEGER REFERENCES crops(id),
-                distributor_id INTEGER REFERENCES users(id),
-                retailer_id INTEGER REFERENCES users(id),
-                transport_details TEXT,
-                delivery_date DATE,
-                status VARCHAR(50) DEFAULT 'in_transit',
-                tracking_info TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        result = run_statement(cursor, query, params, 'all' if fetch else None)
         conn.commit()
         cursor.close()
-        conn.close()
-        return True
+        # Only after commit, so a concurrent reader can't re-cache the old rows
+        invalidate_for_statement(query)
+        return result
         
     except Exception as e:
-        st.error(f"Database initialization failed: {str(e)}")
-        return False
+        st.error(f"Query execution failed: {str(e)}")
+        return None
+    finally:
+        release_connection(conn)
 
-def execute_query(query, params=None, fetch=False):
-    """Execute database query"""
+def fetch_one(query, params=None):
+    """Fetch single record"""
     conn = get_connection()
     if not conn:
         return None
     
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query, params)
-        
-        if fetch:
-            result = cursor.fetchall()
-        else:
-            result = cursor.rowcount
-            
-        conn.commit()
+        result = run_statement(cursor, query, params, 'one')
         cursor.close()
-        conn.close()
         return result
         
     except Exception as e:
         st.error(f"Query execution failed: {str(e)}")
         return None
+    finally:
+        release_connection(conn)
 
-def fetch_one(query, params=None):
-    """Fetch single record"""
+def fetch_existing(query, keys, params=None):
+    """Get the subset of keys a query finds, in one round trip instead of one per key
+    
+    query selects the key column and binds its last placeholder to the keys as an
+    array, e.g. "SELECT crop_id FROM payments WHERE from_user_id = %s AND crop_id = ANY(%s)".
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return set()
+    
     conn = get_connection()
     if not conn:
         return None
     
     try:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(query, params)
-        result = cursor.fetchone()
+        rows = run_statement(cursor, query, (*(params or ()), keys), 'all')
         cursor.close()
-        conn.close()
-        return result
+        return {next(iter(row.values())) for row in rows}
         
     except Exception as e:
         st.error(f"Query execution failed: {str(e)}")
         return None
+    finally:
+        release_connection(conn)
+
+def fetch_page(query, params=None, cursor=None, page_size=20, alias=None):
+    """Fetch one page of query, newest first, using a keyset cursor on (created_at, id)
+    
+    query must end inside its WHERE clause so the cursor condition can be appended.
+    cursor is the (created_at, id) of the last row on the previous page, or None for
+    the first page. Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    column = f"{alias}." if alias else ""
+    params = list(params or [])
+    
+    if cursor:
+        query += f" AND ({column}created_at, {column}id) < (%s, %s)"
+        params.extend(cursor)
+    
+    # One extra row tells us whether another page follows without a COUNT(*)
+    query += f" ORDER BY {column}created_at DESC, {column}id DESC LIMIT %s"
+    params.append(page_size + 1)
+    
+    rows = execute_query(query, params, fetch=True)
+    if rows is None:
+        return None, None
+    
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        return rows[:page_size], (last['created_at'], last['id'])
+    return rows, None
+
+def fetch_all_cached(query, params=None, ttl=None, scope=None):
+    """Fetch all records through the result cache; writes to the tables read evict the entry"""
+    return get_cached(query, params, scope, lambda: execute_query(query, params, fetch=True), ttl)
+
+def fetch_one_cached(query, params=None, ttl=None, scope=None):
+    """Fetch single record through the result cache"""
+    return get_cached(query, params, scope, lambda: fetch_one(query, params), ttl)
+
+def fetch_facet_counts(source, facets, params=None, ttl=None, scope=None):
+    """Count source's rows per combination of facet columns in one grouped query, through the result cache
+    
+    source is the list's FROM ... WHERE ... without its facet filters, so one cached result
+    serves every combination of selections (see count_facet). Returns rows of the facet
+    columns plus count.
+    """
+    columns = ", ".join(facets)
+    return fetch_all_cached(f"SELECT {columns}, COUNT(*) as count {source} GROUP BY {columns}",
+                            params, ttl, scope) or []
+
+def count_facet(rows, facet, selections):
+    """Count fetch_facet_counts rows per value of one facet, among those matching the other facets' selections ("All" matches any)"""
+    counts = {}
+    for row in rows:
+        if all(row[other] == value for other, value in selections.items() if other != facet and value != "All"):
+            counts[row[facet]] = counts.get(row[facet], 0) + row['count']
+    return counts
+
+# Shared worker threads for load_concurrently, created on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Get the process-wide loader thread pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # More workers than pooled connections would only queue on checkout
+                workers = min(int(os.getenv("LOADER_MAX_WORKERS", 8)), get_pool_settings()['max_size'])
+                _executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="loader")
+    return _executor
+
+def load_concurrently(loaders):
+    """Run independent loaders concurrently and return their results by name
+    
+    loaders maps a name to a zero-argument callable such as
+    lambda: fetch_one(...). Each runs on a pooled connection from a worker thread,
+    so a page waits for its slowest query rather than the sum of all of them.
+    """
+    if len(loaders) <= 1:
+        return {name: loader() for name, loader in loaders.items()}
+    
+    ctx = get_script_run_ctx()
+    capture = get_capture()
+    
+    def run(loader):
+        # Let st.error reach the page and the render profiler count these queries
+        thread = threading.current_thread()
+        previous_ctx = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        attach_capture(capture)
+        try:
+            return loader()
+        finally:
+            # Pooled threads outlive the session, so don't leave its context behind
+            setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous_ctx)
+            attach_capture(None)
+    
+    futures = {name: get_executor().submit(run, loader) for name, loader in loaders.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+class UnitOfWork:
+    """Statements that run over one connection and commit together"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor(cursor_factory=RealDictCursor)
+        self._queued = []
+        self.tables_written = set()
+    
+    def queue(self, query, params=None):
+        """Defer a statement whose result isn't needed; queued statements are sent in one round-trip"""
+        self.tables_written |= tables_written(query)
+        self._queued.append(self.cursor.mogrify(query, params))
+    
+    def flush(self):
+        """Send every queued statement to the server in a single execute"""
+        if self._queued:
+            batch = b";\n".join(self._queued)
+            self._queued = []
+            run_statement(self.cursor, batch)
+    
+    def execute(self, query, params=None):
+        """Execute a statement now and return its row count"""
+        self.flush()
+        self.tables_written |= tables_written(query)
+        return run_statement(self.cursor, query, params)
+    
+    def fetch_one(self, query, params=None):
+        """Fetch single record, e.g. from an INSERT ... RETURNING"""
+        self.flush()
+        self.tables_written |= tables_written(query)
+        return run_statement(self.cursor, query, params, 'one')
+    
+    def fetch_all(self, query, params=None):
+        """Fetch all records"""
+        self.flush()
+        self.tables_written |= tables_written(query)
+        return run_statement(self.cursor, query, params, 'all')
+    
+    def fetch_value(self, query, params=None):
+        """Fetch the first column of the first row, e.g. a RETURNING id"""
+        row = self.fetch_one(query, params)
+        return next(iter(row.values())) if row else None
+
+@contextmanager
+def transaction():
+    """Run a multi-statement workflow over one pooled connection with a single commit
+    
+    Any exception rolls the whole workflow back and is re-raised to the caller.
+    """
+    conn = get_connection()
+    if not conn:
+        raise psycopg2.OperationalError("No database connection available")
+    
+    tx = UnitOfWork(conn)
+    try:
+        yield tx
+        tx.flush()
+        conn.commit()
+        invalidate_tables(tx.tables_written)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        tx.cursor.close()
+        release_connection(conn)
@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from database import execute_query, fetch_one, fetch_one_cached
+
+# Columns of a user_summaries row (see migration 6), all zero for a user with no activity
+SUMMARY_COLUMNS = (
+    'crops_total', 'crops_available',
+    'shipments_total', 'shipments_in_transit', 'shipments_delivered',
+    'receipts_total', 'receipts_open', 'receipts_delivered',
+    'received_completed', 'received_pending', 'paid_completed', 'paid_pending',
+)
+
+def get_user_summaries(user_ids):
+    """Get the trigger-maintained totals of one or more users in one query, keyed by user id (zeros if they have none yet)"""
+    summaries = {}
+    for user_id in user_ids:
+        summaries[user_id] = {column: 0 for column in SUMMARY_COLUMNS}
+        summaries[user_id].update(user_id=user_id, last_activity_at=None)
+    if not summaries:
+        return summaries
+    
+    rows = execute_query("SELECT * FROM user_summaries WHERE user_id = ANY(%s)", (list(summaries),), fetch=True)
+    for row in rows or []:
+        summaries[row['user_id']].update(row)
+    return summaries
+
+def get_user_summary(user_id):
+    """Get one user's trigger-maintained totals (zeros if they have none yet)"""
+    return get_user_summaries([user_id])[user_id]
+
+# Named aggregates: name -> (table, WHERE condition or None, aggregate, FILTER condition or None).
+# Metrics over the same table and WHERE condition share one scan when requested together;
+# each %s in a WHERE condition is bound to get_metrics' param, e.g. the start of a window.
+METRICS = {
+    'recent_users': ('users', "created_at >= %s", 'COUNT(*)', None),
+    'recent_crops': ('crops', "created_at >= %s", 'COUNT(*)', None),
+    'recent_transactions': ('transactions', "created_at >= %s", 'COUNT(*)', None),
+    'active_deliveries': ('deliveries', None, 'COUNT(*)', "status = 'in_transit'"),
+    'total_deliveries': ('deliveries', None, 'COUNT(*)', None),
+    'completed_deliveries': ('deliveries', None, 'COUNT(*)', "status = 'delivered'"),
+    'avg_delivery_days': ('deliveries', None, 'AVG(lead_time_hours) / 24', None),
+    'completed_payments': ('payments', None, 'SUM(amount)', "payment_status = 'completed'"),
+    'pending_payments': ('payments', None, 'SUM(amount)', "payment_status = 'pending'"),
+    'failed_payments': ('payments', None, 'SUM(amount)', "payment_status = 'failed'"),
+}
+
+@lru_cache(maxsize=64)
+def build_metrics_query(names):
+    """Build one statement computing the named metrics and get how many times it takes the param
+    
+    Each (table, WHERE condition) becomes a single-row subquery of conditional aggregates,
+    and the subqueries are cross-joined into one result row.
+    """
+    sources = {}
+    for name in names:
+        table, where, aggregate, condition = METRICS[name]
+        expression = f"{aggregate} FILTER (WHERE {condition})" if condition else aggregate
+        sources.setdefault((table, where), []).append(f"COALESCE({expression}, 0) AS {name}")
+    
+    subqueries = [
+        f"(SELECT {', '.join(columns)} FROM {table}{f' WHERE {where}' if where else ''}) AS m{i}"
+        for i, ((table, where), columns) in enumerate(sources.items())
+    ]
+    placeholders = sum(where.count('%s') for _, where in sources if where)
+    return "SELECT * FROM " + " CROSS JOIN ".join(subqueries), placeholders
+
+def get_metrics(names, param=None, ttl=None):
+    """Get the named metrics in a single cached query (zeros if it fails)"""
+    names = tuple(names)
+    query, placeholders = build_metrics_query(names)
+    row = fetch_one_cached(query, (param,) * placeholders, ttl=ttl)
+    return {name: row[name] if row else 0 for name in names}
+
+def get_stat_counters():
+    """Get the trigger-maintained global counters (see migration 5) by name"""
+    rows = execute_query("SELECT name, value FROM stats_counters", fetch=True)
+    return {row['name']: row['value'] for row in rows or []}
+
+def recompute_stat_counters():
+    """Rebuild the global counters, per-user summaries, rollups, activity, trace tables and trace snapshots exactly; writes to the counted tables wait meanwhile"""
+    # Every lock up front in one transaction: taken one rebuild at a time, a writer holding
+    # a later table could wait on an earlier one while we wait on it
+    return execute_query("""
+        LOCK TABLE users, crops, deliveries, payments, traceability IN SHARE MODE;
+        SELECT recompute_stats_counters(), recompute_user_summaries(), rebuild_rollups(), rebuild_user_activity(),
+               rebuild_batch_traces(), rebuild_trace_snapshots();
+    """) is not None
+
+def get_rollup_series(metric, granularity, since, dimension=None):
+    """Get a rollup's (bucket, count, total) rows from since onwards, summed over dimensions unless one is given"""
+    query = """
+        SELECT bucket, SUM(count) as count, SUM(total) as total
+        FROM rollups
+        WHERE metric = %s AND granularity = %s AND bucket >= %s
+    """
+    params = [metric, granularity, since]
+    if dimension is not None:
+        query += " AND dimension = %s"
+        params.append(str(dimension))
+    query += " GROUP BY bucket ORDER BY bucket"
+    return execute_query(query, tuple(params), fetch=True) or []
+
+def get_rollup_totals(metric):
+    """Get a rollup's all-time (dimension, count, total) rows from its monthly buckets"""
+    return execute_query("""
+        SELECT dimension, SUM(count) as count, SUM(total) as total
+        FROM rollups
+        WHERE metric = %s AND granularity = 'month'
+        GROUP BY dimension
+        HAVING SUM(count) <> 0
+        ORDER BY dimension
+    """, (metric,), fetch=True) or []
+
+# Lead-time groupings: (grouping columns, label shown for each group, joins the label needs)
+LEAD_TIME_GROUPS = {
+    'distributor': (
+        "distributor_id",
+        "dist.name",
+        "LEFT JOIN users dist ON dist.id = s.distributor_id",
+    ),
+    'route': (
+        "distributor_id, retailer_id",
+        "dist.name || ' → ' || ret.name",
+        "LEFT JOIN users dist ON dist.id = s.distributor_id LEFT JOIN users ret ON ret.id = s.retailer_id",
+    ),
+}
+
+def get_lead_time_stats(group, limit=None):
+    """Get delivery count and average, median and 90th percentile lead time in days per distributor or route"""
+    columns, label, joins = LEAD_TIME_GROUPS[group]
+    query = f"""
+        SELECT {label} as {group}, s.deliveries,
+               ROUND(s.avg_hours / 24, 1) as avg_days,
+               ROUND(s.p50_hours / 24, 1) as p50_days,
+               ROUND(s.p90_hours / 24, 1) as p90_days
+        FROM (
+            SELECT {columns},
+                   COUNT(*) as deliveries,
+                   AVG(lead_time_hours) as avg_hours,
+                   PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY lead_time_hours)::NUMERIC as p50_hours,
+                   PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY lead_time_hours)::NUMERIC as p90_hours
+            FROM deliveries
+            WHERE lead_time_hours IS NOT NULL
+            GROUP BY {columns}
+        ) s
+        {joins}
+        ORDER BY s.deliveries DESC
+    """
+    params = None
+    if limit:
+        query += " LIMIT %s"
+        params = (limit,)
+    return execute_query(query, params, fetch=True) or []
+
+def get_activity_leaderboard(days=None, limit=10):
+    """Get the most active users all-time, or over the last days days, from the activity tables"""
+    if days is None:
+        return execute_query("""
+            SELECT u.name, u.role, a.crops, a.deliveries, a.payments, a.score
+            FROM user_activity a
+            JOIN users u ON u.id = a.user_id
+            WHERE u.status = 'active'
+            ORDER BY a.score DESC
+            LIMIT %s
+        """, (limit,), fetch=True) or []
+    
+    since = (datetime.now() - timedelta(days=days)).date()
+    return execute_query("""
+        SELECT u.name, u.role,
+               SUM(a.crops) as crops, SUM(a.deliveries) as deliveries, SUM(a.payments) as payments,
+               SUM(a.crops + a.deliveries + a.payments) as score
+        FROM user_activity_daily a
+        JOIN users u ON u.id = a.user_id
+        WHERE a.day > %s AND u.status = 'active'
+        GROUP BY u.id, u.name, u.role
+        ORDER BY score DESC
+        LIMIT %s
+    """, (since, limit), fetch=True) or []
+
+def get_trace_completeness():
+    """Get the number of crop batches and how many have at least two distinct trace steps"""
+    row = fetch_one("SELECT batches, complete FROM trace_completeness WHERE dimension = 'all'")
+    return row or {'batches': 0, 'complete': 0}
+
+# Completeness breakdowns: (label shown for each value, joins the label needs)
+TRACE_COMPLETENESS_GROUPS = {
+    'crop_type': ("t.value", ""),
+    'farmer': ("u.name", "LEFT JOIN users u ON u.id = NULLIF(t.value, '')::INTEGER"),
+}
+
+def get_trace_completeness_breakdown(group, limit=None):
+    """Get batch count, complete batches and completeness % per crop type or farmer, most batches first"""
+    label, joins = TRACE_COMPLETENESS_GROUPS[group]
+    query = f"""
+        SELECT {label} as {group}, t.batches, t.complete,
+               ROUND(100.0 * t.complete / t.batches, 1) as completeness
+        FROM trace_completeness t
+        {joins}
+        WHERE t.dimension = %s AND t.batches > 0
+        ORDER BY t.batches DESC
+    """
+    params = [group]
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return execute_query(query, tuple(params), fetch=True) or []
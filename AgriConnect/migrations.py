@@ -0,0 +1,1235 @@
+import threading
+import streamlit as st
+from database import get_connection, release_connection
+
+# Arbitrary key for pg_advisory_xact_lock so only one process migrates at a time
+MIGRATION_LOCK_KEY = 72_417_001
+
+def stats_counter_statements(table, counters):
+    """Build the trigger function and triggers that keep a table's stats_counters rows exact
+    
+    counters maps a counter name to an aggregate over a set of the table's rows. Each
+    statement's delta is computed from its transition tables, so bulk writes and COPY
+    cost one counter update rather than one per row, and updates that leave a counter
+    unchanged don't lock its row.
+    """
+    names = ", ".join(f"'{name}'" for name in counters)
+    deltas = "".join(f"""
+            delta := 0;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                delta := delta + (SELECT {aggregate} FROM new_rows);
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                delta := delta - (SELECT {aggregate} FROM old_rows);
+            END IF;
+            IF delta <> 0 THEN
+                UPDATE stats_counters SET value = value + delta, updated_at = CURRENT_TIMESTAMP
+                WHERE name = '{name}';
+            END IF;
+        """ for name, aggregate in counters.items())
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION stats_counters_{table}() RETURNS trigger AS $$
+        DECLARE
+            delta NUMERIC;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                UPDATE stats_counters SET value = 0, updated_at = CURRENT_TIMESTAMP WHERE name IN ({names});
+                RETURN NULL;
+            END IF;
+            {deltas}
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Transition tables need one trigger per event
+        f"""
+        CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stats_counters_{table}()
+        """,
+        f"""
+        CREATE TRIGGER {table}_stats_update AFTER UPDATE ON {table}
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stats_counters_{table}()
+        """,
+        f"""
+        CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stats_counters_{table}()
+        """,
+        f"""
+        CREATE TRIGGER {table}_stats_truncate AFTER TRUNCATE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION stats_counters_{table}()
+        """,
+    ]
+
+def user_summary_statements(sources, with_triggers=True):
+    """Build the trigger functions, triggers and recompute function that keep user_summaries exact
+    
+    sources maps table -> owner column -> {summary column: aggregate over that owner's rows}.
+    Like the stats counters, each statement's per-user deltas come from its transition
+    tables; users whose summary the statement changes also get last_activity_at bumped.
+    Pass with_triggers=False to replace the functions behind existing triggers.
+    """
+    def upsert(columns_by_owner, owner, relations):
+        columns = list(columns_by_owner[owner])
+        parts = []
+        for relation, sign, touched in relations:
+            selected = ", ".join(f"{sign}({aggregate})" for aggregate in columns_by_owner[owner].values())
+            parts.append(
+                f"SELECT {owner}, {selected}, {touched} FROM {relation} "
+                f"WHERE {owner} IS NOT NULL GROUP BY {owner}"
+            )
+        sums = ", ".join(f"SUM({column})" for column in columns)
+        changed = " OR ".join(f"SUM({column}) <> 0" for column in columns)
+        updates = ", ".join(f"{column} = s.{column} + EXCLUDED.{column}" for column in columns)
+        # Rows an UPDATE left alone cancel out; skip them rather than rewrite the row and bump its activity
+        return f"""
+                INSERT INTO user_summaries AS s (user_id, {', '.join(columns)}, last_activity_at)
+                SELECT user_id, {sums}, MAX(touched)
+                FROM ({' UNION ALL '.join(parts)}) AS deltas (user_id, {', '.join(columns)}, touched)
+                GROUP BY user_id
+                HAVING {changed}
+                ORDER BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET {updates},
+                    last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at);
+        """
+    
+    inserted = [('new_rows', '+', 'CURRENT_TIMESTAMP')]
+    deleted = [('old_rows', '-', 'NULL::TIMESTAMP')]
+    statements = []
+    for table, columns_by_owner in sources.items():
+        zeroed = ", ".join(f"{column} = 0" for columns in columns_by_owner.values() for column in columns)
+        on_insert = "".join(upsert(columns_by_owner, owner, inserted) for owner in columns_by_owner)
+        on_update = "".join(upsert(columns_by_owner, owner, inserted + deleted) for owner in columns_by_owner)
+        on_delete = "".join(upsert(columns_by_owner, owner, deleted) for owner in columns_by_owner)
+        statements.append(f"""
+            CREATE OR REPLACE FUNCTION user_summaries_{table}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'TRUNCATE' THEN
+                    UPDATE user_summaries SET {zeroed};
+                ELSIF TG_OP = 'INSERT' THEN
+                    {on_insert}
+                ELSIF TG_OP = 'UPDATE' THEN
+                    {on_update}
+                ELSE
+                    {on_delete}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        if not with_triggers:
+            continue
+        statements += [
+            f"""
+            CREATE TRIGGER {table}_summaries_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION user_summaries_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_summaries_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION user_summaries_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_summaries_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION user_summaries_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_summaries_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION user_summaries_{table}()
+            """,
+        ]
+    
+    # The exact rebuild joins one grouped subquery per (table, owner column) onto users
+    columns, joins, activity = [], [], []
+    for table, columns_by_owner in sources.items():
+        for owner, aggregates in columns_by_owner.items():
+            alias = f"{table}_{owner}"
+            selected = ", ".join(f"{aggregate} AS {column}" for column, aggregate in aggregates.items())
+            joins.append(
+                f"LEFT JOIN (SELECT {owner} AS user_id, {selected}, MAX(created_at) AS last_activity_at "
+                f"FROM {table} GROUP BY {owner}) AS {alias} ON {alias}.user_id = u.id"
+            )
+            columns += [(column, f"COALESCE({alias}.{column}, 0)") for column in aggregates]
+            activity.append(f"{alias}.last_activity_at")
+    tables = ", ".join(sources)
+    statements.append(f"""
+        CREATE OR REPLACE FUNCTION recompute_user_summaries() RETURNS void AS $$
+        BEGIN
+            LOCK TABLE {tables} IN SHARE MODE;
+            DELETE FROM user_summaries;
+            INSERT INTO user_summaries (user_id, {', '.join(column for column, _ in columns)}, last_activity_at)
+            SELECT u.id, {', '.join(value for _, value in columns)}, GREATEST({', '.join(activity)})
+            FROM users u
+            {' '.join(joins)};
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    return statements
+
+def rollup_statements(sources, granularities):
+    """Build the trigger functions, triggers and rebuild function that keep the rollups table exact
+    
+    sources maps table -> [(metric, dimension expression, value expression, filter or None)].
+    Every matching row adds 1 to count and its value to total in its bucket at each
+    granularity. Statements contribute one grouped delta per bucket, so a write touches
+    a handful of rollup rows however many rows it changes.
+    """
+    buckets = ", ".join(f"('{granularity}')" for granularity in granularities)
+    
+    def deltas(rollups, relation, sign):
+        return " UNION ALL ".join(
+            f"SELECT '{metric}', g.granularity, DATE_TRUNC(g.granularity, created_at), "
+            f"COALESCE(({dimension})::TEXT, ''), {sign}COUNT(*), {sign}COALESCE(SUM({value}), 0) "
+            f"FROM {relation} CROSS JOIN (VALUES {buckets}) AS g (granularity) "
+            f"WHERE created_at IS NOT NULL{f' AND ({condition})' if condition else ''} "
+            f"GROUP BY 2, 3, 4"
+            for metric, dimension, value, condition in rollups
+        )
+    
+    def upsert(rollups, relations):
+        parts = " UNION ALL ".join(deltas(rollups, relation, sign) for relation, sign in relations)
+        return f"""
+                INSERT INTO rollups AS r (metric, granularity, bucket, dimension, count, total)
+                SELECT metric, granularity, bucket, dimension, SUM(count), SUM(total)
+                FROM ({parts}) AS deltas (metric, granularity, bucket, dimension, count, total)
+                GROUP BY metric, granularity, bucket, dimension
+                HAVING SUM(count) <> 0 OR SUM(total) <> 0
+                ORDER BY metric, granularity, bucket, dimension
+                ON CONFLICT (metric, granularity, dimension, bucket)
+                DO UPDATE SET count = r.count + EXCLUDED.count, total = r.total + EXCLUDED.total;
+        """
+    
+    statements = []
+    for table, rollups in sources.items():
+        metrics = ", ".join(f"'{metric}'" for metric, _, _, _ in rollups)
+        statements += [
+            f"""
+            CREATE OR REPLACE FUNCTION rollups_{table}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM rollups WHERE metric IN ({metrics});
+                ELSIF TG_OP = 'INSERT' THEN
+                    {upsert(rollups, [('new_rows', '')])}
+                ELSIF TG_OP = 'UPDATE' THEN
+                    {upsert(rollups, [('new_rows', ''), ('old_rows', '-')])}
+                ELSE
+                    {upsert(rollups, [('old_rows', '-')])}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            f"""
+            CREATE TRIGGER {table}_rollups_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION rollups_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_rollups_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION rollups_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_rollups_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION rollups_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_rollups_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION rollups_{table}()
+            """,
+        ]
+    
+    # The backfill is the insert path run over each whole table
+    backfill = "".join(
+        f"""
+            INSERT INTO rollups (metric, granularity, bucket, dimension, count, total)
+            {deltas(rollups, table, '')};
+        """
+        for table, rollups in sources.items()
+    )
+    statements.append(f"""
+        CREATE OR REPLACE FUNCTION rebuild_rollups() RETURNS void AS $$
+        BEGIN
+            LOCK TABLE {', '.join(sources)} IN SHARE MODE;
+            DELETE FROM rollups;
+            {backfill}
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    return statements
+
+def user_activity_statements(sources):
+    """Build the triggers and rebuild function that keep user_activity and user_activity_daily exact
+    
+    sources maps table -> (owner column, activity column). Each row counts once towards
+    its owner's activity column, all-time and on the day it was created.
+    """
+    def upsert(owner, column, relations):
+        parts = " UNION ALL ".join(
+            f"SELECT {owner}, created_at::DATE, {sign}COUNT(*) FROM {relation} "
+            f"WHERE {owner} IS NOT NULL AND created_at IS NOT NULL GROUP BY 1, 2"
+            for relation, sign in relations
+        )
+        return f"""
+                WITH deltas (user_id, day, delta) AS ({parts}),
+                daily AS (
+                    INSERT INTO user_activity_daily AS a (user_id, day, {column})
+                    SELECT user_id, day, SUM(delta) FROM deltas
+                    GROUP BY user_id, day HAVING SUM(delta) <> 0
+                    ORDER BY user_id, day
+                    ON CONFLICT (day, user_id) DO UPDATE SET {column} = a.{column} + EXCLUDED.{column}
+                )
+                INSERT INTO user_activity AS a (user_id, {column})
+                SELECT user_id, SUM(delta) FROM deltas
+                GROUP BY user_id HAVING SUM(delta) <> 0
+                ORDER BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET {column} = a.{column} + EXCLUDED.{column};
+        """
+    
+    statements = []
+    for table, (owner, column) in sources.items():
+        statements += [
+            f"""
+            CREATE OR REPLACE FUNCTION user_activity_{table}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'TRUNCATE' THEN
+                    UPDATE user_activity SET {column} = 0;
+                    UPDATE user_activity_daily SET {column} = 0;
+                ELSIF TG_OP = 'INSERT' THEN
+                    {upsert(owner, column, [('new_rows', '')])}
+                ELSIF TG_OP = 'UPDATE' THEN
+                    {upsert(owner, column, [('new_rows', ''), ('old_rows', '-')])}
+                ELSE
+                    {upsert(owner, column, [('old_rows', '-')])}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            f"""
+            CREATE TRIGGER {table}_activity_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION user_activity_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_activity_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION user_activity_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_activity_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION user_activity_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_activity_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION user_activity_{table}()
+            """,
+        ]
+    
+    columns = [column for _, column in sources.values()]
+    daily_parts = " UNION ALL ".join(
+        f"SELECT {owner}, created_at::DATE, "
+        + ", ".join("COUNT(*)" if other == column else "0" for other in columns)
+        + f" FROM {table} WHERE {owner} IS NOT NULL AND created_at IS NOT NULL GROUP BY 1, 2"
+        for table, (owner, column) in sources.items()
+    )
+    sums = ", ".join(f"SUM({column})" for column in columns)
+    statements.append(f"""
+        CREATE OR REPLACE FUNCTION rebuild_user_activity() RETURNS void AS $$
+        BEGIN
+            LOCK TABLE {', '.join(sources)} IN SHARE MODE;
+            DELETE FROM user_activity_daily;
+            DELETE FROM user_activity;
+            INSERT INTO user_activity_daily (user_id, day, {', '.join(columns)})
+            SELECT user_id, day, {sums}
+            FROM ({daily_parts}) AS counts (user_id, day, {', '.join(columns)})
+            GROUP BY user_id, day;
+            INSERT INTO user_activity (user_id, {', '.join(columns)})
+            SELECT user_id, {sums} FROM user_activity_daily GROUP BY user_id;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    return statements
+
+def trace_completeness_statements(dimensions):
+    """Build the triggers and rebuild function that keep batch_trace_steps, batch_traces and trace_completeness exact
+    
+    dimensions maps a breakdown name to a batch_traces column. Trace steps are counted
+    as per-(batch, step type) deltas, and a step type whose events leave or return to
+    zero moves its batch's step count, so concurrent writers never recount a batch.
+    Changes to batch_traces then flow into trace_completeness overall ('all') and per
+    dimension value.
+    """
+    def step_deltas(relations):
+        parts = " UNION ALL ".join(
+            f"SELECT batch_id, step_type, {sign}COUNT(*) FROM {relation} GROUP BY 1, 2"
+            for relation, sign in relations
+        )
+        prune = "".join(f"""
+                DELETE FROM batch_trace_steps s USING {relation} r
+                WHERE s.batch_id = r.batch_id AND s.step_type = r.step_type AND s.events = 0;
+        """ for relation, sign in relations if sign == '-')
+        return f"""
+                WITH deltas (batch_id, step_type, delta) AS (
+                    SELECT batch_id, step_type, SUM(delta)
+                    FROM ({parts}) AS changes (batch_id, step_type, delta)
+                    GROUP BY batch_id, step_type
+                    HAVING SUM(delta) <> 0
+                ),
+                steps AS (
+                    INSERT INTO batch_trace_steps AS s (batch_id, step_type, events)
+                    SELECT batch_id, step_type, delta FROM deltas
+                    ORDER BY batch_id, step_type
+                    ON CONFLICT (batch_id, step_type) DO UPDATE SET events = s.events + EXCLUDED.events
+                    RETURNING batch_id, step_type, events
+                )
+                UPDATE batch_traces b SET steps = b.steps + c.steps, events = b.events + c.events
+                FROM (
+                    SELECT s.batch_id,
+                           SUM(CASE WHEN s.events = d.delta THEN 1 WHEN s.events = 0 THEN -1 ELSE 0 END) AS steps,
+                           SUM(d.delta) AS events
+                    FROM steps s
+                    JOIN deltas d ON d.batch_id = s.batch_id AND d.step_type = s.step_type
+                    GROUP BY s.batch_id
+                ) c
+                WHERE b.batch_id = c.batch_id;
+                {prune}
+        """
+    
+    # A crop's trace may predate it, so its counts come from batch_trace_steps
+    traced = """
+                    SELECT n.id, n.batch_id, n.type, n.farmer_id,
+                           COUNT(s.step_type) FILTER (WHERE s.events > 0) AS steps,
+                           COALESCE(SUM(s.events), 0) AS events
+                    FROM new_rows n
+                    {join}
+                    LEFT JOIN batch_trace_steps s ON s.batch_id = n.batch_id
+                    {where}
+                    GROUP BY n.id, n.batch_id, n.type, n.farmer_id
+    """
+    
+    inserted = traced.format(join="", where="")
+    retraced = traced.format(
+        join="JOIN old_rows o ON o.id = n.id",
+        where="WHERE (n.batch_id, n.type, n.farmer_id) IS DISTINCT FROM (o.batch_id, o.type, o.farmer_id)",
+    )
+    
+    def completeness_deltas(relations):
+        parts = " UNION ALL ".join(
+            f"SELECT 'all', '', {sign}COUNT(*), {sign}COUNT(*) FILTER (WHERE complete) FROM {relation}"
+            + "".join(
+                f" UNION ALL SELECT '{name}', COALESCE(({column})::TEXT, ''), "
+                f"{sign}COUNT(*), {sign}COUNT(*) FILTER (WHERE complete) FROM {relation} GROUP BY 2"
+                for name, column in dimensions.items()
+            )
+            for relation, sign in relations
+        )
+        return f"""
+                INSERT INTO trace_completeness AS t (dimension, value, batches, complete)
+                SELECT dimension, value, SUM(batches), SUM(complete)
+                FROM ({parts}) AS deltas (dimension, value, batches, complete)
+                GROUP BY dimension, value
+                HAVING SUM(batches) <> 0 OR SUM(complete) <> 0
+                ORDER BY dimension, value
+                ON CONFLICT (dimension, value)
+                DO UPDATE SET batches = t.batches + EXCLUDED.batches, complete = t.complete + EXCLUDED.complete;
+        """
+    
+    functions = {
+        'traceability': ('batch_traces', 'batch_traces_traceability', f"""
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM batch_trace_steps;
+                    UPDATE batch_traces SET steps = 0, events = 0 WHERE events <> 0;
+                ELSIF TG_OP = 'INSERT' THEN
+                    {step_deltas([('new_rows', '')])}
+                ELSIF TG_OP = 'UPDATE' THEN
+                    {step_deltas([('new_rows', ''), ('old_rows', '-')])}
+                ELSE
+                    {step_deltas([('old_rows', '-')])}
+                END IF;
+        """),
+        'crops': ('batch_traces', 'batch_traces_crops', f"""
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM batch_traces;
+                ELSIF TG_OP = 'INSERT' THEN
+                    INSERT INTO batch_traces (crop_id, batch_id, crop_type, farmer_id, steps, events)
+                    {inserted}
+                    ORDER BY n.id;
+                ELSIF TG_OP = 'UPDATE' THEN
+                    -- Status, price and quantity changes leave the batch's row alone
+                    UPDATE batch_traces b
+                    SET batch_id = c.batch_id, crop_type = c.type, farmer_id = c.farmer_id,
+                        steps = c.steps, events = c.events
+                    FROM ({retraced}) c
+                    WHERE b.crop_id = c.id;
+                ELSE
+                    DELETE FROM batch_traces b USING old_rows o WHERE b.crop_id = o.id;
+                END IF;
+        """),
+        'batch_traces': ('completeness', 'trace_completeness_batch_traces', f"""
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM trace_completeness;
+                ELSIF TG_OP = 'INSERT' THEN
+                    {completeness_deltas([('new_rows', '')])}
+                ELSIF TG_OP = 'UPDATE' THEN
+                    {completeness_deltas([('new_rows', ''), ('old_rows', '-')])}
+                ELSE
+                    {completeness_deltas([('old_rows', '-')])}
+                END IF;
+        """),
+    }
+    
+    statements = []
+    for table, (name, function, body) in functions.items():
+        statements += [
+            f"""
+            CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+            BEGIN
+                {body}
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            f"""
+            CREATE TRIGGER {table}_{name}_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_{name}_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_{name}_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_{name}_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """,
+        ]
+    
+    # Refilling batch_traces fires its insert trigger, which refills trace_completeness
+    statements.append("""
+        CREATE OR REPLACE FUNCTION rebuild_batch_traces() RETURNS void AS $$
+        BEGIN
+            LOCK TABLE crops, traceability IN SHARE MODE;
+            DELETE FROM batch_traces;
+            DELETE FROM trace_completeness;
+            DELETE FROM batch_trace_steps;
+            INSERT INTO batch_trace_steps (batch_id, step_type, events)
+            SELECT batch_id, step_type, COUNT(*) FROM traceability GROUP BY batch_id, step_type;
+            INSERT INTO batch_traces (crop_id, batch_id, crop_type, farmer_id, steps, events)
+            SELECT c.id, c.batch_id, c.type, c.farmer_id, COUNT(s.step_type), COALESCE(SUM(s.events), 0)
+            FROM crops c
+            LEFT JOIN batch_trace_steps s ON s.batch_id = c.batch_id
+            GROUP BY c.id;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    return statements
+
+def trace_snapshot_statements(sources):
+    """Build the triggers and refresh/rebuild functions that keep trace_snapshots equal to trace_documents
+    
+    sources maps a table to (columns a trace document shows, query for the batch IDs
+    that rows in {rows} r appear in). Updates that leave those columns alone regenerate
+    nothing. A refresh locks the batches' snapshot rows before rebuilding them, so
+    concurrent writers to one batch take turns and the later one sees the earlier write.
+    """
+    def changed(keep, columns):
+        return f"""(
+                        SELECT {keep}.* FROM new_rows n JOIN old_rows o ON o.id = n.id
+                        WHERE ({', '.join(f'n.{c}' for c in columns)}) IS DISTINCT FROM ({', '.join(f'o.{c}' for c in columns)})
+                    )"""
+    
+    statements = [
+        """
+        CREATE OR REPLACE FUNCTION refresh_trace_snapshots(batch_ids TEXT[]) RETURNS void AS $$
+        BEGIN
+            IF cardinality(batch_ids) = 0 THEN
+                RETURN;
+            END IF;
+            PERFORM 1 FROM trace_snapshots WHERE batch_id = ANY(batch_ids) ORDER BY batch_id FOR UPDATE;
+            -- A new statement, so documents are built from what the writers we waited for committed
+            INSERT INTO trace_snapshots AS s (batch_id, document)
+            SELECT batch_id, document FROM trace_documents WHERE batch_id = ANY(batch_ids)
+            ORDER BY batch_id
+            ON CONFLICT (batch_id) DO UPDATE SET document = EXCLUDED.document, updated_at = CURRENT_TIMESTAMP;
+            DELETE FROM trace_snapshots s
+            WHERE s.batch_id = ANY(batch_ids) AND NOT EXISTS (SELECT 1 FROM crops c WHERE c.batch_id = s.batch_id);
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+    
+    for table, (columns, batches) in sources.items():
+        statements += [
+            f"""
+            CREATE OR REPLACE FUNCTION trace_snapshots_{table}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'TRUNCATE' THEN
+                    DELETE FROM trace_snapshots;
+                    INSERT INTO trace_snapshots (batch_id, document)
+                    SELECT batch_id, document FROM trace_documents ORDER BY batch_id;
+                ELSIF TG_OP = 'INSERT' THEN
+                    PERFORM refresh_trace_snapshots(ARRAY({batches.format(rows='new_rows')}));
+                ELSIF TG_OP = 'UPDATE' THEN
+                    PERFORM refresh_trace_snapshots(ARRAY(
+                        {batches.format(rows=changed('n', columns))}
+                        UNION
+                        {batches.format(rows=changed('o', columns))}
+                    ));
+                ELSE
+                    PERFORM refresh_trace_snapshots(ARRAY({batches.format(rows='old_rows')}));
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """,
+            f"""
+            CREATE TRIGGER {table}_trace_snapshots_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION trace_snapshots_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_trace_snapshots_update AFTER UPDATE ON {table}
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION trace_snapshots_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_trace_snapshots_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION trace_snapshots_{table}()
+            """,
+            f"""
+            CREATE TRIGGER {table}_trace_snapshots_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION trace_snapshots_{table}()
+            """,
+        ]
+    
+    statements.append("""
+        CREATE OR REPLACE FUNCTION rebuild_trace_snapshots() RETURNS void AS $$
+        BEGIN
+            LOCK TABLE users, crops, traceability IN SHARE MODE;
+            DELETE FROM trace_snapshots;
+            INSERT INTO trace_snapshots (batch_id, document)
+            SELECT batch_id, document FROM trace_documents ORDER BY batch_id;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    return statements
+
+# Per-user summary columns by source table and owner column (see user_summary_statements)
+USER_SUMMARY_SOURCES = {
+    'crops': {
+        'farmer_id': {
+            'crops_total': "COUNT(*)",
+            'crops_available': "COUNT(*) FILTER (WHERE status = 'available')",
+        },
+    },
+    'deliveries': {
+        'distributor_id': {
+            'shipments_total': "COUNT(*)",
+            'shipments_in_transit': "COUNT(*) FILTER (WHERE status = 'in_transit')",
+            'shipments_delivered': "COUNT(*) FILTER (WHERE status = 'delivered')",
+        },
+        'retailer_id': {
+            'receipts_total': "COUNT(*)",
+            'receipts_open': "COUNT(*) FILTER (WHERE status IN ('pending', 'in_transit'))",
+            'receipts_delivered': "COUNT(*) FILTER (WHERE status = 'delivered')",
+        },
+    },
+    'payments': {
+        'to_user_id': {
+            'received_completed': "COALESCE(SUM(amount) FILTER (WHERE payment_status = 'completed'), 0)",
+            'received_pending': "COALESCE(SUM(amount) FILTER (WHERE payment_status = 'pending'), 0)",
+        },
+        'from_user_id': {
+            'paid_completed': "COALESCE(SUM(amount) FILTER (WHERE payment_status = 'completed'), 0)",
+            'paid_pending': "COALESCE(SUM(amount) FILTER (WHERE payment_status = 'pending'), 0)",
+        },
+    },
+}
+
+# Ordered schema migrations: (version, description, statements).
+# Never edit a migration that has shipped; append a new one instead.
+MIGRATIONS = [
+    (1, "Create core tables", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            phone VARCHAR(20),
+            role VARCHAR(50) NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            status VARCHAR(20) DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS crops (
+            id SERIAL PRIMARY KEY,
+            farmer_id INTEGER REFERENCES users(id),
+            name VARCHAR(255) NOT NULL,
+            type VARCHAR(100) NOT NULL,
+            quantity DECIMAL(10,2) NOT NULL,
+            price DECIMAL(10,2) NOT NULL,
+            harvest_date DATE,
+            batch_id VARCHAR(100) UNIQUE NOT NULL,
+            status VARCHAR(50) DEFAULT 'available',
+            photo_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id SERIAL PRIMARY KEY,
+            crop_id INTEGER REFERENCES crops(id),
+            from_user_id INTEGER REFERENCES users(id),
+            to_user_id INTEGER REFERENCES users(id),
+            transaction_type VARCHAR(50) NOT NULL,
+            amount DECIMAL(10,2),
+            status VARCHAR(50) DEFAULT 'pending',
+            transport_details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS payments (
+            id SERIAL PRIMARY KEY,
+            amount DECIMAL(10,2) NOT NULL,
+            from_user_id INTEGER REFERENCES users(id),
+            to_user_id INTEGER REFERENCES users(id),
+            crop_id INTEGER REFERENCES crops(id),
+            payment_status VARCHAR(50) DEFAULT 'pending',
+            payment_method VARCHAR(50),
+            transaction_id VARCHAR(100),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS traceability (
+            id SERIAL PRIMARY KEY,
+            batch_id VARCHAR(100) NOT NULL,
+            step_type VARCHAR(50) NOT NULL,
+            user_id INTEGER REFERENCES users(id),
+            location VARCHAR(255),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            details TEXT,
+            status VARCHAR(50) DEFAULT 'active'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS deliveries (
+            id SERIAL PRIMARY KEY,
+            crop_id INTEGER REFERENCES crops(id),
+            distributor_id INTEGER REFERENCES users(id),
+            retailer_id INTEGER REFERENCES users(id),
+            transport_details TEXT,
+            delivery_date DATE,
+            status VARCHAR(50) DEFAULT 'in_transit',
+            tracking_info TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (2, "Index foreign keys and status filters", [
+        "CREATE INDEX IF NOT EXISTS idx_crops_farmer_id ON crops (farmer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_crops_status ON crops (status)",
+        # Leading batch_id serves lookups; timestamp keeps timelines in index order
+        "CREATE INDEX IF NOT EXISTS idx_traceability_batch_id ON traceability (batch_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_to_user_id ON payments (to_user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_from_user_id ON payments (from_user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_deliveries_distributor_id ON deliveries (distributor_id)",
+        "CREATE INDEX IF NOT EXISTS idx_deliveries_retailer_id ON deliveries (retailer_id)",
+        "CREATE INDEX IF NOT EXISTS idx_deliveries_status ON deliveries (status)",
+    ]),
+    (3, "Keyset pagination indexes on (created_at, id)", [
+        # Scoped lists page through one owner's rows; these supersede the plain owner indexes
+        "CREATE INDEX IF NOT EXISTS idx_crops_farmer_created ON crops (farmer_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deliveries_distributor_created ON deliveries (distributor_id, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_deliveries_retailer_created ON deliveries (retailer_id, created_at, id)",
+        "DROP INDEX IF EXISTS idx_crops_farmer_id",
+        "DROP INDEX IF EXISTS idx_deliveries_distributor_id",
+        "DROP INDEX IF EXISTS idx_deliveries_retailer_id",
+        # Admin lists page through whole tables
+        "CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_crops_created ON crops (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_payments_created ON payments (created_at, id)",
+    ]),
+    (4, "Notify listeners of table changes", [
+        # One notification per statement; Postgres also folds duplicates within a transaction
+        """
+        CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('agritrace_table_changes', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        *[
+            f"""
+            CREATE TRIGGER {table}_notify_change
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()
+            """
+            for table in ('users', 'crops', 'transactions', 'payments', 'traceability', 'deliveries')
+        ],
+    ]),
+    (5, "Trigger-maintained global counters", [
+        """
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name VARCHAR(100) PRIMARY KEY,
+            value NUMERIC NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        *stats_counter_statements('users', {'users_total': "COUNT(*)"}),
+        *stats_counter_statements('crops', {'crops_total': "COUNT(*)"}),
+        *stats_counter_statements('deliveries', {
+            'deliveries_open': "COUNT(*) FILTER (WHERE status IN ('pending', 'in_transit'))",
+        }),
+        *stats_counter_statements('payments', {
+            'payments_completed_amount': "COALESCE(SUM(amount) FILTER (WHERE payment_status = 'completed'), 0)",
+        }),
+        # Exact recount, used to seed the counters and by the admin "recompute" action.
+        # SHARE mode waits out in-flight writers and holds off new ones (readers carry on),
+        # so the recount can't race the triggers.
+        """
+        CREATE OR REPLACE FUNCTION recompute_stats_counters() RETURNS void AS $$
+        BEGIN
+            LOCK TABLE users, crops, deliveries, payments IN SHARE MODE;
+            INSERT INTO stats_counters (name, value) VALUES
+                ('users_total', (SELECT COUNT(*) FROM users)),
+                ('crops_total', (SELECT COUNT(*) FROM crops)),
+                ('deliveries_open', (SELECT COUNT(*) FROM deliveries WHERE status IN ('pending', 'in_transit'))),
+                ('payments_completed_amount', (SELECT COALESCE(SUM(amount), 0) FROM payments WHERE payment_status = 'completed'))
+            ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "SELECT recompute_stats_counters()",
+    ]),
+    (6, "Trigger-maintained per-user summaries", [
+        """
+        CREATE TABLE IF NOT EXISTS user_summaries (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            crops_total BIGINT NOT NULL DEFAULT 0,
+            crops_available BIGINT NOT NULL DEFAULT 0,
+            shipments_total BIGINT NOT NULL DEFAULT 0,
+            shipments_in_transit BIGINT NOT NULL DEFAULT 0,
+            shipments_delivered BIGINT NOT NULL DEFAULT 0,
+            receipts_total BIGINT NOT NULL DEFAULT 0,
+            receipts_open BIGINT NOT NULL DEFAULT 0,
+            receipts_delivered BIGINT NOT NULL DEFAULT 0,
+            received_completed NUMERIC(14,2) NOT NULL DEFAULT 0,
+            received_pending NUMERIC(14,2) NOT NULL DEFAULT 0,
+            paid_completed NUMERIC(14,2) NOT NULL DEFAULT 0,
+            paid_pending NUMERIC(14,2) NOT NULL DEFAULT 0,
+            last_activity_at TIMESTAMP
+        )
+        """,
+        *user_summary_statements(USER_SUMMARY_SOURCES),
+        "SELECT recompute_user_summaries()",
+    ]),
+    (7, "Trigger-maintained time-series rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS rollups (
+            metric VARCHAR(50) NOT NULL,
+            granularity VARCHAR(10) NOT NULL,
+            dimension VARCHAR(100) NOT NULL DEFAULT '',
+            bucket TIMESTAMP NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            total NUMERIC(16,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, granularity, dimension, bucket)
+        )
+        """,
+        # Charts read a date range across every dimension
+        "CREATE INDEX IF NOT EXISTS idx_rollups_bucket ON rollups (metric, granularity, bucket)",
+        *rollup_statements({
+            'users': [
+                ('users_by_role', 'role', '0', None),
+            ],
+            'payments': [
+                ('payments_by_status', 'payment_status', 'amount', None),
+                ('completed_payments_by_payer', 'from_user_id', 'amount', "payment_status = 'completed'"),
+                ('completed_payments_by_recipient', 'to_user_id', 'amount', "payment_status = 'completed'"),
+            ],
+        }, ('hour', 'day', 'month')),
+        "SELECT rebuild_rollups()",
+    ]),
+    (8, "Delivery milestone timestamps and lead time", [
+        """
+        ALTER TABLE deliveries
+            ADD COLUMN IF NOT EXISTS picked_up_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS in_transit_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS delivered_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS retailed_at TIMESTAMP
+        """,
+        # Backfill from what the old report derived on every render; the write leaves
+        # counts unchanged, so skip the summary, rollup and notify triggers
+        "ALTER TABLE deliveries DISABLE TRIGGER USER",
+        """
+        UPDATE deliveries d SET
+            picked_up_at = d.created_at,
+            in_transit_at = CASE WHEN d.status IN ('in_transit', 'delivered') THEN d.created_at END,
+            delivered_at = CASE WHEN d.status = 'delivered' THEN COALESCE(r.retailed_at, d.created_at) END,
+            retailed_at = r.retailed_at
+        FROM deliveries d2
+        LEFT JOIN (
+            SELECT c.id AS crop_id, MAX(t.timestamp) AS retailed_at
+            FROM traceability t
+            JOIN crops c ON c.batch_id = t.batch_id
+            WHERE t.step_type = 'Retail'
+            GROUP BY c.id
+        ) r ON r.crop_id = d2.crop_id
+        WHERE d2.id = d.id
+        """,
+        "ALTER TABLE deliveries ENABLE TRIGGER USER",
+        """
+        ALTER TABLE deliveries ADD COLUMN IF NOT EXISTS lead_time_hours NUMERIC GENERATED ALWAYS AS (
+            EXTRACT(EPOCH FROM COALESCE(retailed_at, delivered_at) - picked_up_at) / 3600
+        ) STORED
+        """,
+        # Lead-time stats group by distributor or route and read only this index
+        """
+        CREATE INDEX IF NOT EXISTS idx_deliveries_lead_time
+        ON deliveries (distributor_id, retailer_id, lead_time_hours)
+        WHERE lead_time_hours IS NOT NULL
+        """,
+        # A milestone reached on insert is stamped with created_at, later ones with the time of the update
+        """
+        CREATE OR REPLACE FUNCTION stamp_delivery_milestones() RETURNS trigger AS $$
+        DECLARE
+            reached_at TIMESTAMP := CURRENT_TIMESTAMP;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                reached_at := COALESCE(NEW.created_at, CURRENT_TIMESTAMP);
+                NEW.picked_up_at := COALESCE(NEW.picked_up_at, reached_at);
+            END IF;
+            IF NEW.status IN ('in_transit', 'delivered') THEN
+                NEW.in_transit_at := COALESCE(NEW.in_transit_at, reached_at);
+            END IF;
+            IF NEW.status = 'delivered' THEN
+                NEW.delivered_at := COALESCE(NEW.delivered_at, reached_at);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER deliveries_milestones BEFORE INSERT OR UPDATE OF status ON deliveries
+        FOR EACH ROW EXECUTE FUNCTION stamp_delivery_milestones()
+        """,
+        # The retailer's Retail trace step completes the delivery's lead time
+        """
+        CREATE OR REPLACE FUNCTION stamp_delivery_retailed() RETURNS trigger AS $$
+        BEGIN
+            UPDATE deliveries d SET retailed_at = r.retailed_at
+            FROM (
+                SELECT c.id AS crop_id, MAX(n.timestamp) AS retailed_at
+                FROM new_rows n
+                JOIN crops c ON c.batch_id = n.batch_id
+                WHERE n.step_type = 'Retail'
+                GROUP BY c.id
+            ) r
+            WHERE d.crop_id = r.crop_id
+            AND (d.retailed_at IS NULL OR d.retailed_at < r.retailed_at);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER traceability_retailed AFTER INSERT ON traceability
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION stamp_delivery_retailed()
+        """,
+    ]),
+    (9, "User activity leaderboards", [
+        """
+        CREATE TABLE IF NOT EXISTS user_activity (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            crops BIGINT NOT NULL DEFAULT 0,
+            deliveries BIGINT NOT NULL DEFAULT 0,
+            payments BIGINT NOT NULL DEFAULT 0,
+            score BIGINT GENERATED ALWAYS AS (crops + deliveries + payments) STORED
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_user_activity_score ON user_activity (score DESC)",
+        # Windowed leaderboards sum the days in range
+        """
+        CREATE TABLE IF NOT EXISTS user_activity_daily (
+            day DATE NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            crops BIGINT NOT NULL DEFAULT 0,
+            deliveries BIGINT NOT NULL DEFAULT 0,
+            payments BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id)
+        )
+        """,
+        *user_activity_statements({
+            'crops': ('farmer_id', 'crops'),
+            'deliveries': ('distributor_id', 'deliveries'),
+            'payments': ('from_user_id', 'payments'),
+        }),
+        "SELECT rebuild_user_activity()",
+    ]),
+    (10, "Trigger-maintained trace completeness", [
+        # Events per (batch, step type); a step type counts towards a batch while it has events
+        """
+        CREATE TABLE IF NOT EXISTS batch_trace_steps (
+            batch_id VARCHAR(100) NOT NULL,
+            step_type VARCHAR(50) NOT NULL,
+            events BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (batch_id, step_type)
+        )
+        """,
+        # One row per crop batch, with the crop columns completeness is broken down by
+        """
+        CREATE TABLE IF NOT EXISTS batch_traces (
+            crop_id INTEGER PRIMARY KEY,
+            batch_id VARCHAR(100) NOT NULL,
+            crop_type VARCHAR(100) NOT NULL,
+            farmer_id INTEGER,
+            steps INTEGER NOT NULL DEFAULT 0,
+            events BIGINT NOT NULL DEFAULT 0,
+            complete BOOLEAN GENERATED ALWAYS AS (steps >= 2) STORED
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_batch_traces_batch_id ON batch_traces (batch_id)",
+        # Batch and complete-batch counts overall ('all'), per crop type and per farmer
+        """
+        CREATE TABLE IF NOT EXISTS trace_completeness (
+            dimension VARCHAR(20) NOT NULL,
+            value VARCHAR(100) NOT NULL DEFAULT '',
+            batches BIGINT NOT NULL DEFAULT 0,
+            complete BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        )
+        """,
+        *trace_completeness_statements({'crop_type': 'crop_type', 'farmer': 'farmer_id'}),
+        "SELECT rebuild_batch_traces()",
+    ]),
+    (11, "Index payments by payer and crop", [
+        # Delivery lists probe the payer's payment for each crop; supersedes the payer index
+        "CREATE INDEX IF NOT EXISTS idx_payments_from_user_crop ON payments (from_user_id, crop_id, created_at)",
+        "DROP INDEX IF EXISTS idx_payments_from_user_id",
+    ]),
+    (12, "Full-text crop search", [
+        # Name ranks above type, farmer and batch ID; 'simple' keeps names unstemmed for prefix matching
+        """
+        CREATE OR REPLACE FUNCTION crop_search_vector(name TEXT, type TEXT, farmer_name TEXT, batch_id TEXT)
+        RETURNS tsvector AS $$
+            SELECT setweight(to_tsvector('simple', COALESCE(name, '')), 'A')
+                || setweight(to_tsvector('simple', COALESCE(type, '')), 'B')
+                || setweight(to_tsvector('simple', COALESCE(farmer_name, '')), 'C')
+                || setweight(to_tsvector('simple', COALESCE(batch_id, '')), 'D')
+        $$ LANGUAGE sql IMMUTABLE
+        """,
+        "ALTER TABLE crops ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        # The backfill leaves every count unchanged, so skip the summary, rollup and notify triggers
+        "ALTER TABLE crops DISABLE TRIGGER USER",
+        """
+        UPDATE crops c SET search_vector = crop_search_vector(c.name, c.type, u.name, c.batch_id)
+        FROM crops c2
+        LEFT JOIN users u ON u.id = c2.farmer_id
+        WHERE c2.id = c.id
+        """,
+        "ALTER TABLE crops ENABLE TRIGGER USER",
+        "CREATE INDEX IF NOT EXISTS idx_crops_search ON crops USING GIN (search_vector)",
+        """
+        CREATE OR REPLACE FUNCTION stamp_crop_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := crop_search_vector(
+                NEW.name, NEW.type, (SELECT name FROM users WHERE id = NEW.farmer_id), NEW.batch_id
+            );
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER crops_search_vector BEFORE INSERT OR UPDATE OF name, type, farmer_id, batch_id ON crops
+        FOR EACH ROW EXECUTE FUNCTION stamp_crop_search_vector()
+        """,
+        # A renamed farmer is found under the new name
+        """
+        CREATE OR REPLACE FUNCTION restamp_farmer_crops() RETURNS trigger AS $$
+        BEGIN
+            UPDATE crops c SET search_vector = crop_search_vector(c.name, c.type, n.name, c.batch_id)
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            WHERE c.farmer_id = n.id AND n.name IS DISTINCT FROM o.name;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER users_crop_search AFTER UPDATE ON users
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION restamp_farmer_crops()
+        """,
+    ]),
+    (13, "Trigger-maintained trace snapshots", [
+        # Renamed actors regenerate the batches they stepped in
+        "CREATE INDEX IF NOT EXISTS idx_traceability_user_id ON traceability (user_id)",
+        # A batch's whole trace: crop, farmer and ordered steps with each actor's name and role
+        """
+        CREATE OR REPLACE VIEW trace_documents AS
+        SELECT c.batch_id, json_build_object(
+            'batch_id', c.batch_id,
+            'crop', json_build_object(
+                'id', c.id, 'name', c.name, 'type', c.type, 'quantity', c.quantity, 'price', c.price,
+                'harvest_date', c.harvest_date, 'status', c.status
+            ),
+            'farmer', json_build_object('id', f.id, 'name', f.name, 'phone', f.phone),
+            'steps', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'step_type', t.step_type, 'timestamp', t.timestamp, 'location', t.location,
+                    'details', t.details, 'user_id', t.user_id, 'user_name', u.name, 'role', u.role
+                ) ORDER BY t.timestamp, t.id)
+                FROM traceability t
+                LEFT JOIN users u ON t.user_id = u.id
+                WHERE t.batch_id = c.batch_id
+            ), '[]')
+        ) AS document
+        FROM crops c
+        LEFT JOIN users f ON c.farmer_id = f.id
+        """,
+        # trace_documents as of the last write to a batch, so reading a trace is one key lookup
+        """
+        CREATE TABLE IF NOT EXISTS trace_snapshots (
+            batch_id VARCHAR(100) PRIMARY KEY,
+            document JSON NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        *trace_snapshot_statements({
+            'crops': (
+                ('batch_id', 'name', 'type', 'quantity', 'price', 'harvest_date', 'status', 'farmer_id'),
+                "SELECT DISTINCT r.batch_id FROM {rows} r",
+            ),
+            'traceability': (
+                ('batch_id', 'step_type', 'timestamp', 'location', 'details', 'user_id'),
+                "SELECT DISTINCT r.batch_id FROM {rows} r",
+            ),
+            'users': (
+                ('name', 'phone', 'role'),
+                "SELECT c.batch_id FROM crops c JOIN {rows} r ON c.farmer_id = r.id "
+                "UNION SELECT t.batch_id FROM traceability t JOIN {rows} r ON t.user_id = r.id",
+            ),
+        }),
+        # Lets other processes evict cached traces when a snapshot changes
+        """
+        CREATE TRIGGER trace_snapshots_notify_change
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON trace_snapshots
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()
+        """,
+        "SELECT rebuild_trace_snapshots()",
+    ]),
+    (14, "Keyset index for the available-crops marketplace", [
+        # Newest available lots without walking past the sold and in-transit ones
+        "CREATE INDEX IF NOT EXISTS idx_crops_available_created ON crops (created_at, id) WHERE status = 'available'",
+    ]),
+    (15, "Only delivered deliveries carry a retail timestamp", [
+        # Migration 8 stamped retailed_at whatever the status, giving open deliveries a lead time
+        "ALTER TABLE deliveries DISABLE TRIGGER USER",
+        "UPDATE deliveries SET retailed_at = NULL WHERE status IS DISTINCT FROM 'delivered' AND retailed_at IS NOT NULL",
+        "ALTER TABLE deliveries ENABLE TRIGGER USER",
+        """
+        CREATE OR REPLACE FUNCTION stamp_delivery_retailed() RETURNS trigger AS $$
+        BEGIN
+            UPDATE deliveries d SET retailed_at = r.retailed_at
+            FROM (
+                SELECT c.id AS crop_id, MAX(n.timestamp) AS retailed_at
+                FROM new_rows n
+                JOIN crops c ON c.batch_id = n.batch_id
+                WHERE n.step_type = 'Retail'
+                GROUP BY c.id
+            ) r
+            WHERE d.crop_id = r.crop_id AND d.status = 'delivered'
+            AND (d.retailed_at IS NULL OR d.retailed_at < r.retailed_at);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]),
+    (16, "Skip unchanged users in per-user summary triggers", [
+        # Same triggers as migration 6; only the functions behind them skip all-zero deltas now
+        *user_summary_statements(USER_SUMMARY_SOURCES, with_triggers=False),
+    ]),
+]
+
+_migrated = False
+_migrate_lock = threading.Lock()
+
+def get_schema_version(cursor):
+    """Get the highest applied migration version"""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+def run_migrations(force=False):
+    """Apply pending migrations once per process"""
+    global _migrated
+    if _migrated and not force:
+        return True
+    
+    with _migrate_lock:
+        if _migrated and not force:
+            return True
+        
+        conn = get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+            
+            latest = MIGRATIONS[-1][0]
+            
+            # Cheap check first so processes that start after a migration skip the lock
+            if get_schema_version(cursor) < latest:
+                # Serialize migrators across processes; the lock is released on commit
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                current = get_schema_version(cursor)
+                
+                for version, description, statements in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                
+                conn.commit()
+            
+            cursor.close()
+            _migrated = True
+            return True
+        
+        except Exception as e:
+            conn.rollback()
+            st.error(f"Database migration failed: {str(e)}")
+            return False
+        finally:
+            release_connection(conn)
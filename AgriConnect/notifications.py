@@ -0,0 +1,127 @@
+import logging
+import os
+import select
+import threading
+import time
+import psycopg2
+from connections import get_connection_params
+from cache import clear_cache, invalidate_tables, set_ttl_cap
+
+# Channel the notify_table_change() trigger publishes to (see migration 4)
+CHANGE_CHANNEL = "agritrace_table_changes"
+
+listener_logger = logging.getLogger("agritrace.change_listener")
+
+def is_enabled():
+    """Check whether cross-process cache invalidation is switched on"""
+    return os.getenv("QUERY_CACHE_LISTEN", "1").lower() not in ("0", "false", "no")
+
+def get_listener_settings():
+    """Get listener timing settings from environment variables"""
+    return {
+        'fallback_ttl': float(os.getenv("QUERY_CACHE_FALLBACK_TTL", 5)),
+        'health_check_interval': float(os.getenv("QUERY_CACHE_LISTEN_HEALTH_CHECK", 30)),
+        'max_backoff': float(os.getenv("QUERY_CACHE_LISTEN_MAX_BACKOFF", 30)),
+    }
+
+class ChangeListener(threading.Thread):
+    """Background LISTEN connection that evicts cached results when any process writes a table
+    
+    While disconnected, changes from other processes can be missed, so the cache is
+    cleared and new entries are capped at fallback_ttl until the listener reconnects.
+    """
+    
+    def __init__(self, fallback_ttl, health_check_interval, max_backoff):
+        super().__init__(name="cache-change-listener", daemon=True)
+        self.fallback_ttl = fallback_ttl
+        self.health_check_interval = health_check_interval
+        self.max_backoff = max_backoff
+        self._stop_event = threading.Event()
+        self.status = {
+            'connected': False,
+            'notifications': 0,
+            'evicted': 0,
+            'reconnects': 0,
+            'last_error': None,
+        }
+    
+    def run(self):
+        failures = 0
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self._degrade(e)
+                self._stop_event.wait(min(2 ** failures, self.max_backoff))
+    
+    def _listen(self):
+        conn = psycopg2.connect(**get_connection_params())
+        try:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+            
+            # Anything cached while we weren't listening may have missed a change
+            clear_cache()
+            set_ttl_cap(None)
+            if self.status['last_error'] is not None:
+                self.status['reconnects'] += 1
+                listener_logger.info("change listener reconnected")
+            self.status['connected'] = True
+            
+            last_check = time.monotonic()
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([conn], [], [], 1.0)
+                if readable:
+                    conn.poll()
+                    self._handle(conn.notifies)
+                    conn.notifies.clear()
+                elif time.monotonic() - last_check >= self.health_check_interval:
+                    # A quiet socket can hide a dead server; a round trip surfaces it
+                    cursor.execute("SELECT 1")
+                    last_check = time.monotonic()
+        finally:
+            self.status['connected'] = False
+            conn.close()
+    
+    def _handle(self, notifies):
+        tables = {notify.payload for notify in notifies}
+        if tables:
+            self.status['notifications'] += len(notifies)
+            self.status['evicted'] += invalidate_tables(tables)
+    
+    def _degrade(self, error):
+        clear_cache()
+        set_ttl_cap(self.fallback_ttl)
+        self.status['last_error'] = str(error)
+        listener_logger.warning(f"change listener disconnected, caching with {self.fallback_ttl:.0f}s TTL: {error}")
+    
+    def stop(self):
+        self._stop_event.set()
+
+# One listener per process
+_listener = None
+_listener_lock = threading.Lock()
+
+def start_change_listener():
+    """Start the process-wide change listener if it isn't running yet"""
+    global _listener
+    if not is_enabled():
+        return None
+    
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            settings = get_listener_settings()
+            # Until the first LISTEN succeeds, other processes' writes go unseen
+            set_ttl_cap(settings['fallback_ttl'])
+            _listener = ChangeListener(**settings)
+            _listener.start()
+    return _listener
+
+def get_listener_status():
+    """Get the change listener's connection state and counters"""
+    if _listener is None:
+        return {'connected': False, 'running': False}
+    return dict(_listener.status, running=_listener.is_alive())
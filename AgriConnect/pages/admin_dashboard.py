@@ -1,7 +1,12 @@
 import streamlit as st
-from database import execute_query, fetch_one
+from database import execute_query, fetch_one, fetch_all_cached, fetch_facet_counts, load_concurrently
 from utils import create_user_card, create_crop_card, create_payment_card
 from components.charts import create_analytics_overview, create_pie_chart, create_line_chart
+from metrics import get_metrics, get_stat_counters, get_user_summaries, recompute_stat_counters, get_rollup_series, get_rollup_totals, get_lead_time_stats, get_activity_leaderboard, get_trace_completeness, get_trace_completeness_breakdown
+from components.pagination import paginated_rows
+from components.facets import facet_selections, facet_selectbox
+from search import crop_search_condition
+from traces import get_trace_document
 import pandas as pd
 from datetime import datetime, timedelta
 
@@ -24,20 +29,38 @@ def render_analytics():
     """Render analytics overview"""
     st.markdown("## 📊 System Analytics")
     
-    # Get system statistics
-    total_users = fetch_one("SELECT COUNT(*) as count FROM users")
-    total_crops = fetch_one("SELECT COUNT(*) as count FROM crops")
-    total_payments_amount = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE payment_status = 'completed'")
-    pending_deliveries = fetch_one("SELECT COUNT(*) as count FROM deliveries WHERE status IN ('pending', 'in_transit')")
+    # Whole days keep the params stable across reruns so the cached results can be reused
+    start_date = (datetime.now() - timedelta(days=30)).date()
+    
+    # Every section's query is independent, so fetch them all at once
+    data = load_concurrently({
+        'counters': get_stat_counters,
+        'user_roles': lambda: get_rollup_totals('users_by_role'),
+        'crop_types': lambda: fetch_all_cached("""
+            SELECT type, COUNT(*) as count 
+            FROM crops 
+            GROUP BY type
+        """, ttl=60),
+        'payment_trends': lambda: get_rollup_series('payments_by_status', 'day', start_date, 'completed'),
+        'recent': lambda: get_metrics(('recent_users', 'recent_crops', 'recent_transactions', 'active_deliveries'),
+                                      start_date),
+    })
+    counters = data['counters']
     
     # Display overview cards
     create_analytics_overview(
-        total_users['count'] if total_users else 0,
-        total_crops['count'] if total_crops else 0,
-        total_payments_amount['total'] if total_payments_amount else 0,
-        pending_deliveries['count'] if pending_deliveries else 0
+        int(counters.get('users_total', 0)),
+        int(counters.get('crops_total', 0)),
+        counters.get('payments_completed_amount', 0),
+        int(counters.get('deliveries_open', 0))
     )
     
+    # The header is kept by triggers; an exact recount is available if it ever drifts
+    if st.button("🔄 Recompute Counters", key="recompute_counters"):
+        if recompute_stat_counters():
+            st.success("✅ Counters recomputed!")
+            st.rerun()
+    
     st.markdown("---")
     
     # Charts section
@@ -46,14 +69,10 @@ def render_analytics():
     with col1:
         # User distribution pie chart
         st.markdown("### 👥 User Distribution by Role")
-        user_roles = execute_query("""
-            SELECT role, COUNT(*) as count 
-            FROM users 
-            GROUP BY role
-        """, fetch=True)
+        user_roles = data['user_roles']
         
         if user_roles:
-            role_data = {row['role']: row['count'] for row in user_roles}
+            role_data = {row['dimension']: row['count'] for row in user_roles}
             create_pie_chart(role_data, "Users by Role")
         else:
             st.info("No user data available")
@@ -61,11 +80,7 @@ def render_analytics():
     with col2:
         # Crop distribution pie chart
         st.markdown("### 🌾 Crops by Type")
-        crop_types = execute_query("""
-            SELECT type, COUNT(*) as count 
-            FROM crops 
-            GROUP BY type
-        """, fetch=True)
+        crop_types = data['crop_types']
         
         if crop_types:
             crop_data = {row['type']: row['count'] for row in crop_types}
@@ -75,19 +90,10 @@ def render_analytics():
     
     # Payment trends
     st.markdown("### 💰 Payment Trends (Last 30 Days)")
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
-    
-    payment_trends = execute_query("""
-        SELECT DATE(created_at) as payment_date, SUM(amount) as daily_amount
-        FROM payments 
-        WHERE created_at >= %s AND payment_status = 'completed'
-        GROUP BY DATE(created_at)
-        ORDER BY payment_date
-    """, (start_date,), fetch=True)
+    payment_trends = data['payment_trends']
     
     if payment_trends:
-        trend_data = [{'date': row['payment_date'].strftime('%Y-%m-%d'), 'amount': float(row['daily_amount'])} for row in payment_trends]
+        trend_data = [{'date': row['bucket'].strftime('%Y-%m-%d'), 'amount': float(row['total'])} for row in payment_trends]
         create_line_chart(trend_data, 'date', 'amount', 'Daily Payment Volume')
     else:
         st.info("No payment trend data available")
@@ -97,22 +103,19 @@ def render_analytics():
     st.markdown("### 📈 Recent Activity Summary")
     
     col1, col2, col3, col4 = st.columns(4)
+    recent = data['recent']
     
     with col1:
-        recent_users = fetch_one("SELECT COUNT(*) as count FROM users WHERE created_at >= %s", (start_date,))
-        st.metric("👥 New Users (30d)", recent_users['count'] if recent_users else 0)
+        st.metric("👥 New Users (30d)", recent['recent_users'])
     
     with col2:
-        recent_crops = fetch_one("SELECT COUNT(*) as count FROM crops WHERE created_at >= %s", (start_date,))
-        st.metric("🌾 New Crops (30d)", recent_crops['count'] if recent_crops else 0)
+        st.metric("🌾 New Crops (30d)", recent['recent_crops'])
     
     with col3:
-        recent_transactions = fetch_one("SELECT COUNT(*) as count FROM transactions WHERE created_at >= %s", (start_date,))
-        st.metric("🔄 Transactions (30d)", recent_transactions['count'] if recent_transactions else 0)
+        st.metric("🔄 Transactions (30d)", recent['recent_transactions'])
     
     with col4:
-        active_deliveries = fetch_one("SELECT COUNT(*) as count FROM deliveries WHERE status = 'in_transit'")
-        st.metric("🚛 Active Deliveries", active_deliveries['count'] if active_deliveries else 0)
+        st.metric("🚛 Active Deliveries", recent['active_deliveries'])
 
 def render_users():
     """Render user management"""
@@ -120,51 +123,61 @@ def render_users():
     
     # Filter options
     col1, col2, col3 = st.columns(3)
-    with col1:
-        role_filter = st.selectbox("Filter by Role", ["All", "Farmer", "Distributor", "Retailer", "Buyer", "Admin"])
-    with col2:
-        status_filter = st.selectbox("Filter by Status", ["All", "active", "inactive", "pending"])
     with col3:
         search_term = st.text_input("Search Users", placeholder="Search by name or email...")
     
-    # Build query
-    query = "SELECT * FROM users WHERE 1=1"
+    # Build filter
+    conditions = "FROM users WHERE 1=1"
     params = []
     
+    if search_term:
+        conditions += " AND (LOWER(name) LIKE %s OR LOWER(email) LIKE %s)"
+        params.extend([f"%{search_term.lower()}%", f"%{search_term.lower()}%"])
+    
+    # Per-option counts for the filters, from one grouped query over the unfiltered list
+    facet_rows = fetch_facet_counts(conditions, ('role', 'status'), params)
+    selections = facet_selections("admin_users", ('role', 'status'))
+    with col1:
+        role_filter = facet_selectbox("Filter by Role", "admin_users", 'role',
+                                      ["All", "Farmer", "Distributor", "Retailer", "Buyer", "Admin"],
+                                      facet_rows, selections)
+    with col2:
+        status_filter = facet_selectbox("Filter by Status", "admin_users", 'status',
+                                        ["All", "active", "inactive", "pending"], facet_rows, selections)
+    
     if role_filter != "All":
-        query += " AND role = %s"
+        conditions += " AND role = %s"
         params.append(role_filter)
     
     if status_filter != "All":
-        query += " AND status = %s"
+        conditions += " AND status = %s"
         params.append(status_filter)
     
-    if search_term:
-        query += " AND (LOWER(name) LIKE %s OR LOWER(email) LIKE %s)"
-        params.extend([f"%{search_term.lower()}%", f"%{search_term.lower()}%"])
-    
-    query += " ORDER BY created_at DESC"
+    # User statistics over every matching user, not just the current page
+    summary = fetch_one(f"""
+        SELECT COUNT(*) as total,
+               COUNT(*) FILTER (WHERE status = 'active') as active,
+               COUNT(*) FILTER (WHERE status = 'pending') as pending
+        {conditions}
+    """, params)
     
-    users = execute_query(query, params, fetch=True)
-    
-    if users:
-        # User statistics
-        total_users = len(users)
-        active_users = len([u for u in users if u['status'] == 'active'])
-        pending_users = len([u for u in users if u['status'] == 'pending'])
-        
+    if summary and summary['total']:
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("👥 Total Users", total_users)
+            st.metric("👥 Total Users", summary['total'])
         with col2:
-            st.metric("✅ Active Users", active_users)
+            st.metric("✅ Active Users", summary['active'])
         with col3:
-            st.metric("⏳ Pending Approval", pending_users)
+            st.metric("⏳ Pending Approval", summary['pending'])
         
         st.markdown("---")
         
         # User list
+        users = paginated_rows("admin_users", f"SELECT * {conditions}", params) or []
+        # Activity for the whole page in one query
+        summaries = get_user_summaries([user['id'] for user in users])
         for user in users:
+            user_summary = summaries[user['id']]
             col1, col2 = st.columns([3, 1])
             
             with col1:
@@ -188,6 +201,7 @@ def render_users():
                     <p style="color: #6b7280; margin: 0.25rem 0;"><strong>Phone:</strong> {user.get('phone', 'N/A')}</p>
                     <p style="color: #6b7280; margin: 0.25rem 0;"><strong>Role:</strong> {user['role']}</p>
                     <p style="color: #6b7280; margin: 0.25rem 0;"><strong>Joined:</strong> {user['created_at'].strftime('%Y-%m-%d')}</p>
+                    <p style="color: #6b7280; margin: 0.25rem 0;"><strong>Activity:</strong> {format_user_activity(user, user_summary)}</p>
                     <span style="
                         background: {status_color};
                         color: white;
@@ -222,7 +236,7 @@ def render_users():
                 
                 # View details button
                 if st.button(f"👁️ View Details", key=f"view_{user['id']}"):
-                    show_user_details(user)
+                    show_user_details(user, user_summary)
     else:
         st.info("No users found matching your criteria.")
 
@@ -262,7 +276,17 @@ def activate_user(user_id):
     else:
         st.error("Failed to activate user.")
 
-def show_user_details(user):
+def format_user_activity(user, user_summary):
+    """Format a user's role-specific activity and completed payments as one line"""
+    activity = {
+        'Farmer': f"{user_summary['crops_total']} crops",
+        'Distributor': f"{user_summary['shipments_total']} deliveries",
+        'Retailer': f"{user_summary['receipts_total']} received deliveries",
+    }.get(user['role'])
+    payments = f"₹{user_summary['received_completed']:,.0f} received · ₹{user_summary['paid_completed']:,.0f} paid"
+    return f"{activity} · {payments}" if activity else payments
+
+def show_user_details(user, user_summary):
     """Show detailed user information"""
     with st.expander(f"👁️ Details for {user['name']}", expanded=True):
         col1, col2 = st.columns(2)
@@ -281,23 +305,19 @@ def show_user_details(user):
             st.markdown("**Activity Summary:**")
             
             if user['role'] == 'Farmer':
-                crops_count = fetch_one("SELECT COUNT(*) as count FROM crops WHERE farmer_id = %s", (user['id'],))
-                st.write(f"**Crops Added:** {crops_count['count'] if crops_count else 0}")
+                st.write(f"**Crops Added:** {user_summary['crops_total']}")
             
             elif user['role'] == 'Distributor':
-                deliveries_count = fetch_one("SELECT COUNT(*) as count FROM deliveries WHERE distributor_id = %s", (user['id'],))
-                st.write(f"**Deliveries:** {deliveries_count['count'] if deliveries_count else 0}")
+                st.write(f"**Deliveries:** {user_summary['shipments_total']}")
             
             elif user['role'] == 'Retailer':
-                received_deliveries = fetch_one("SELECT COUNT(*) as count FROM deliveries WHERE retailer_id = %s", (user['id'],))
-                st.write(f"**Received Deliveries:** {received_deliveries['count'] if received_deliveries else 0}")
+                st.write(f"**Received Deliveries:** {user_summary['receipts_total']}")
             
             # Payment summary
-            payments_received = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE to_user_id = %s AND payment_status = 'completed'", (user['id'],))
-            payments_made = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE from_user_id = %s AND payment_status = 'completed'", (user['id'],))
-            
-            st.write(f"**Payments Received:** ₹{payments_received['total'] if payments_received else 0:,.0f}")
-            st.write(f"**Payments Made:** ₹{payments_made['total'] if payments_made else 0:,.0f}")
+            st.write(f"**Payments Received:** ₹{user_summary['received_completed']:,.0f}")
+            st.write(f"**Payments Made:** ₹{user_summary['paid_completed']:,.0f}")
+            if user_summary['last_activity_at']:
+                st.write(f"**Last Activity:** {user_summary['last_activity_at'].strftime('%Y-%m-%d %H:%M')}")
 
 def render_crops():
     """Render crop management"""
@@ -305,55 +325,63 @@ def render_crops():
     
     # Filter options
     col1, col2, col3 = st.columns(3)
-    with col1:
-        type_filter = st.selectbox("Filter by Type", ["All", "Cereals", "Vegetables", "Fruits", "Pulses", "Spices", "Other"])
-    with col2:
-        status_filter = st.selectbox("Filter by Status", ["All", "available", "in_transit", "delivered", "sold"])
     with col3:
-        search_term = st.text_input("Search Crops", placeholder="Search by name or batch ID...")
+        search_term = st.text_input("Search Crops", placeholder="Search by name, type, farmer or batch ID...")
     
-    # Build query
-    query = """
-        SELECT c.*, u.name as farmer_name, u.email as farmer_email
-        FROM crops c
-        LEFT JOIN users u ON c.farmer_id = u.id
-        WHERE 1=1
-    """
+    # Build filter
+    conditions = "WHERE 1=1"
     params = []
     
+    search_condition, search_params = crop_search_condition(search_term)
+    conditions += search_condition
+    params.extend(search_params)
+    
+    # Per-option counts for the filters, from one grouped query over the unfiltered list
+    facet_rows = fetch_facet_counts(f"FROM crops c {conditions}", ('type', 'status'), params)
+    selections = facet_selections("admin_crops", ('type', 'status'))
+    with col1:
+        type_filter = facet_selectbox("Filter by Type", "admin_crops", 'type',
+                                      ["All", "Cereals", "Vegetables", "Fruits", "Pulses", "Spices", "Other"],
+                                      facet_rows, selections)
+    with col2:
+        status_filter = facet_selectbox("Filter by Status", "admin_crops", 'status',
+                                        ["All", "available", "in_transit", "delivered", "sold"], facet_rows, selections)
+    
     if type_filter != "All":
-        query += " AND c.type = %s"
+        conditions += " AND c.type = %s"
         params.append(type_filter)
     
     if status_filter != "All":
-        query += " AND c.status = %s"
+        conditions += " AND c.status = %s"
         params.append(status_filter)
     
-    if search_term:
-        query += " AND (LOWER(c.name) LIKE %s OR LOWER(c.batch_id) LIKE %s)"
-        params.extend([f"%{search_term.lower()}%", f"%{search_term.lower()}%"])
-    
-    query += " ORDER BY c.created_at DESC"
-    
-    crops = execute_query(query, params, fetch=True)
+    # Crop statistics over every matching crop, not just the current page
+    summary = fetch_one(f"""
+        SELECT COUNT(*) as total,
+               COUNT(*) FILTER (WHERE c.status = 'available') as available,
+               COALESCE(SUM(c.price * c.quantity), 0) as total_value
+        FROM crops c
+        {conditions}
+    """, params)
     
-    if crops:
-        # Crop statistics
-        total_crops = len(crops)
-        available_crops = len([c for c in crops if c['status'] == 'available'])
-        total_value = sum([c['price'] * c['quantity'] for c in crops])
-        
+    if summary and summary['total']:
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("🌾 Total Crops", total_crops)
+            st.metric("🌾 Total Crops", summary['total'])
         with col2:
-            st.metric("📦 Available", available_crops)
+            st.metric("📦 Available", summary['available'])
         with col3:
-            st.metric("💰 Total Value", f"₹{total_value:,.0f}")
+            st.metric("💰 Total Value", f"₹{summary['total_value']:,.0f}")
         
         st.markdown("---")
         
         # Crop list
+        crops = paginated_rows("admin_crops", f"""
+            SELECT c.*, u.name as farmer_name, u.email as farmer_email
+            FROM crops c
+            LEFT JOIN users u ON c.farmer_id = u.id
+            {conditions}
+        """, params, alias="c") or []
         for crop in crops:
             col1, col2 = st.columns([3, 1])
             
@@ -408,13 +436,8 @@ def render_crops():
 def show_crop_traceability(crop):
     """Show crop traceability information"""
     with st.expander(f"📍 Traceability for {crop['name']} ({crop['batch_id']})", expanded=True):
-        traceability = execute_query("""
-            SELECT t.*, u.name as user_name, u.role
-            FROM traceability t
-            LEFT JOIN users u ON t.user_id = u.id
-            WHERE t.batch_id = %s
-            ORDER BY t.timestamp ASC
-        """, (crop['batch_id'],), fetch=True)
+        trace = get_trace_document(crop['batch_id'])
+        traceability = trace['steps'] if trace else []
         
         if traceability:
             for step in traceability:
@@ -432,17 +455,15 @@ def render_payments():
     st.markdown("## 💰 Payment Management")
     
     # Payment overview
-    total_payments = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE payment_status = 'completed'")
-    pending_payments = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE payment_status = 'pending'")
-    failed_payments = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE payment_status = 'failed'")
+    totals = get_metrics(('completed_payments', 'pending_payments', 'failed_payments'))
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("✅ Completed Payments", f"₹{total_payments['total'] if total_payments else 0:,.0f}")
+        st.metric("✅ Completed Payments", f"₹{totals['completed_payments']:,.0f}")
     with col2:
-        st.metric("⏳ Pending Payments", f"₹{pending_payments['total'] if pending_payments else 0:,.0f}")
+        st.metric("⏳ Pending Payments", f"₹{totals['pending_payments']:,.0f}")
     with col3:
-        st.metric("❌ Failed Payments", f"₹{failed_payments['total'] if failed_payments else 0:,.0f}")
+        st.metric("❌ Failed Payments", f"₹{totals['failed_payments']:,.0f}")
     
     st.markdown("---")
     
@@ -473,13 +494,12 @@ def render_payments():
     
     if date_range != "All Time":
         days = {"Last 7 Days": 7, "Last 30 Days": 30, "Last 90 Days": 90}[date_range]
-        cutoff_date = datetime.now() - timedelta(days=days)
+        # Whole days keep the params stable across reruns so the page cursor survives
+        cutoff_date = (datetime.now() - timedelta(days=days)).date()
         query += " AND p.created_at >= %s"
         params.append(cutoff_date)
     
-    query += " ORDER BY p.created_at DESC LIMIT 50"
-    
-    payments = execute_query(query, params, fetch=True)
+    payments = paginated_rows("admin_payments", query, params, alias="p")
     
     if payments:
         for payment in payments:
@@ -560,33 +580,17 @@ def render_supply_chain_report():
     """Render supply chain performance report"""
     st.markdown("### 🔗 Supply Chain Performance")
     
-    # Get delivery statistics
-    total_deliveries = fetch_one("SELECT COUNT(*) as count FROM deliveries")
-    completed_deliveries = fetch_one("SELECT COUNT(*) as count FROM deliveries WHERE status = 'delivered'")
-    average_delivery_time = fetch_one("""
-        SELECT AVG(EXTRACT(EPOCH FROM (
-            CASE 
-                WHEN status = 'delivered' THEN 
-                    COALESCE(
-                        (SELECT MAX(timestamp) FROM traceability WHERE batch_id = (SELECT batch_id FROM crops WHERE id = deliveries.crop_id) AND step_type = 'Retail'),
-                        deliveries.created_at
-                    )
-                ELSE deliveries.created_at
-            END - deliveries.created_at
-        )) / 86400) as avg_days
-        FROM deliveries 
-        WHERE status = 'delivered'
-    """)
+    # Get delivery statistics; lead time runs from pickup to the retailer receiving the batch (see migration 8)
+    deliveries = get_metrics(('total_deliveries', 'completed_deliveries', 'avg_delivery_days'))
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("📦 Total Deliveries", total_deliveries['count'] if total_deliveries else 0)
+        st.metric("📦 Total Deliveries", deliveries['total_deliveries'])
     with col2:
-        completion_rate = (completed_deliveries['count'] / total_deliveries['count'] * 100) if total_deliveries and total_deliveries['count'] > 0 else 0
+        completion_rate = (deliveries['completed_deliveries'] / deliveries['total_deliveries'] * 100) if deliveries['total_deliveries'] > 0 else 0
         st.metric("✅ Completion Rate", f"{completion_rate:.1f}%")
     with col3:
-        avg_time = average_delivery_time['avg_days'] if average_delivery_time and average_delivery_time['avg_days'] else 0
-        st.metric("⏱️ Avg Delivery Time", f"{avg_time:.1f} days")
+        st.metric("⏱️ Avg Delivery Time", f"{deliveries['avg_delivery_days']:.1f} days")
     
     # Delivery status distribution
     delivery_status = execute_query("""
@@ -598,63 +602,47 @@ def render_supply_chain_report():
     if delivery_status:
         status_data = {row['status'].replace('_', ' ').title(): row['count'] for row in delivery_status}
         create_pie_chart(status_data, "Delivery Status Distribution")
+    
+    # Lead time percentiles
+    st.markdown("#### ⏱️ Lead Time by Distributor")
+    distributor_lead_times = get_lead_time_stats('distributor')
+    if distributor_lead_times:
+        st.dataframe(pd.DataFrame(distributor_lead_times), use_container_width=True, hide_index=True)
+    else:
+        st.info("No completed deliveries yet")
+    
+    st.markdown("#### 🛣️ Lead Time by Route")
+    route_lead_times = get_lead_time_stats('route', limit=20)
+    if route_lead_times:
+        st.dataframe(pd.DataFrame(route_lead_times), use_container_width=True, hide_index=True)
 
 def render_user_activity_report():
     """Render user activity report"""
     st.markdown("### 👥 User Activity Summary")
     
     # Registration trends
-    registration_trends = execute_query("""
-        SELECT DATE(created_at) as reg_date, COUNT(*) as new_users
-        FROM users 
-        WHERE created_at >= %s
-        GROUP BY DATE(created_at)
-        ORDER BY reg_date
-    """, (datetime.now() - timedelta(days=30),), fetch=True)
+    registration_trends = get_rollup_series('users_by_role', 'day', (datetime.now() - timedelta(days=30)).date())
     
     if registration_trends:
-        trend_data = [{'date': row['reg_date'].strftime('%Y-%m-%d'), 'users': row['new_users']} for row in registration_trends]
+        trend_data = [{'date': row['bucket'].strftime('%Y-%m-%d'), 'users': row['count']} for row in registration_trends]
         create_line_chart(trend_data, 'date', 'users', 'New User Registrations (Last 30 Days)')
     
     # User role distribution
-    role_distribution = execute_query("SELECT role, COUNT(*) as count FROM users GROUP BY role", fetch=True)
+    role_distribution = get_rollup_totals('users_by_role')
     if role_distribution:
-        role_data = {row['role']: row['count'] for row in role_distribution}
+        role_data = {row['dimension']: row['count'] for row in role_distribution}
         create_pie_chart(role_data, "User Distribution by Role")
     
     # Most active users
     st.markdown("#### 🏆 Most Active Users")
-    active_users = execute_query("""
-        SELECT u.name, u.role, 
-               COALESCE(crop_count, 0) as crops,
-               COALESCE(delivery_count, 0) as deliveries,
-               COALESCE(payment_count, 0) as payments
-        FROM users u
-        LEFT JOIN (
-            SELECT farmer_id, COUNT(*) as crop_count 
-            FROM crops 
-            GROUP BY farmer_id
-        ) c ON u.id = c.farmer_id
-        LEFT JOIN (
-            SELECT distributor_id, COUNT(*) as delivery_count 
-            FROM deliveries 
-            GROUP BY distributor_id
-        ) d ON u.id = d.distributor_id
-        LEFT JOIN (
-            SELECT from_user_id, COUNT(*) as payment_count 
-            FROM payments 
-            GROUP BY from_user_id
-        ) p ON u.id = p.from_user_id
-        WHERE u.status = 'active'
-        ORDER BY (COALESCE(crop_count, 0) + COALESCE(delivery_count, 0) + COALESCE(payment_count, 0)) DESC
-        LIMIT 10
-    """, fetch=True)
+    windows = {"All Time": None, "Last 7 Days": 7, "Last 30 Days": 30, "Last 90 Days": 90}
+    window = st.selectbox("Activity Window", list(windows), key="activity_window")
+    active_users = get_activity_leaderboard(windows[window])
     
     if active_users:
         for user in active_users:
-            activity_score = user['crops'] + user['deliveries'] + user['payments']
             st.markdown(f"""
-            **{user['name']}** ({user['role']}) - Activity Score: {activity_score}  
+            **{user['name']}** ({user['role']}) - Activity Score: {user['score']}  
             Crops: {user['crops']} | Deliveries: {user['deliveries']} | Payments: {user['payments']}
             """)
 
@@ -663,36 +651,22 @@ def render_financial_report():
     st.markdown("### 💰 Financial Overview")
     
     # Payment statistics
-    payment_stats = execute_query("""
-        SELECT 
-            payment_status,
-            COUNT(*) as transaction_count,
-            SUM(amount) as total_amount
-        FROM payments 
-        GROUP BY payment_status
-    """, fetch=True)
+    payment_stats = get_rollup_totals('payments_by_status')
     
     if payment_stats:
         for stat in payment_stats:
             st.markdown(f"""
-            **{stat['payment_status'].title()} Payments:**  
-            Count: {stat['transaction_count']} | Total: ₹{stat['total_amount']:,.0f}
+            **{stat['dimension'].title()} Payments:**  
+            Count: {stat['count']} | Total: ₹{stat['total']:,.0f}
             """)
     
     # Monthly payment trends
-    monthly_payments = execute_query("""
-        SELECT 
-            DATE_TRUNC('month', created_at) as month,
-            SUM(amount) as monthly_total
-        FROM payments 
-        WHERE payment_status = 'completed'
-        AND created_at >= %s
-        GROUP BY DATE_TRUNC('month', created_at)
-        ORDER BY month
-    """, (datetime.now() - timedelta(days=365),), fetch=True)
+    # Whole months, starting with the one a year ago
+    since = (datetime.now() - timedelta(days=365)).date().replace(day=1)
+    monthly_payments = get_rollup_series('payments_by_status', 'month', since, 'completed')
     
     if monthly_payments:
-        monthly_data = [{'month': row['month'].strftime('%Y-%m'), 'amount': float(row['monthly_total'])} for row in monthly_payments]
+        monthly_data = [{'month': row['bucket'].strftime('%Y-%m'), 'amount': float(row['total'])} for row in monthly_payments]
         create_line_chart(monthly_data, 'month', 'amount', 'Monthly Payment Volume')
 
 def render_crop_production_report():
@@ -764,20 +738,11 @@ def render_quality_metrics_report():
         success_rate = (delivery_success[0]['successful_deliveries'] / delivery_success[0]['total_deliveries']) * 100
         st.metric("📦 Delivery Success Rate", f"{success_rate:.1f}%")
     
-    # Traceability completeness
-    traceability_stats = execute_query("""
-        SELECT 
-            c.batch_id,
-            COUNT(DISTINCT t.step_type) as trace_steps
-        FROM crops c
-        LEFT JOIN traceability t ON c.batch_id = t.batch_id
-        GROUP BY c.batch_id
-    """, fetch=True)
+    # Traceability completeness (batches with at least two distinct trace steps)
+    trace_completeness = get_trace_completeness()
     
-    if traceability_stats:
-        complete_traces = len([t for t in traceability_stats if t['trace_steps'] >= 2])
-        total_batches = len(traceability_stats)
-        completeness_rate = (complete_traces / total_batches * 100) if total_batches > 0 else 0
+    if trace_completeness['batches'] > 0:
+        completeness_rate = trace_completeness['complete'] / trace_completeness['batches'] * 100
         st.metric("🔍 Traceability Completeness", f"{completeness_rate:.1f}%")
     
     # Payment reliability
@@ -791,3 +756,15 @@ def render_quality_metrics_report():
     if payment_reliability and payment_reliability[0]['total_payments'] > 0:
         reliability_rate = (payment_reliability[0]['completed_payments'] / payment_reliability[0]['total_payments']) * 100
         st.metric("💰 Payment Reliability", f"{reliability_rate:.1f}%")
+    
+    st.markdown("#### 🔍 Traceability Completeness by Crop Type")
+    completeness_by_type = get_trace_completeness_breakdown('crop_type')
+    if completeness_by_type:
+        st.dataframe(pd.DataFrame(completeness_by_type), use_container_width=True, hide_index=True)
+    else:
+        st.info("No crop batches yet")
+    
+    st.markdown("#### 👨‍🌾 Traceability Completeness by Farmer")
+    completeness_by_farmer = get_trace_completeness_breakdown('farmer', limit=20)
+    if completeness_by_farmer:
+        st.dataframe(pd.DataFrame(completeness_by_farmer), use_container_width=True, hide_index=True)
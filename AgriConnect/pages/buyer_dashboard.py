@@ -1,5 +1,5 @@
 import streamlit as st
-from database import execute_query, fetch_one
+from traces import get_trace_document, serialize_trace
 from components.qr_generator import scan_qr_interface
 from utils import create_timeline_step
 from datetime import datetime
@@ -46,17 +46,13 @@ def display_traceability(batch_id):
     """Display complete traceability for a batch ID"""
     st.markdown(f"## 🔍 Traceability for Batch: {batch_id}")
     
-    # Get crop information
-    crop_info = fetch_one("""
-        SELECT c.*, u.name as farmer_name, u.phone as farmer_phone
-        FROM crops c
-        LEFT JOIN users u ON c.farmer_id = u.id
-        WHERE c.batch_id = %s
-    """, (batch_id,))
+    # Crop, farmer and timeline in one round trip
+    trace = get_trace_document(batch_id)
     
-    if not crop_info:
+    if not trace:
         st.error("❌ Invalid batch ID or crop not found.")
         return
+    crop_info, farmer = trace['crop'], trace['farmer']
     
     # Display crop information
     st.markdown("### 🌾 Product Information")
@@ -75,7 +71,7 @@ def display_traceability(batch_id):
             <p style="margin: 0.5rem 0;"><strong>Type:</strong> {crop_info['type']}</p>
             <p style="margin: 0.5rem 0;"><strong>Quantity:</strong> {crop_info['quantity']} kg</p>
             <p style="margin: 0.5rem 0;"><strong>Harvest Date:</strong> {crop_info['harvest_date']}</p>
-            <p style="margin: 0.5rem 0;"><strong>Batch ID:</strong> {crop_info['batch_id']}</p>
+            <p style="margin: 0.5rem 0;"><strong>Batch ID:</strong> {trace['batch_id']}</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -89,22 +85,15 @@ def display_traceability(batch_id):
             border-left: 4px solid #22c55e;
         ">
             <h3 style="color: #1f2937; margin: 0 0 1rem 0;">👨‍🌾 Farmer Information</h3>
-            <p style="color: #6b7280; margin: 0.5rem 0;"><strong>Name:</strong> {crop_info['farmer_name']}</p>
-            <p style="color: #6b7280; margin: 0.5rem 0;"><strong>Contact:</strong> {crop_info['farmer_phone']}</p>
+            <p style="color: #6b7280; margin: 0.5rem 0;"><strong>Name:</strong> {farmer['name']}</p>
+            <p style="color: #6b7280; margin: 0.5rem 0;"><strong>Contact:</strong> {farmer['phone']}</p>
             <p style="color: #6b7280; margin: 0.5rem 0;"><strong>Status:</strong> Verified Farmer ✅</p>
         </div>
         """, unsafe_allow_html=True)
     
     st.markdown("---")
     
-    # Get traceability timeline
-    timeline = execute_query("""
-        SELECT t.*, u.name as user_name, u.role
-        FROM traceability t
-        LEFT JOIN users u ON t.user_id = u.id
-        WHERE t.batch_id = %s
-        ORDER BY t.timestamp ASC
-    """, (batch_id,), fetch=True)
+    timeline = trace['steps']
     
     if timeline:
         st.markdown("### 📍 Complete Journey Timeline")
@@ -170,6 +159,14 @@ def display_traceability(batch_id):
             </div>
             """, unsafe_allow_html=True)
     
+    # Export the same document the page was built from
+    st.download_button(
+        label="📥 Download Trace (JSON)",
+        data=serialize_trace(trace),
+        file_name=f"trace_{trace['batch_id']}.json",
+        mime="application/json"
+    )
+    
     # Quality assurance info
     st.markdown("---")
     st.markdown("### ✅ Quality Assurance")
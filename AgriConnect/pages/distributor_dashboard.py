@@ -1,6 +1,9 @@
 import streamlit as st
-from database import execute_query, fetch_one
+from database import execute_query, fetch_one, fetch_existing, fetch_all_cached, transaction, load_concurrently
 from utils import create_crop_card, create_payment_card
+from components.pagination import paginated_rows
+from metrics import get_user_summary
+from search import search_crops
 from datetime import date
 import uuid
 
@@ -25,21 +28,20 @@ def render_overview():
     
     distributor_id = st.session_state.user_id
     
-    # Get distributor statistics
-    active_deliveries = fetch_one("""
-        SELECT COUNT(*) as count FROM deliveries 
-        WHERE distributor_id = %s AND status = 'in_transit'
-    """, (distributor_id,))
-    
-    completed_deliveries = fetch_one("""
-        SELECT COUNT(*) as count FROM deliveries 
-        WHERE distributor_id = %s AND status = 'delivered'
-    """, (distributor_id,))
-    
-    total_earnings = fetch_one("""
-        SELECT COALESCE(SUM(amount), 0) as total FROM payments 
-        WHERE to_user_id = %s AND payment_status = 'completed'
-    """, (distributor_id,))
+    # Get distributor statistics and recent activity in one concurrent round
+    data = load_concurrently({
+        'summary': lambda: get_user_summary(distributor_id),
+        'recent_deliveries': lambda: execute_query("""
+            SELECT d.*, c.name as crop_name, u.name as farmer_name
+            FROM deliveries d
+            LEFT JOIN crops c ON d.crop_id = c.id
+            LEFT JOIN users u ON c.farmer_id = u.id
+            WHERE d.distributor_id = %s
+            ORDER BY d.created_at DESC
+            LIMIT 5
+        """, (distributor_id,), fetch=True),
+    })
+    summary = data['summary']
     
     # Display metrics
     col1, col2, col3 = st.columns(3)
@@ -53,7 +55,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">{active_deliveries['count'] if active_deliveries else 0}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">{summary['shipments_in_transit']}</h3>
             <p style="margin: 0.5rem 0 0 0;">🚛 Active Deliveries</p>
         </div>
         """, unsafe_allow_html=True)
@@ -67,7 +69,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">{completed_deliveries['count'] if completed_deliveries else 0}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">{summary['shipments_delivered']}</h3>
             <p style="margin: 0.5rem 0 0 0;">✅ Completed</p>
         </div>
         """, unsafe_allow_html=True)
@@ -81,7 +83,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">₹{total_earnings['total'] if total_earnings else 0:,.0f}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">₹{summary['received_completed']:,.0f}</h3>
             <p style="margin: 0.5rem 0 0 0;">💰 Total Earnings</p>
         </div>
         """, unsafe_allow_html=True)
@@ -90,15 +92,7 @@ def render_overview():
     
     # Recent activities
     st.markdown("### 📋 Recent Activities")
-    recent_deliveries = execute_query("""
-        SELECT d.*, c.name as crop_name, u.name as farmer_name
-        FROM deliveries d
-        LEFT JOIN crops c ON d.crop_id = c.id
-        LEFT JOIN users u ON c.farmer_id = u.id
-        WHERE d.distributor_id = %s
-        ORDER BY d.created_at DESC
-        LIMIT 5
-    """, (distributor_id,), fetch=True)
+    recent_deliveries = data['recent_deliveries']
     
     if recent_deliveries:
         for delivery in recent_deliveries:
@@ -146,28 +140,28 @@ def render_available_crops():
     with col2:
         price_range = st.slider("Max Price per kg (₹)", 0, 1000, 500)
     with col3:
-        search_term = st.text_input("Search Crops", placeholder="Search by name...")
+        search_term = st.text_input("Search Crops", placeholder="Search by name, type or farmer...")
     
-    # Build query
-    query = """
-        SELECT c.*, u.name as farmer_name, u.phone as farmer_phone
-        FROM crops c
-        LEFT JOIN users u ON c.farmer_id = u.id
-        WHERE c.status = 'available' AND c.price <= %s
-    """
+    # Build filter
+    conditions = " AND c.status = 'available' AND c.price <= %s"
     params = [price_range]
     
     if type_filter != "All":
-        query += " AND c.type = %s"
+        conditions += " AND c.type = %s"
         params.append(type_filter)
     
     if search_term:
-        query += " AND LOWER(c.name) LIKE %s"
-        params.append(f"%{search_term.lower()}%")
-    
-    query += " ORDER BY c.created_at DESC"
-    
-    crops = execute_query(query, params, fetch=True)
+        # Best matches first, capped at SEARCH_LIMIT
+        crops = search_crops(search_term, conditions, params)
+    else:
+        # Only what the card and accept_crop need, newest first one page at a time
+        crops = paginated_rows("available_crops", f"""
+            SELECT c.id, c.name, c.type, c.quantity, c.price, c.batch_id, c.farmer_id, c.created_at,
+                   u.name as farmer_name, u.phone as farmer_phone
+            FROM crops c
+            LEFT JOIN users u ON c.farmer_id = u.id
+            WHERE 1=1 {conditions}
+        """, params, alias="c")
     
     if crops:
         for crop in crops:
@@ -219,36 +213,43 @@ def accept_crop(crop):
         if submitted and retailer_id and transport_details:
             distributor_id = st.session_state.user_id
             
-            # Create delivery record
-            delivery_result = execute_query("""
-                INSERT INTO deliveries (crop_id, distributor_id, retailer_id, transport_details, delivery_date)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (crop['id'], distributor_id, retailer_id[0], transport_details, delivery_date))
-            
-            if delivery_result and delivery_result > 0:
-                # Update crop status
-                execute_query("UPDATE crops SET status = 'in_transit' WHERE id = %s", (crop['id'],))
-                
-                # Add traceability record
-                execute_query("""
-                    INSERT INTO traceability (batch_id, step_type, user_id, details)
-                    VALUES (%s, %s, %s, %s)
-                """, (crop['batch_id'], "Transport", distributor_id, f"Picked up by distributor - {transport_details}"))
-                
-                # Create transaction record
-                execute_query("""
-                    INSERT INTO transactions (crop_id, from_user_id, to_user_id, transaction_type, transport_details)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (crop['id'], crop['farmer_id'], distributor_id, "procurement", transport_details))
-                
-                st.success("✅ Crop accepted successfully! Delivery created.")
-                st.rerun()
+            try:
+                with transaction() as tx:
+                    # Claim the crop first so two distributors can't accept the same batch
+                    claimed = tx.execute(
+                        "UPDATE crops SET status = 'in_transit' WHERE id = %s AND status = 'available'",
+                        (crop['id'],)
+                    )
+                    if not claimed:
+                        raise ValueError("this crop is no longer available")
+                    
+                    # Create delivery record
+                    delivery_id = tx.fetch_value("""
+                        INSERT INTO deliveries (crop_id, distributor_id, retailer_id, transport_details, delivery_date)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING id
+                    """, (crop['id'], distributor_id, retailer_id[0], transport_details, delivery_date))
+                    
+                    # Add traceability record
+                    tx.queue("""
+                        INSERT INTO traceability (batch_id, step_type, user_id, details)
+                        VALUES (%s, %s, %s, %s)
+                    """, (crop['batch_id'], "Transport", distributor_id, f"Picked up by distributor - {transport_details}"))
+                    
+                    # Create transaction record
+                    tx.queue("""
+                        INSERT INTO transactions (crop_id, from_user_id, to_user_id, transaction_type, transport_details)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, (crop['id'], crop['farmer_id'], distributor_id, "procurement", transport_details))
+            except Exception as e:
+                st.error(f"Failed to accept crop: {str(e)}")
             else:
-                st.error("Failed to accept crop. Please try again.")
+                st.success(f"✅ Crop accepted successfully! Delivery #{delivery_id} created.")
+                st.rerun()
 
 def get_retailers():
     """Get list of retailers"""
-    retailers = execute_query("SELECT id, name FROM users WHERE role = 'Retailer'", fetch=True)
+    retailers = fetch_all_cached("SELECT id, name FROM users WHERE role = 'Retailer'", ttl=300)
     return [(r['id'], r['name']) for r in retailers] if retailers else []
 
 def render_deliveries():
@@ -275,9 +276,7 @@ def render_deliveries():
         query += " AND d.status = %s"
         params.append(status_filter)
     
-    query += " ORDER BY d.created_at DESC"
-    
-    deliveries = execute_query(query, params, fetch=True)
+    deliveries = paginated_rows("distributor_deliveries", query, params, alias="d")
     
     if deliveries:
         for delivery in deliveries:
@@ -455,6 +454,15 @@ def render_payments():
             
             with col2:
                 if st.button(f"💰 Pay Farmer", key=f"pay_{crop['id']}"):
+                    # Another tab or a stale rerun can still show the button after the crop was paid for
+                    paid = fetch_existing("SELECT crop_id FROM payments WHERE from_user_id = %s AND crop_id = ANY(%s)",
+                                          [crop['id']], (distributor_id,))
+                    if paid is None:
+                        return
+                    if crop['id'] in paid:
+                        st.info(f"{crop['name']} has already been paid for.")
+                        return
+                    
                     amount = crop['price'] * crop['quantity']
                     payment_result = execute_query("""
                         INSERT INTO payments (amount, from_user_id, to_user_id, crop_id, payment_status)
@@ -1,8 +1,12 @@
 import streamlit as st
-from database import execute_query, fetch_one
+from database import execute_query, fetch_one, fetch_all_cached, fetch_facet_counts, transaction
 from auth import generate_batch_id
 from utils import create_crop_card, create_payment_card, format_date
 from components.qr_generator import generate_qr_display
+from components.pagination import paginated_rows
+from components.facets import facet_selections, facet_selectbox
+from metrics import get_user_summary
+from search import SEARCH_LIMIT, crop_search_condition, search_crops
 from datetime import date
 import uuid
 
@@ -28,9 +32,7 @@ def render_overview():
     farmer_id = st.session_state.user_id
     
     # Get farmer statistics
-    total_crops = fetch_one("SELECT COUNT(*) as count FROM crops WHERE farmer_id = %s", (farmer_id,))
-    available_crops = fetch_one("SELECT COUNT(*) as count FROM crops WHERE farmer_id = %s AND status = 'available'", (farmer_id,))
-    total_earnings = fetch_one("SELECT COALESCE(SUM(amount), 0) as total FROM payments WHERE to_user_id = %s AND payment_status = 'completed'", (farmer_id,))
+    summary = get_user_summary(farmer_id)
     
     # Display metrics
     col1, col2, col3 = st.columns(3)
@@ -44,7 +46,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">{total_crops['count'] if total_crops else 0}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">{summary['crops_total']}</h3>
             <p style="margin: 0.5rem 0 0 0;">🌾 Total Crops</p>
         </div>
         """, unsafe_allow_html=True)
@@ -58,7 +60,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">{available_crops['count'] if available_crops else 0}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">{summary['crops_available']}</h3>
             <p style="margin: 0.5rem 0 0 0;">📦 Available</p>
         </div>
         """, unsafe_allow_html=True)
@@ -72,7 +74,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">₹{total_earnings['total'] if total_earnings else 0:,.0f}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">₹{summary['received_completed']:,.0f}</h3>
             <p style="margin: 0.5rem 0 0 0;">💰 Total Earnings</p>
         </div>
         """, unsafe_allow_html=True)
@@ -81,12 +83,12 @@ def render_overview():
     
     # Recent crops
     st.markdown("### 📦 Recent Crops")
-    recent_crops = execute_query("""
+    recent_crops = fetch_all_cached("""
         SELECT * FROM crops 
         WHERE farmer_id = %s 
         ORDER BY created_at DESC 
         LIMIT 5
-    """, (farmer_id,), fetch=True)
+    """, (farmer_id,))
     
     if recent_crops:
         for crop in recent_crops:
@@ -120,22 +122,23 @@ def render_add_crop():
                 batch_id = generate_batch_id()
                 farmer_id = st.session_state.user_id
                 
-                result = execute_query("""
-                    INSERT INTO crops (farmer_id, name, type, quantity, price, harvest_date, batch_id, photo_url)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (farmer_id, crop_name, crop_type, quantity, price, harvest_date, batch_id, photo_url))
-                
-                if result and result > 0:
-                    # Add traceability record
-                    execute_query("""
-                        INSERT INTO traceability (batch_id, step_type, user_id, details)
-                        VALUES (%s, %s, %s, %s)
-                    """, (batch_id, "Harvest", farmer_id, f"Crop harvested by farmer"))
-                    
+                try:
+                    with transaction() as tx:
+                        tx.queue("""
+                            INSERT INTO crops (farmer_id, name, type, quantity, price, harvest_date, batch_id, photo_url)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        """, (farmer_id, crop_name, crop_type, quantity, price, harvest_date, batch_id, photo_url))
+                        
+                        # Add traceability record
+                        tx.queue("""
+                            INSERT INTO traceability (batch_id, step_type, user_id, details)
+                            VALUES (%s, %s, %s, %s)
+                        """, (batch_id, "Harvest", farmer_id, f"Crop harvested by farmer"))
+                except Exception as e:
+                    st.error(f"Failed to add crop: {str(e)}")
+                else:
                     st.success(f"✅ Crop added successfully! Batch ID: {batch_id}")
                     st.balloons()
-                else:
-                    st.error("Failed to add crop. Please try again.")
             else:
                 st.warning("Please fill in all required fields.")
 
@@ -147,32 +150,45 @@ def render_my_crops():
     
     # Filter options
     col1, col2, col3 = st.columns(3)
-    with col1:
-        status_filter = st.selectbox("Filter by Status", ["All", "available", "sold", "in_transit"])
-    with col2:
-        type_filter = st.selectbox("Filter by Type", ["All", "Cereals", "Vegetables", "Fruits", "Pulses", "Spices", "Other"])
     with col3:
-        search_term = st.text_input("Search Crops", placeholder="Search by name...")
+        search_term = st.text_input("Search Crops", placeholder="Search by name or type...")
     
-    # Build query
-    query = "SELECT * FROM crops WHERE farmer_id = %s"
+    # Build filter
+    conditions = " AND c.farmer_id = %s"
     params = [farmer_id]
+    search_condition, search_params = crop_search_condition(search_term)
+    
+    # Per-option counts for the filters, from one grouped query over the unfiltered list
+    facet_rows = fetch_facet_counts(f"FROM crops c WHERE TRUE{conditions}{search_condition}", ('status', 'type'),
+                                    params + search_params, scope=farmer_id)
+    selections = facet_selections("my_crops", ('status', 'type'))
+    with col1:
+        status_filter = facet_selectbox("Filter by Status", "my_crops", 'status',
+                                        ["All", "available", "sold", "in_transit"], facet_rows, selections)
+    with col2:
+        type_filter = facet_selectbox("Filter by Type", "my_crops", 'type',
+                                      ["All", "Cereals", "Vegetables", "Fruits", "Pulses", "Spices", "Other"],
+                                      facet_rows, selections)
     
     if status_filter != "All":
-        query += " AND status = %s"
+        conditions += " AND c.status = %s"
         params.append(status_filter)
     
     if type_filter != "All":
-        query += " AND type = %s"
+        conditions += " AND c.type = %s"
         params.append(type_filter)
     
-    if search_term:
-        query += " AND LOWER(name) LIKE %s"
-        params.append(f"%{search_term.lower()}%")
+    summary = fetch_one(f"SELECT COUNT(*) as count FROM crops c WHERE TRUE{conditions}{search_condition}",
+                        params + search_params)
+    matches = summary['count'] if summary else 0
     
-    query += " ORDER BY created_at DESC"
-    
-    crops = execute_query(query, params, fetch=True)
+    if search_condition:
+        # Best matches first, capped at SEARCH_LIMIT, the same ranking as the marketplace
+        crops = search_crops(search_term, conditions, params)
+        st.caption(f"{matches:,} crops match" + (f", showing the best {SEARCH_LIMIT}" if matches > SEARCH_LIMIT else ""))
+    else:
+        st.caption(f"{matches:,} crops match")
+        crops = paginated_rows("my_crops", f"SELECT * FROM crops c WHERE TRUE{conditions}", params, alias="c")
     
     if crops:
         for crop in crops:
@@ -1,7 +1,9 @@
 import streamlit as st
-from database import execute_query, fetch_one
+from database import execute_query, fetch_existing, transaction, load_concurrently
 from utils import create_payment_card
 from components.charts import create_sales_chart, create_metric_cards
+from components.pagination import paginated_rows
+from metrics import get_user_summary, get_rollup_series
 from datetime import date, datetime, timedelta
 import pandas as pd
 
@@ -26,21 +28,28 @@ def render_overview():
     
     retailer_id = st.session_state.user_id
     
-    # Get retailer statistics
-    pending_deliveries = fetch_one("""
-        SELECT COUNT(*) as count FROM deliveries 
-        WHERE retailer_id = %s AND status IN ('pending', 'in_transit')
-    """, (retailer_id,))
-    
-    total_stock = fetch_one("""
-        SELECT COUNT(*) as count FROM deliveries 
-        WHERE retailer_id = %s AND status = 'delivered'
-    """, (retailer_id,))
-    
-    total_sales = fetch_one("""
-        SELECT COALESCE(SUM(amount), 0) as total FROM payments 
-        WHERE from_user_id = %s AND payment_status = 'completed'
-    """, (retailer_id,))
+    # Get retailer statistics and recent activity in one concurrent round
+    data = load_concurrently({
+        'summary': lambda: get_user_summary(retailer_id),
+        'recent_deliveries': lambda: execute_query("""
+            SELECT d.*, c.name as crop_name, u.name as distributor_name
+            FROM deliveries d
+            LEFT JOIN crops c ON d.crop_id = c.id
+            LEFT JOIN users u ON d.distributor_id = u.id
+            WHERE d.retailer_id = %s
+            ORDER BY d.created_at DESC
+            LIMIT 3
+        """, (retailer_id,), fetch=True),
+        'recent_payments': lambda: execute_query("""
+            SELECT p.*, c.name as crop_name
+            FROM payments p
+            LEFT JOIN crops c ON p.crop_id = c.id
+            WHERE p.from_user_id = %s
+            ORDER BY p.created_at DESC
+            LIMIT 3
+        """, (retailer_id,), fetch=True),
+    })
+    summary = data['summary']
     
     # Display metrics
     col1, col2, col3 = st.columns(3)
@@ -54,7 +63,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">{pending_deliveries['count'] if pending_deliveries else 0}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">{summary['receipts_open']}</h3>
             <p style="margin: 0.5rem 0 0 0;">📦 Pending Deliveries</p>
         </div>
         """, unsafe_allow_html=True)
@@ -68,7 +77,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">{total_stock['count'] if total_stock else 0}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">{summary['receipts_delivered']}</h3>
             <p style="margin: 0.5rem 0 0 0;">🏪 Items in Stock</p>
         </div>
         """, unsafe_allow_html=True)
@@ -82,7 +91,7 @@ def render_overview():
             text-align: center;
             color: white;
         ">
-            <h3 style="margin: 0; font-size: 2rem;">₹{total_sales['total'] if total_sales else 0:,.0f}</h3>
+            <h3 style="margin: 0; font-size: 2rem;">₹{summary['paid_completed']:,.0f}</h3>
             <p style="margin: 0.5rem 0 0 0;">💰 Total Sales</p>
         </div>
         """, unsafe_allow_html=True)
@@ -96,15 +105,7 @@ def render_overview():
     
     with col1:
         st.markdown("#### 📦 Recent Deliveries")
-        recent_deliveries = execute_query("""
-            SELECT d.*, c.name as crop_name, u.name as distributor_name
-            FROM deliveries d
-            LEFT JOIN crops c ON d.crop_id = c.id
-            LEFT JOIN users u ON d.distributor_id = u.id
-            WHERE d.retailer_id = %s
-            ORDER BY d.created_at DESC
-            LIMIT 3
-        """, (retailer_id,), fetch=True)
+        recent_deliveries = data['recent_deliveries']
         
         if recent_deliveries:
             for delivery in recent_deliveries:
@@ -143,14 +144,7 @@ def render_overview():
     
     with col2:
         st.markdown("#### 💰 Recent Payments")
-        recent_payments = execute_query("""
-            SELECT p.*, c.name as crop_name
-            FROM payments p
-            LEFT JOIN crops c ON p.crop_id = c.id
-            WHERE p.from_user_id = %s
-            ORDER BY p.created_at DESC
-            LIMIT 3
-        """, (retailer_id,), fetch=True)
+        recent_payments = data['recent_payments']
         
         if recent_payments:
             for payment in recent_payments:
@@ -196,13 +190,19 @@ def render_deliveries():
     # Filter options
     status_filter = st.selectbox("Filter by Status", ["All", "pending", "in_transit", "delivered"])
     
+    # Any payment by the retailer for the crop (whatever its status, which may be NULL) means "Paid"
     query = """
         SELECT d.*, c.name as crop_name, c.quantity, c.price, c.batch_id,
-               u1.name as farmer_name, u2.name as distributor_name
+               u1.name as farmer_name, u2.name as distributor_name, p.id as payment_id
         FROM deliveries d
         LEFT JOIN crops c ON d.crop_id = c.id
         LEFT JOIN users u1 ON c.farmer_id = u1.id
         LEFT JOIN users u2 ON d.distributor_id = u2.id
+        LEFT JOIN LATERAL (
+            SELECT id FROM payments
+            WHERE from_user_id = d.retailer_id AND crop_id = d.crop_id
+            LIMIT 1
+        ) p ON TRUE
         WHERE d.retailer_id = %s
     """
     params = [retailer_id]
@@ -211,9 +211,7 @@ def render_deliveries():
         query += " AND d.status = %s"
         params.append(status_filter)
     
-    query += " ORDER BY d.created_at DESC"
-    
-    deliveries = execute_query(query, params, fetch=True)
+    deliveries = paginated_rows("retailer_deliveries", query, params, alias="d")
     
     if deliveries:
         for delivery in deliveries:
@@ -261,13 +259,7 @@ def render_deliveries():
                         accept_delivery(delivery)
                 
                 elif delivery['status'] == 'delivered':
-                    # Check if payment is made
-                    payment_exists = fetch_one("""
-                        SELECT id FROM payments 
-                        WHERE from_user_id = %s AND crop_id = %s
-                    """, (retailer_id, delivery['crop_id']))
-                    
-                    if not payment_exists:
+                    if delivery['payment_id'] is None:
                         if st.button(f"💰 Pay Distributor", key=f"pay_{delivery['id']}"):
                             make_payment_to_distributor(delivery)
                     else:
@@ -279,28 +271,33 @@ def accept_delivery(delivery):
     """Accept delivery from distributor"""
     delivery_id = delivery['id']
     crop_id = delivery['crop_id']
-    
-    # Update delivery status
-    result = execute_query("UPDATE deliveries SET status = 'delivered' WHERE id = %s", (delivery_id,))
-    
-    if result:
-        # Update crop status
-        execute_query("UPDATE crops SET status = 'delivered' WHERE id = %s", (crop_id,))
-        
-        # Add traceability record
-        retailer_id = st.session_state.user_id
-        batch_id = delivery['batch_id']
-        
-        execute_query("""
-            INSERT INTO traceability (batch_id, step_type, user_id, details)
-            VALUES (%s, %s, %s, %s)
-        """, (batch_id, "Retail", retailer_id, "Received by retailer"))
-        
+    retailer_id = st.session_state.user_id
+    batch_id = delivery['batch_id']
+    
+    try:
+        with transaction() as tx:
+            # Update delivery status, guarding against a double accept
+            updated = tx.execute(
+                "UPDATE deliveries SET status = 'delivered' WHERE id = %s AND status = 'in_transit'",
+                (delivery_id,)
+            )
+            if not updated:
+                raise ValueError("this delivery is no longer in transit")
+            
+            # Update crop status
+            tx.queue("UPDATE crops SET status = 'delivered' WHERE id = %s", (crop_id,))
+            
+            # Add traceability record
+            tx.queue("""
+                INSERT INTO traceability (batch_id, step_type, user_id, details)
+                VALUES (%s, %s, %s, %s)
+            """, (batch_id, "Retail", retailer_id, "Received by retailer"))
+    except Exception as e:
+        st.error(f"Failed to accept delivery: {str(e)}")
+    else:
         st.success("✅ Delivery accepted successfully!")
         st.balloons()
         st.rerun()
-    else:
-        st.error("Failed to accept delivery.")
 
 def make_payment_to_distributor(delivery):
     """Make payment to distributor"""
@@ -316,6 +313,15 @@ def make_payment_to_distributor(delivery):
         submitted = st.form_submit_button("💰 Confirm Payment")
         
         if submitted:
+            # Another tab or a stale rerun can still show the pay button after the crop was paid for
+            paid = fetch_existing("SELECT crop_id FROM payments WHERE from_user_id = %s AND crop_id = ANY(%s)",
+                                  [delivery['crop_id']], (retailer_id,))
+            if paid is None:
+                return
+            if delivery['crop_id'] in paid:
+                st.info("This delivery has already been paid for.")
+                return
+            
             payment_result = execute_query("""
                 INSERT INTO payments (amount, from_user_id, to_user_id, crop_id, payment_status, payment_method)
                 VALUES (%s, %s, %s, %s, %s, %s)
@@ -400,27 +406,18 @@ def render_sales():
     retailer_id = st.session_state.user_id
     
     # Sales summary for last 30 days
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
+    start_date = (datetime.now() - timedelta(days=30)).date()
     
     # Simulate sales data (in a real app, you'd have a sales table)
-    sales_data = execute_query("""
-        SELECT DATE(p.created_at) as sale_date, SUM(p.amount) as daily_sales
-        FROM payments p
-        WHERE p.from_user_id = %s 
-        AND p.created_at >= %s
-        AND p.payment_status = 'completed'
-        GROUP BY DATE(p.created_at)
-        ORDER BY sale_date
-    """, (retailer_id, start_date), fetch=True)
+    sales_data = get_rollup_series('completed_payments_by_payer', 'day', start_date, retailer_id)
     
     if sales_data:
         # Convert to format for chart
-        chart_data = [{'date': row['sale_date'].strftime('%Y-%m-%d'), 'amount': float(row['daily_sales'])} for row in sales_data]
+        chart_data = [{'date': row['bucket'].strftime('%Y-%m-%d'), 'amount': float(row['total'])} for row in sales_data]
         create_sales_chart(chart_data)
         
         # Sales metrics
-        total_sales = sum([row['daily_sales'] for row in sales_data])
+        total_sales = sum([row['total'] for row in sales_data])
         avg_daily_sales = total_sales / len(sales_data) if sales_data else 0
         
         col1, col2, col3 = st.columns(3)
@@ -0,0 +1,121 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import streamlit as st
+from query_stats import start_capture, stop_capture
+
+PROFILE_HISTORY_SIZE = 20
+TOP_FRAMES = 15
+
+profile_logger = logging.getLogger("agritrace.profiler")
+
+# Per-thread markdown counters; st.markdown is patched once and only counts on profiled threads
+_local = threading.local()
+_patch_lock = threading.Lock()
+_original_markdown = None
+
+def is_profiling_enabled():
+    """Check whether this rerun should be profiled (session toggle or AGRITRACE_PROFILE env var)"""
+    if st.session_state.get('profiling_enabled'):
+        return True
+    return os.getenv("AGRITRACE_PROFILE", "0").lower() in ("1", "true", "yes")
+
+def _counting_markdown(body, *args, **kwargs):
+    counter = getattr(_local, 'markdown', None)
+    if counter is not None:
+        counter['calls'] += 1
+        counter['bytes'] += len(str(body).encode())
+    return _original_markdown(body, *args, **kwargs)
+
+def _install_markdown_counter():
+    global _original_markdown
+    with _patch_lock:
+        if _original_markdown is None:
+            _original_markdown = st.markdown
+            st.markdown = _counting_markdown
+
+def _classify(filename):
+    """Bucket a profiled function into the breakdown categories"""
+    path = filename.replace('\\', '/')
+    if '/plotly/' in path or '/pandas/' in path or '/narwhals/' in path:
+        return 'charts_ms'
+    if '/streamlit/' in path:
+        return 'streamlit_ms'
+    return None
+
+def _summarize(profile):
+    """Split profiled time into categories and collect the top frames"""
+    stats = pstats.Stats(profile)
+    breakdown = {'charts_ms': 0.0, 'streamlit_ms': 0.0}
+    frames = []
+    
+    for (filename, line, function_name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        category = _classify(filename)
+        if category:
+            breakdown[category] += tottime * 1000
+        frames.append({
+            'function': f"{os.path.basename(filename)}:{line}({function_name})",
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 2),
+            'cumtime_ms': round(cumtime * 1000, 2),
+        })
+    
+    frames.sort(key=lambda f: f['cumtime_ms'], reverse=True)
+    return breakdown, frames[:TOP_FRAMES]
+
+def profile_rerun(render_fn, label):
+    """Run render_fn under cProfile and store a per-rerun breakdown in session state"""
+    _install_markdown_counter()
+    _local.markdown = {'calls': 0, 'bytes': 0}
+    start_capture()
+    profile = cProfile.Profile()
+    started = time.perf_counter()
+    completed = False
+    
+    try:
+        profile.enable()
+        render_fn()
+        completed = True
+    finally:
+        profile.disable()
+        wall_ms = (time.perf_counter() - started) * 1000
+        queries = stop_capture()
+        markdown = _local.markdown
+        _local.markdown = None
+        
+        # st.rerun() and st.stop() unwind through here; only keep profiles of full renders
+        if completed:
+            breakdown, top_frames = _summarize(profile)
+            result = {
+                'label': label,
+                'timestamp': time.time(),
+                'wall_ms': round(wall_ms, 2),
+                'query_count': queries['queries'],
+                'query_rows': queries['rows'],
+                'query_ms': round(queries['total_ms'], 2),
+                'charts_ms': round(breakdown['charts_ms'], 2),
+                'streamlit_ms': round(breakdown['streamlit_ms'], 2),
+                'python_ms': round(max(wall_ms - queries['total_ms'] - breakdown['charts_ms'] - breakdown['streamlit_ms'], 0), 2),
+                'markdown_calls': markdown['calls'],
+                'markdown_bytes': markdown['bytes'],
+                'top_frames': top_frames,
+            }
+            store_profile(result)
+
+def store_profile(result):
+    """Keep the profile in this session's history and log a one-line summary"""
+    history = st.session_state.setdefault('profile_history', [])
+    history.append(result)
+    del history[:-PROFILE_HISTORY_SIZE]
+    st.session_state.last_profile = result
+    
+    summary = {key: value for key, value in result.items() if key != 'top_frames'}
+    profile_logger.info(json.dumps(summary))
+
+def get_last_profile():
+    """Get the most recent profile for this session"""
+    return st.session_state.get('last_profile')
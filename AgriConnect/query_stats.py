@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+# Frames from these modules (the data layer and the plumbing under it) are skipped when
+# attributing a query to its caller, so it lands on the page that asked for the data
+_INTERNAL_MODULES = {
+    'connections', 'database', 'query_stats', 'cache', 'metrics', 'search', 'traces',
+    'contextlib', 'threading', 'concurrent.futures.thread',
+}
+
+_MAX_CALLERS_PER_QUERY = 20
+
+slow_query_logger = logging.getLogger("agritrace.slow_queries")
+
+_lock = threading.Lock()
+_stats = {}
+_totals = {'queries': 0, 'errors': 0, 'slow': 0, 'rows': 0, 'total_ms': 0.0}
+
+# Per-thread capture used by the render profiler to attribute queries to one rerun;
+# worker threads attach their caller's capture, hence the lock
+_local = threading.local()
+_capture_lock = threading.Lock()
+
+def is_enabled():
+    """Check whether query instrumentation is switched on"""
+    return os.getenv("QUERY_STATS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+def get_slow_query_threshold_ms():
+    """Get the slow-query log threshold in milliseconds"""
+    return float(os.getenv("SLOW_QUERY_MS", 500))
+
+@lru_cache(maxsize=1024)
+def normalize_query(query):
+    """Collapse whitespace and replace literals so equivalent statements share one key"""
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    normalized = re.sub(r"'(?:[^']|'')*'", "?", query)
+    normalized = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized)
+    normalized = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?, ...)", normalized)
+    return re.sub(r"\s+", " ", normalized).strip()
+
+def find_caller():
+    """Get the first module.function outside the data layer that issued the query"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module not in _INTERNAL_MODULES:
+            return f"{module.rsplit('.', 1)[-1]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+def _bucket_index(elapsed_ms):
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS) - 1
+
+def record_query(query, elapsed_ms, rows, error=False):
+    """Record one executed statement"""
+    capture = getattr(_local, 'capture', None)
+    if capture is not None:
+        with _capture_lock:
+            capture['queries'] += 1
+            capture['rows'] += rows
+            capture['total_ms'] += elapsed_ms
+    
+    if not is_enabled():
+        return
+    
+    key = normalize_query(query)
+    caller = find_caller()
+    
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {
+                'query': key,
+                'count': 0,
+                'errors': 0,
+                'rows': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'buckets': [0] * len(LATENCY_BUCKETS_MS),
+                'callers': {},
+            }
+        entry['count'] += 1
+        entry['rows'] += rows
+        entry['total_ms'] += elapsed_ms
+        entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+        entry['buckets'][_bucket_index(elapsed_ms)] += 1
+        if caller in entry['callers'] or len(entry['callers']) < _MAX_CALLERS_PER_QUERY:
+            entry['callers'][caller] = entry['callers'].get(caller, 0) + 1
+        
+        _totals['queries'] += 1
+        _totals['rows'] += rows
+        _totals['total_ms'] += elapsed_ms
+        if error:
+            entry['errors'] += 1
+            _totals['errors'] += 1
+        
+        slow = elapsed_ms >= get_slow_query_threshold_ms()
+        if slow:
+            _totals['slow'] += 1
+    
+    if slow:
+        slow_query_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'ts': time.time(),
+            'duration_ms': round(elapsed_ms, 2),
+            'rows': rows,
+            'error': error,
+            'caller': caller,
+            'query': key,
+        }))
+
+def estimate_percentile(buckets, percentile):
+    """Estimate a latency percentile (ms) from histogram bucket counts"""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    
+    target = total * percentile / 100
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += count
+        if seen >= target:
+            return bound
+    return LATENCY_BUCKETS_MS[-1]
+
+def get_query_stats(limit=None):
+    """Get per-query statistics, slowest total time first"""
+    with _lock:
+        entries = [dict(entry, buckets=list(entry['buckets']), callers=dict(entry['callers']))
+                   for entry in _stats.values()]
+    
+    for entry in entries:
+        entry['avg_ms'] = entry['total_ms'] / entry['count'] if entry['count'] else 0.0
+        entry['p50_ms'] = estimate_percentile(entry['buckets'], 50)
+        entry['p95_ms'] = estimate_percentile(entry['buckets'], 95)
+    
+    entries.sort(key=lambda e: e['total_ms'], reverse=True)
+    return entries[:limit] if limit else entries
+
+def get_query_counters():
+    """Get process-wide query counters"""
+    with _lock:
+        return dict(_totals)
+
+def reset_query_stats():
+    """Clear all recorded statistics"""
+    with _lock:
+        _stats.clear()
+        for key in _totals:
+            _totals[key] = 0.0 if key == 'total_ms' else 0
+
+def start_capture():
+    """Start counting queries issued by the current thread"""
+    _local.capture = {'queries': 0, 'rows': 0, 'total_ms': 0.0}
+    return _local.capture
+
+def get_capture():
+    """Get the current thread's capture, if one is running"""
+    return getattr(_local, 'capture', None)
+
+def attach_capture(capture):
+    """Count the current thread's queries into another thread's capture (None detaches)"""
+    _local.capture = capture
+
+def stop_capture():
+    """Stop counting and return what the current thread issued since start_capture()"""
+    capture = getattr(_local, 'capture', None)
+    _local.capture = None
+    return capture or {'queries': 0, 'rows': 0, 'total_ms': 0.0}
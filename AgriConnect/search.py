@@ -0,0 +1,44 @@
+import re
+from database import execute_query
+
+# Upper bound on ranked search results
+SEARCH_LIMIT = 50
+
+def to_prefix_tsquery(term):
+    """Turn free text into a tsquery matching every word as a prefix, or None if it has no words"""
+    words = re.findall(r"[^\W_]+", term.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+def crop_search_condition(term, alias="c"):
+    """Get an index-backed (" AND ..." condition, params) matching crops by name, type, farmer or batch ID
+    
+    An empty term adds no condition. For counts, and for admin Crop Management, which pages
+    through every match newest first; lists for finding a crop rank with search_crops().
+    """
+    tsquery = to_prefix_tsquery(term or "")
+    if tsquery is None:
+        return "", []
+    column = f"{alias}." if alias else ""
+    return f" AND {column}search_vector @@ to_tsquery('simple', %s)", [tsquery]
+
+def search_crops(term, conditions="", params=None, limit=SEARCH_LIMIT):
+    """Get the crops best matching term, best first, with their farmer's name, email and phone
+    
+    conditions are extra " AND ..." filters on crops aliased c, with params.
+    """
+    tsquery = to_prefix_tsquery(term or "")
+    if tsquery is None:
+        return []
+    
+    return execute_query(f"""
+        SELECT c.*, u.name as farmer_name, u.email as farmer_email, u.phone as farmer_phone,
+               ts_rank(c.search_vector, q.query) as rank
+        FROM crops c
+        CROSS JOIN to_tsquery('simple', %s) AS q (query)
+        LEFT JOIN users u ON c.farmer_id = u.id
+        WHERE c.search_vector @@ q.query {conditions}
+        ORDER BY rank DESC, c.created_at DESC, c.id DESC
+        LIMIT %s
+    """, (tsquery, *(params or ()), limit), fetch=True) or []
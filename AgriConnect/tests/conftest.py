@@ -0,0 +1,14 @@
+import psycopg2
+import pytest
+from database import get_connection_params
+
+@pytest.fixture(scope="session")
+def db():
+    """Migrate the database the PG* variables point at, or skip when there isn't one"""
+    try:
+        psycopg2.connect(**get_connection_params(), connect_timeout=3).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL unavailable: {e}")
+    
+    from migrations import run_migrations
+    assert run_migrations()
@@ -0,0 +1,34 @@
+from cache import tables_read, tables_written
+
+def test_tables_read_finds_every_from_and_join():
+    assert tables_read("""
+        SELECT c.*, u.name FROM crops c
+        LEFT JOIN users u ON c.farmer_id = u.id
+        JOIN deliveries d ON d.crop_id = c.id
+    """) == {'crops', 'users', 'deliveries'}
+
+def test_tables_read_is_case_insensitive_and_lowercases():
+    assert tables_read("select * from Crops inner join USERS on true") == {'crops', 'users'}
+
+def test_tables_read_looks_inside_subqueries():
+    assert tables_read("SELECT * FROM (SELECT crop_id FROM payments) p JOIN traceability t ON true") == \
+        {'payments', 'traceability'}
+
+def test_tables_read_of_a_statement_without_tables_is_empty():
+    assert tables_read("SELECT 1") == frozenset()
+
+def test_tables_written_finds_inserts_updates_and_deletes():
+    assert tables_written("INSERT INTO crops (name) VALUES (%s)") == {'crops'}
+    assert tables_written("UPDATE deliveries SET status = %s WHERE id = %s") == {'deliveries'}
+    assert tables_written("delete from Payments where id = %s") == {'payments'}
+    assert tables_written("SELECT * FROM crops") == frozenset()
+
+def test_tables_written_ignores_on_conflict_do_update_set():
+    assert tables_written("""
+        INSERT INTO user_summaries (user_id) VALUES (1)
+        ON CONFLICT (user_id) DO UPDATE SET crops_total = 1
+    """) == {'user_summaries'}
+
+def test_tables_written_reads_batched_statements_as_bytes():
+    batch = b"UPDATE crops SET status = 'sold' WHERE id = 1;\nINSERT INTO traceability (batch_id) VALUES ('B')"
+    assert tables_written(batch) == {'crops', 'traceability'}
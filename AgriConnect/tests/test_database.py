@@ -0,0 +1,10 @@
+from database import fetch_existing
+
+KEYS_SQL = "SELECT key FROM generate_series(1, 10) AS g (key) WHERE key %% %s = 0 AND key = ANY(%s)"
+
+def test_fetch_existing_returns_the_keys_found(db):
+    assert fetch_existing(KEYS_SQL, [2, 3, 4, 4, 12], (2,)) == {2, 4}
+    assert fetch_existing(KEYS_SQL, [3, 5], (2,)) == set()
+
+def test_fetch_existing_without_keys_skips_the_query(db):
+    assert fetch_existing("SELECT broken", [], ()) == set()
@@ -0,0 +1,21 @@
+from datetime import date
+from database import fetch_one
+from metrics import build_metrics_query, get_metrics
+
+def test_metrics_on_one_table_share_a_subquery():
+    query, placeholders = build_metrics_query(('completed_payments', 'pending_payments', 'failed_payments'))
+    assert query.count("FROM payments") == 1
+    assert placeholders == 0
+
+def test_windowed_metrics_take_the_param_once_per_table():
+    query, placeholders = build_metrics_query(('recent_users', 'recent_crops', 'active_deliveries'))
+    assert query.count(" CROSS JOIN ") == 2
+    assert placeholders == 2
+
+def test_metrics_match_separate_queries(db):
+    since = date(2026, 1, 1)
+    metrics = get_metrics(('recent_crops', 'total_deliveries', 'completed_deliveries'), since)
+    assert metrics['recent_crops'] == fetch_one("SELECT COUNT(*) as count FROM crops WHERE created_at >= %s", (since,))['count']
+    assert metrics['total_deliveries'] == fetch_one("SELECT COUNT(*) as count FROM deliveries")['count']
+    assert metrics['completed_deliveries'] == \
+        fetch_one("SELECT COUNT(*) as count FROM deliveries WHERE status = 'delivered'")['count']
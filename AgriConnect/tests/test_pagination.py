@@ -0,0 +1,36 @@
+import pytest
+from database import execute_query, fetch_page
+
+# Three rows per created_at, so pages have to break ties on id
+ROWS_SQL = """
+    SELECT * FROM (
+        SELECT id, TIMESTAMP '2026-01-01' + (id / 3) * INTERVAL '1 hour' AS created_at
+        FROM generate_series(1, %s) AS g (id)
+    ) AS t
+    WHERE TRUE
+"""
+
+def all_pages(total, page_size, alias=None):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = fetch_page(ROWS_SQL, (total,), cursor, page_size, alias)
+        pages.append([row['id'] for row in rows])
+        if cursor is None:
+            return pages
+
+@pytest.mark.parametrize("total, page_size", [(10, 3), (9, 3), (2, 5), (0, 4), (7, 1)])
+def test_pages_cover_every_row_once_in_order(db, total, page_size):
+    expected = [row['id'] for row in execute_query(ROWS_SQL + " ORDER BY created_at DESC, id DESC", (total,), fetch=True)]
+    pages = all_pages(total, page_size)
+    
+    assert [row_id for page in pages for row_id in page] == expected
+    assert all(len(page) == page_size for page in pages[:-1])
+    # The extra row means an exact multiple doesn't end on an empty page
+    assert pages[-1] or total == 0
+
+def test_cursor_columns_can_be_qualified_with_an_alias(db):
+    assert all_pages(8, 3, alias="t") == all_pages(8, 3)
+
+def test_cursor_is_the_last_row_of_the_page(db):
+    rows, cursor = fetch_page(ROWS_SQL, (10,), page_size=4)
+    assert cursor == (rows[-1]['created_at'], rows[-1]['id'])
@@ -0,0 +1,45 @@
+import threading
+import psycopg2
+from connections import ConnectionPool, get_connection_params
+
+def make_pool(**settings):
+    return ConnectionPool(**{'min_size': 1, 'max_size': 2, 'checkout_timeout': 5, 'health_check_after': 0, **settings})
+
+def test_dead_idle_connection_is_replaced(db):
+    pool = make_pool()
+    backend = pool._idle[0][0].get_backend_pid()
+    killer = psycopg2.connect(**get_connection_params())
+    killer.cursor().execute("SELECT pg_terminate_backend(%s)", (backend,))
+    killer.close()
+    
+    conn = pool.getconn()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1")
+    assert cursor.fetchone() == (1,)
+    pool.putconn(conn)
+    
+    stats = pool.get_stats()
+    assert (stats['discarded'], stats['open'], stats['in_use'], stats['idle']) == (1, 1, 0, 1)
+    pool.closeall()
+
+def test_health_check_runs_without_holding_the_pool_lock(db, monkeypatch):
+    pool = make_pool()
+    pinging, release = threading.Event(), threading.Event()
+    
+    def slow_ping(conn):
+        pinging.set()
+        release.wait(5)
+        return True
+    monkeypatch.setattr(pool, '_is_healthy', slow_ping)
+    
+    checkout = threading.Thread(target=lambda: pool.putconn(pool.getconn()))
+    checkout.start()
+    assert pinging.wait(5)
+    # A second checkout opens its own connection while the first is still pinging
+    conn = pool.getconn()
+    release.set()
+    checkout.join(5)
+    pool.putconn(conn)
+    
+    assert pool.get_stats()['open'] == 2
+    pool.closeall()
@@ -0,0 +1,28 @@
+from cache import clear_cache
+from database import fetch_all_cached, fetch_one_cached
+from query_stats import get_query_stats, normalize_query, reset_query_stats
+
+def callers_of(query):
+    key = normalize_query(query)
+    return next(entry['callers'] for entry in get_query_stats() if entry['query'] == key)
+
+def load_cached_rows():
+    return fetch_all_cached("SELECT 1 AS attributed_all")
+
+def load_cached_row():
+    return fetch_one_cached("SELECT 1 AS attributed_one")
+
+def test_normalize_query_folds_literals_and_whitespace():
+    assert normalize_query("SELECT *  FROM crops\n WHERE id = 42 AND name = 'x'") == \
+        "SELECT * FROM crops WHERE id = ? AND name = ?"
+    assert normalize_query("SELECT * FROM crops WHERE id IN (1, 2, 3)") == "SELECT * FROM crops WHERE id IN (?, ...)"
+
+def test_cached_reads_are_attributed_to_the_calling_function(db):
+    clear_cache()
+    reset_query_stats()
+    
+    assert load_cached_rows() == [{'attributed_all': 1}]
+    assert load_cached_row() == {'attributed_one': 1}
+    
+    assert callers_of("SELECT 1 AS attributed_all") == {'test_query_stats.load_cached_rows': 1}
+    assert callers_of("SELECT 1 AS attributed_one") == {'test_query_stats.load_cached_row': 1}
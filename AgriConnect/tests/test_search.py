@@ -0,0 +1,35 @@
+import pytest
+from database import fetch_one
+from search import crop_search_condition, to_prefix_tsquery
+
+EDGE_CASES = ["tom & !x | (y)", "it's", "a:*b", "BATCH_0001A", "  x  ", "<-> tom", "Café ñame", "\\'; DROP"]
+
+def test_prefix_tsquery_matches_every_word_as_a_prefix():
+    assert to_prefix_tsquery("Tom") == "tom:*"
+    assert to_prefix_tsquery("red  Onion\tfarm") == "red:* & onion:* & farm:*"
+
+def test_prefix_tsquery_without_words_is_none():
+    assert to_prefix_tsquery("") is None
+    assert to_prefix_tsquery("  ,;!&|()  ") is None
+    assert to_prefix_tsquery("___") is None
+
+def test_prefix_tsquery_drops_operators_and_punctuation():
+    assert to_prefix_tsquery("tom & !x | (y)") == "tom:* & x:* & y:*"
+    assert to_prefix_tsquery("a:*b") == "a:* & b:*"
+    assert to_prefix_tsquery("it's") == "it:* & s:*"
+
+def test_prefix_tsquery_splits_batch_ids_on_underscores():
+    assert to_prefix_tsquery("BATCH_0001A") == "batch:* & 0001a:*"
+
+def test_prefix_tsquery_keeps_non_ascii_letters():
+    assert to_prefix_tsquery("Café ñame") == "café:* & ñame:*"
+
+def test_empty_search_adds_no_condition():
+    assert crop_search_condition("") == ("", [])
+    assert crop_search_condition(None) == ("", [])
+    assert crop_search_condition("tom", alias=None) == (" AND search_vector @@ to_tsquery('simple', %s)", ["tom:*"])
+
+@pytest.mark.parametrize("term", EDGE_CASES)
+def test_prefix_tsquery_is_valid_for_postgres(db, term):
+    row = fetch_one("SELECT to_tsquery('simple', %s)::text AS query", (to_prefix_tsquery(term),))
+    assert row is not None and row['query']
@@ -0,0 +1,92 @@
+import json
+import threading
+from datetime import date, datetime
+from http.client import HTTPConnection
+import pytest
+import trace_service
+
+DOCUMENT = {
+    'found': True,
+    'batch_id': 'BATCH_TEST',
+    'crop': {'name': 'Tomato', 'type': 'Vegetables', 'quantity': 12.5, 'harvest_date': date(2026, 5, 1)},
+    'farmer': {'name': 'Test Farmer'},
+    'steps': [{
+        'step_type': 'Harvest', 'user_name': 'Test Farmer', 'role': 'Farmer',
+        'timestamp': datetime(2026, 5, 1, 8, 30), 'details': 'Crop harvested by farmer', 'location': None,
+    }],
+}
+
+def fake_get_trace(batch_id, ttl):
+    if batch_id == 'BROKEN':
+        raise RuntimeError("database is down")
+    if batch_id == DOCUMENT['batch_id']:
+        return DOCUMENT
+    return {'found': False, 'batch_id': batch_id}
+
+@pytest.fixture(scope="module")
+def server():
+    patch = pytest.MonkeyPatch()
+    patch.setattr(trace_service, 'get_trace', fake_get_trace)
+    server = trace_service.make_server('127.0.0.1', 0, cache_ttl=60, max_age=30)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    patch.undo()
+
+def get(port, path, **headers):
+    conn = HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('GET', path, headers=headers)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response.status, response, body
+
+def test_known_batch_is_served_as_json(server):
+    status, response, body = get(server, '/trace/BATCH_TEST')
+    assert status == 200
+    assert response.getheader('Content-Type') == 'application/json'
+    assert response.getheader('Cache-Control') == 'public, max-age=30'
+    assert response.getheader('ETag')
+    assert json.loads(body)['crop']['harvest_date'] == '2026-05-01'
+
+def test_html_is_served_when_asked_for(server):
+    status, response, body = get(server, '/trace/BATCH_TEST', Accept='text/html')
+    assert status == 200
+    assert response.getheader('Content-Type') == 'text/html; charset=utf-8'
+    assert b'Tomato' in body
+    
+    # A .json suffix wins over the Accept header
+    status, response, _ = get(server, '/trace/BATCH_TEST.json', Accept='text/html')
+    assert response.getheader('Content-Type') == 'application/json'
+
+def test_matching_etag_is_not_modified(server):
+    _, response, _ = get(server, '/trace/BATCH_TEST')
+    etag = response.getheader('ETag')
+    
+    status, response, body = get(server, '/trace/BATCH_TEST', **{'If-None-Match': etag})
+    assert status == 304
+    assert response.getheader('ETag') == etag
+    assert body == b''
+    
+    status, _, _ = get(server, '/trace/BATCH_TEST', **{'If-None-Match': '"stale"'})
+    assert status == 200
+
+def test_unknown_batch_is_not_found(server):
+    status, response, body = get(server, '/trace/NO_SUCH_BATCH')
+    assert status == 404
+    assert json.loads(body) == {'found': False, 'batch_id': 'NO_SUCH_BATCH'}
+    # Misses are cacheable too, so scanners re-checking a bad code revalidate
+    assert response.getheader('ETag')
+
+@pytest.mark.parametrize("path", ['/', '/trace/', '/crops/BATCH_TEST'])
+def test_other_paths_are_not_found(server, path):
+    status, response, _ = get(server, path)
+    assert status == 404
+    assert response.getheader('Cache-Control') == 'no-store'
+
+def test_lookup_failure_is_service_unavailable(server):
+    status, response, body = get(server, '/trace/BROKEN')
+    assert status == 503
+    assert response.getheader('Cache-Control') == 'no-store'
+    assert json.loads(body) == {'error': 'trace lookup failed'}
@@ -0,0 +1,156 @@
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+from database import get_connection_params
+from metrics import SUMMARY_COLUMNS
+
+def nonzero(*columns):
+    return " OR ".join(f"{column} <> 0" for column in columns)
+
+# Trigger-maintained table -> (function that rebuilds it exactly, columns left out of the
+# comparison, filter for rows that count); triggers may leave all-zero rows a rebuild drops
+TRIGGER_TABLES = {
+    'stats_counters': ('recompute_stats_counters', ('updated_at',), None),
+    'user_summaries': ('recompute_user_summaries', ('last_activity_at',), nonzero(*SUMMARY_COLUMNS)),
+    'rollups': ('rebuild_rollups', (), nonzero('count', 'total')),
+    'user_activity': ('rebuild_user_activity', (), nonzero('crops', 'deliveries', 'payments')),
+    'user_activity_daily': ('rebuild_user_activity', (), nonzero('crops', 'deliveries', 'payments')),
+    'batch_trace_steps': ('rebuild_batch_traces', (), nonzero('events')),
+    'batch_traces': ('rebuild_batch_traces', (), None),
+    'trace_completeness': ('rebuild_batch_traces', (), nonzero('batches')),
+    'trace_snapshots': ('rebuild_trace_snapshots', ('updated_at',), None),
+}
+
+@pytest.fixture
+def cursor(db):
+    conn = psycopg2.connect(**get_connection_params())
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    # Start from exact tables, so any difference comes from the statements under test
+    cursor.execute("LOCK TABLE users, crops, deliveries, payments, traceability IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("SELECT " + ", ".join(f"{function}()" for function in dict.fromkeys(
+        function for function, _, _ in TRIGGER_TABLES.values())))
+    yield cursor
+    conn.rollback()
+    conn.close()
+
+def snapshot(cursor, table):
+    _, ignored, condition = TRIGGER_TABLES[table]
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = %s AND table_schema = current_schema() ORDER BY ordinal_position
+    """, (table,))
+    columns = ", ".join(row['column_name'] for row in cursor.fetchall() if row['column_name'] not in ignored)
+    # Ordered by the whole row as text, since json columns have no ordering operator
+    cursor.execute(f"SELECT {columns} FROM {table} WHERE {condition or 'TRUE'} ORDER BY ROW({columns})::text")
+    return cursor.fetchall()
+
+def assert_matches_rebuild(cursor, table, phase):
+    maintained = snapshot(cursor, table)
+    cursor.execute("SAVEPOINT rebuild")
+    cursor.execute(f"SELECT {TRIGGER_TABLES[table][0]}()")
+    rebuilt = snapshot(cursor, table)
+    # Later phases carry on from what the triggers left, not from the rebuild
+    cursor.execute("ROLLBACK TO SAVEPOINT rebuild")
+    assert maintained == rebuilt, f"{table} drifted from its rebuild after {phase}"
+
+def fetch_id(cursor, query, params):
+    cursor.execute(query, params)
+    return cursor.fetchone()['id']
+
+def insert_rows(cursor):
+    ids = {}
+    for role in ('Farmer', 'Distributor', 'Retailer'):
+        ids[role] = fetch_id(cursor, """
+            INSERT INTO users (name, email, phone, role, password_hash)
+            VALUES (%s, %s, '9000000000', %s, 'x') RETURNING id
+        """, (f"Trigger Test {role}", f"trigger-test-{role.lower()}@example.test", role))
+    cursor.execute("""
+        INSERT INTO crops (farmer_id, name, type, quantity, price, harvest_date, batch_id, status)
+        VALUES (%(Farmer)s, 'Wheat', 'Cereals', 100, 20, CURRENT_DATE, 'TRIGGER_TEST_1', 'available'),
+               (%(Farmer)s, 'Mango', 'Fruits', 50, 80, CURRENT_DATE, 'TRIGGER_TEST_2', 'available'),
+               (%(Farmer)s, 'Onion', 'Vegetables', 75, 15, CURRENT_DATE, 'TRIGGER_TEST_3', 'available')
+        RETURNING id
+    """, ids)
+    ids['crops'] = [row['id'] for row in cursor.fetchall()]
+    cursor.execute("""
+        INSERT INTO traceability (batch_id, step_type, user_id, details)
+        SELECT batch_id, 'Harvest', farmer_id, 'Crop harvested by farmer' FROM crops WHERE farmer_id = %s
+    """, (ids['Farmer'],))
+    ids['delivery'] = fetch_id(cursor, """
+        INSERT INTO deliveries (crop_id, distributor_id, retailer_id, transport_details, status)
+        VALUES (%s, %s, %s, 'Truck 1234', 'pending') RETURNING id
+    """, (ids['crops'][0], ids['Distributor'], ids['Retailer']))
+    ids['payment'] = fetch_id(cursor, """
+        INSERT INTO payments (amount, from_user_id, to_user_id, crop_id, payment_status, payment_method)
+        VALUES (2000, %s, %s, %s, 'pending', 'UPI') RETURNING id
+    """, (ids['Distributor'], ids['Farmer'], ids['crops'][0]))
+    return ids
+
+def update_rows(cursor, ids):
+    cursor.execute("UPDATE crops SET status = 'in_transit' WHERE id = %s", (ids['crops'][0],))
+    cursor.execute("UPDATE deliveries SET status = 'in_transit' WHERE id = %s", (ids['delivery'],))
+    cursor.execute("""
+        INSERT INTO traceability (batch_id, step_type, user_id, details)
+        VALUES ('TRIGGER_TEST_1', 'Transport', %s, 'Picked up by distributor')
+    """, (ids['Distributor'],))
+    cursor.execute("UPDATE deliveries SET status = 'delivered' WHERE id = %s", (ids['delivery'],))
+    cursor.execute("""
+        INSERT INTO traceability (batch_id, step_type, user_id, details)
+        VALUES ('TRIGGER_TEST_1', 'Retail', %s, 'Received by retailer')
+    """, (ids['Retailer'],))
+    cursor.execute("UPDATE payments SET payment_status = 'completed', amount = 2100 WHERE id = %s", (ids['payment'],))
+    # Rows whose counted columns don't change, and a multi-row update across owners
+    cursor.execute("UPDATE crops SET price = price + 1 WHERE farmer_id = %s", (ids['Farmer'],))
+    cursor.execute("UPDATE crops SET farmer_id = %s WHERE id = %s", (ids['Retailer'], ids['crops'][2]))
+    cursor.execute("UPDATE users SET name = 'Trigger Test Grower' WHERE id = %s", (ids['Farmer'],))
+
+def delete_rows(cursor, ids):
+    cursor.execute("DELETE FROM payments WHERE id = %s", (ids['payment'],))
+    cursor.execute("DELETE FROM traceability WHERE batch_id = 'TRIGGER_TEST_1' AND step_type = 'Transport'")
+    cursor.execute("DELETE FROM deliveries WHERE id = %s", (ids['delivery'],))
+    cursor.execute("DELETE FROM traceability WHERE batch_id = 'TRIGGER_TEST_2'")
+    cursor.execute("DELETE FROM crops WHERE id = %s", (ids['crops'][1],))
+
+@pytest.mark.parametrize("table", TRIGGER_TABLES)
+def test_trigger_table_matches_its_rebuild(cursor, table):
+    ids = insert_rows(cursor)
+    assert_matches_rebuild(cursor, table, "inserts")
+    
+    update_rows(cursor, ids)
+    assert_matches_rebuild(cursor, table, "updates")
+    
+    delete_rows(cursor, ids)
+    assert_matches_rebuild(cursor, table, "deletes")
+
+def test_lead_time_runs_from_pickup_to_retail(cursor):
+    ids = insert_rows(cursor)
+    cursor.execute("SELECT picked_up_at, lead_time_hours FROM deliveries WHERE id = %s", (ids['delivery'],))
+    pending = cursor.fetchone()
+    assert pending['picked_up_at'] is not None and pending['lead_time_hours'] is None
+    
+    update_rows(cursor, ids)
+    cursor.execute("SELECT in_transit_at, delivered_at, retailed_at, lead_time_hours FROM deliveries WHERE id = %s",
+                   (ids['delivery'],))
+    delivered = cursor.fetchone()
+    assert None not in delivered.values()
+
+def test_retail_step_leaves_open_deliveries_unstamped(cursor):
+    ids = insert_rows(cursor)
+    cursor.execute("""
+        INSERT INTO traceability (batch_id, step_type, user_id, details)
+        VALUES ('TRIGGER_TEST_1', 'Retail', %s, 'Received by retailer')
+    """, (ids['Retailer'],))
+    cursor.execute("SELECT retailed_at, lead_time_hours FROM deliveries WHERE id = %s", (ids['delivery'],))
+    assert cursor.fetchone() == {'retailed_at': None, 'lead_time_hours': None}
+
+def test_unchanged_rows_leave_user_summaries_alone(cursor):
+    ids = insert_rows(cursor)
+    summary_rows = "SELECT ctid::text, * FROM user_summaries WHERE user_id IN (%(Farmer)s, %(Distributor)s) ORDER BY user_id"
+    cursor.execute(summary_rows, ids)
+    before = cursor.fetchall()
+    
+    # Neither touches a counted column, so no summary row may be rewritten
+    cursor.execute("UPDATE crops SET price = price + 1 WHERE farmer_id = %s", (ids['Farmer'],))
+    cursor.execute("UPDATE deliveries SET transport_details = 'Truck 5678' WHERE id = %s", (ids['delivery'],))
+    cursor.execute(summary_rows, ids)
+    assert cursor.fetchall() == before
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import html
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+from connections import read_cursor, get_pool_stats
+from cache import get_cached, get_cache_stats
+from notifications import start_change_listener, get_listener_status
+from traces import TRACE_DOCUMENT_SQL, build_trace_document, public_trace_document, serialize_trace
+
+service_logger = logging.getLogger("agritrace.trace_service")
+
+STEP_TITLES = {
+    'Harvest': 'Harvested by Farmer',
+    'Transport': 'Picked up by Distributor',
+    'Retail': 'Received by Retailer',
+    'Sale': 'Sold to Customer',
+}
+
+def get_service_settings():
+    """Get listen address and cache lifetimes from environment variables"""
+    return {
+        'host': os.getenv("TRACE_SERVICE_HOST", "0.0.0.0"),
+        'port': int(os.getenv("TRACE_SERVICE_PORT", 8502)),
+        'cache_ttl': float(os.getenv("TRACE_SERVICE_CACHE_TTL", 300)),
+        'max_age': int(os.getenv("TRACE_SERVICE_MAX_AGE", 60)),
+    }
+
+def load_trace(batch_id):
+    """Get a batch's public trace document, or {'found': False}; raises on database errors"""
+    # Not get_trace_document(): that reports through st.error, which has no page to land on here
+    with read_cursor() as cursor:
+        document = build_trace_document(cursor, batch_id)
+    
+    if document is None:
+        return {'found': False, 'batch_id': batch_id}
+    # Only what a consumer needs: no contact details or prices leave through the public endpoint
+    return dict(public_trace_document(document), found=True)
+
+def get_trace(batch_id, ttl):
+    """Get a batch's trace document through the result cache (misses are cached too)"""
+    # Reads only trace_snapshots, whose regeneration on any trace write evicts it via the change listener
+    return get_cached(TRACE_DOCUMENT_SQL, (batch_id,), 'trace_service', lambda: load_trace(batch_id), ttl)
+
+def render_json(document):
+    """Serialize a trace document as compact JSON bytes"""
+    return serialize_trace(document).encode()
+
+def render_html(document):
+    """Render a trace document as a self-contained HTML page"""
+    e = lambda value: html.escape(str(value)) if value is not None else ''
+    if not document['found']:
+        body = f"<h1>Batch not found</h1><p>No crop has batch ID <code>{e(document['batch_id'])}</code>.</p>"
+    else:
+        crop = document['crop']
+        steps = "".join(
+            f"""
+            <li>
+                <strong>{e(STEP_TITLES.get(step['step_type'], step['step_type']))}</strong>
+                <span>{e(step['user_name'])}{f" ({e(step['role'])})" if step['role'] else ''}</span>
+                <time>{e(step['timestamp'].strftime('%Y-%m-%d %H:%M') if step['timestamp'] else '')}</time>
+                <p>{e(step['details'])}{f" · {e(step['location'])}" if step['location'] else ''}</p>
+            </li>"""
+            for step in document['steps']
+        )
+        body = f"""
+        <h1>🌾 {e(crop['name'])}</h1>
+        <p><strong>Type:</strong> {e(crop['type'])} · <strong>Quantity:</strong> {e(crop['quantity'])} kg
+           · <strong>Harvest Date:</strong> {e(crop['harvest_date'])}</p>
+        <p><strong>Farmer:</strong> {e(document['farmer']['name'])} ✅ · <strong>Batch ID:</strong> <code>{e(document['batch_id'])}</code></p>
+        <h2>📍 Journey</h2>
+        <ol>{steps}</ol>
+        """
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>AgriTrace · {e(document['batch_id'])}</title>
+<style>
+    body {{ font-family: system-ui, sans-serif; max-width: 40rem; margin: 2rem auto; padding: 0 1rem; color: #1f2937; }}
+    ol {{ list-style: none; padding: 0; }}
+    li {{ border-left: 4px solid #22c55e; padding: 0.5rem 1rem; margin: 0.75rem 0; background: #f9fafb; }}
+    li span, li time {{ display: block; color: #6b7280; font-size: 0.875rem; }}
+    li p {{ margin: 0.25rem 0 0 0; }}
+</style>
+</head>
+<body>{body}</body>
+</html>
+""".encode()
+
+class TraceRequestHandler(BaseHTTPRequestHandler):
+    """Serves /trace/<batch_id> and /healthz; settings are set on the class by make_server()"""
+    
+    server_version = "AgriTrace/1.0"
+    cache_ttl = 300
+    max_age = 60
+    
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/healthz':
+            return self._send_json(200, {
+                'pool': get_pool_stats(),
+                'cache': get_cache_stats(),
+                'change_listener': get_listener_status(),
+            })
+        if not path.startswith('/trace/') or len(path) == len('/trace/'):
+            return self._send_json(404, {'error': 'not found'})
+        
+        batch_id = unquote(path[len('/trace/'):])
+        as_html = self._wants_html()
+        if batch_id.endswith('.json'):
+            batch_id, as_html = batch_id[:-len('.json')], False
+        elif batch_id.endswith('.html'):
+            batch_id, as_html = batch_id[:-len('.html')], True
+        
+        try:
+            document = get_trace(batch_id, self.cache_ttl)
+        except Exception as e:
+            service_logger.warning(f"trace lookup failed for {batch_id!r}: {e}")
+            return self._send_json(503, {'error': 'trace lookup failed'})
+        
+        body = render_html(document) if as_html else render_json(document)
+        content_type = "text/html; charset=utf-8" if as_html else "application/json"
+        self._send(200 if document['found'] else 404, body, content_type, cacheable=True)
+    
+    def do_HEAD(self):
+        self.do_GET()
+    
+    def _wants_html(self):
+        accept = self.headers.get('Accept', '')
+        return 'text/html' in accept and 'application/json' not in accept
+    
+    def _send_json(self, status, payload):
+        self._send(status, render_json(payload), "application/json", cacheable=False)
+    
+    def _send(self, status, body, content_type, cacheable):
+        if cacheable:
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            if etag in self.headers.get('If-None-Match', ''):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", f"public, max-age={self.max_age}")
+                self.end_headers()
+                return
+        
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if cacheable:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"public, max-age={self.max_age}")
+            self.send_header("Vary", "Accept")
+        else:
+            self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        service_logger.debug(f"{self.address_string()} {format % args}")
+
+def make_server(host, port, cache_ttl, max_age):
+    """Build a threaded trace server; call serve_forever() on it"""
+    handler = type('ConfiguredTraceRequestHandler', (TraceRequestHandler,), {
+        'cache_ttl': cache_ttl,
+        'max_age': max_age,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main():
+    settings = get_service_settings()
+    parser = argparse.ArgumentParser(description="Serve batch traces over HTTP without a login")
+    parser.add_argument('--host', default=settings['host'])
+    parser.add_argument('--port', type=int, default=settings['port'])
+    parser.add_argument('--cache-ttl', type=float, default=settings['cache_ttl'],
+                        help="seconds a trace stays cached if no write evicts it first")
+    parser.add_argument('--max-age', type=int, default=settings['max_age'],
+                        help="Cache-Control max-age sent to browsers and proxies")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # Writes made by the Streamlit processes evict cached traces here too
+    start_change_listener()
+    server = make_server(args.host, args.port, args.cache_ttl, args.max_age)
+    service_logger.info(f"serving traces on http://{args.host}:{args.port}/trace/<batch_id>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from connections import run_statement
+
+# A batch's whole trace (crop, farmer and ordered steps with their actors), regenerated
+# by triggers whenever any of it changes (see migration 13); no row means no crop
+TRACE_DOCUMENT_SQL = "SELECT document FROM trace_snapshots WHERE batch_id = %s"
+
+# Left out of documents served without a login
+PRIVATE_FIELDS = {'crop': ('id', 'price'), 'farmer': ('id', 'phone'), 'steps': ('user_id',)}
+
+def _to_document(row):
+    """Turn a snapshot row back into Python values, or None if there was no row"""
+    if row is None:
+        return None
+    
+    document = row['document']
+    crop = document['crop']
+    if crop['harvest_date']:
+        crop['harvest_date'] = date.fromisoformat(crop['harvest_date'])
+    for step in document['steps']:
+        if step['timestamp']:
+            step['timestamp'] = datetime.fromisoformat(step['timestamp'])
+    return document
+
+def get_trace_document(batch_id):
+    """Get a batch's complete trace document from its snapshot, or None if no crop has that batch ID"""
+    # Imported here so the trace service can use this module without loading Streamlit
+    from database import fetch_one
+    return _to_document(fetch_one(TRACE_DOCUMENT_SQL, (batch_id,)))
+
+def build_trace_document(cursor, batch_id):
+    """Like get_trace_document() on a caller's dict cursor; database errors are raised, not reported"""
+    return _to_document(run_statement(cursor, TRACE_DOCUMENT_SQL, (batch_id,), 'one'))
+
+def public_trace_document(document):
+    """Get a copy of a trace document without contact details, prices or internal IDs"""
+    public = dict(document)
+    for section, fields in PRIVATE_FIELDS.items():
+        if section == 'steps':
+            public[section] = [{k: v for k, v in step.items() if k not in fields} for step in document[section]]
+        else:
+            public[section] = {k: v for k, v in document[section].items() if k not in fields}
+    return public
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def serialize_trace(document):
+    """Serialize a trace document as compact JSON"""
+    return json.dumps(document, default=_json_default, ensure_ascii=False, separators=(',', ':'))